@@ -0,0 +1,137 @@
+"""常驻采集代理
+
+流式模式下由 ServerMonitor 通过已有的 SSH 连接以 `python3 -u - <interval> <sources>` 启动，
+源码经 stdin 传入，因此本文件只能依赖标准库。代理按周期并发读取 /proc 与 statvfs，
+以和 probe 相同的分段格式把每一帧写到 stdout，帧之间以 FRAME_END 分隔。
+本地传输（transport: local）在采集进程内直接调用 read_source，不经过 SSH。
+"""
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+
+SECTION_MARKER = "@@sw:"
+FRAME_END = "@@sw!end"
+
+def _read_file(path):
+    with open(path, 'r') as f:
+        return f.read()
+
+def _statvfs(path, name=None):
+    st = os.statvfs(path)
+    return f"{name or path} {st.f_blocks} {st.f_bfree} {st.f_bavail} {st.f_frsize}"
+
+def _statvfs_all(root):
+    """根目录和所有块设备上的文件系统（同一设备只取第一个挂载点，跳过 squashfs），每行一个"""
+    lines = [_statvfs(root, "/")]
+    seen = set()
+    for line in _read_file(os.path.join(root, "proc/mounts")).splitlines():
+        device, mount, fstype = line.split()[:3]
+        if not device.startswith("/dev/") or fstype == "squashfs" or device in seen or mount == "/":
+            continue
+        seen.add(device)
+        # /proc/mounts 中的空格等字符以八进制转义
+        mount = re.sub(r"\\([0-7]{3})", lambda m: chr(int(m.group(1), 8)), mount)
+        try:
+            lines.append(_statvfs(os.path.join(root, mount.lstrip("/")), mount))
+        except OSError:
+            continue
+    return "\n".join(lines)
+
+def _pid_stats(root):
+    """所有进程的 /proc/<pid>/stat，每行一个进程；读取期间退出的进程直接跳过"""
+    proc = os.path.join(root, "proc")
+    lines = []
+    for pid in os.listdir(proc):
+        if pid.isdigit():
+            try:
+                lines.append(_read_file(os.path.join(proc, pid, "stat")).rstrip("\n"))
+            except OSError:
+                continue
+    return "\n".join(lines)
+
+# 无需 fork 即可在进程内读取的数据源，其余数据源回退为执行声明的命令。
+# 参数 root 为主机根目录，容器中通过绑定挂载读取宿主机时为挂载点（如 /host）
+NATIVE_SOURCES = {
+    "stat": lambda root: _read_file(os.path.join(root, "proc/stat")),
+    "meminfo": lambda root: _read_file(os.path.join(root, "proc/meminfo")),
+    "statvfs": lambda root: _statvfs(root, "/"),
+    "statvfs_all": _statvfs_all,
+    "diskstats": lambda root: _read_file(os.path.join(root, "proc/diskstats")),
+    "netdev": lambda root: _read_file(os.path.join(root, "proc/net/dev")),
+    "pidstat": _pid_stats,
+}
+
+def read_source(name, command, timeout=10, root="/"):
+    reader = NATIVE_SOURCES.get(name)
+    if reader:
+        return reader(root)
+    result = subprocess.run(command, shell=True, stdout=subprocess.PIPE,
+                            stderr=subprocess.DEVNULL, universal_newlines=True, timeout=timeout)
+    return result.stdout
+
+# 尚未输出的读取: {数据源: (线程, 结果)}。上次读取仍未结束的数据源不会再启动新的读取
+_pending = {}
+
+def _start_read(name, command, timeout):
+    result = {}
+
+    def target():
+        try:
+            result["output"] = read_source(name, command, timeout)
+        except Exception:
+            result["output"] = ""
+
+    # 守护线程：挂起的 statvfs（如 stale NFS）不会阻止代理在通道关闭后退出
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    return thread, result
+
+def render_frame(sources, timeout=10, deadline=None):
+    """并发读取各数据源，最多等待 deadline 秒（默认为 timeout）。届时仍未返回的数据源在本帧输出为空，
+    读取完成后在之后的帧中输出，挂起的数据源不会拖住 CPU、内存等其他数据源"""
+    for name, command in sources.items():
+        if name not in _pending:
+            _pending[name] = _start_read(name, command, timeout)
+    end = time.monotonic() + (timeout if deadline is None else deadline)
+    for name in sources:
+        _pending[name][0].join(max(0.0, end - time.monotonic()))
+    parts = []
+    for name in sources:
+        thread, result = _pending[name]
+        output = ""
+        if not thread.is_alive():
+            del _pending[name]
+            output = result.get("output") or ""
+        parts.append(f"{SECTION_MARKER}{name}\n{output.rstrip()}\n")
+    parts.append(f"{FRAME_END}\n")
+    return "".join(parts)
+
+def run(interval, sources):
+    next_tick = time.monotonic()
+    while True:
+        # 每帧最多等待周期的 80%，慢数据源不会推迟下一帧
+        sys.stdout.write(render_frame(sources, timeout=max(interval, 5), deadline=interval * 0.8))
+        sys.stdout.flush()
+        next_tick += interval
+        delay = next_tick - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            # 采集耗时超过周期时跳过错过的周期，而不是连续补发
+            next_tick = time.monotonic()
+
+def main(argv):
+    interval = float(argv[1])
+    sources = json.loads(argv[2])
+    try:
+        run(interval, sources)
+    except (BrokenPipeError, KeyboardInterrupt):
+        # 监控端关闭通道后退出
+        pass
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,374 @@
+"""流式告警引擎：在样本流上按规则计算滑动窗口聚合，触发和恢复时各发送一次事件到告警输出。
+
+窗口被切分为固定数量的窗格，每个窗格只保存计数、求和、最值和回归所需的累加量，
+新样本只更新当前窗格和窗口总量，窗格滑出时从总量中减去，不会重新扫描窗口内的样本。
+规则按指标建立索引，每个样本只访问引用了其指标的规则。
+"""
+import json
+import logging
+import operator
+import queue
+import threading
+import urllib.request
+from collections import deque
+from series import base_name
+from storage import parse_duration
+from watcher_register import WatcherRegister, WatcherModuleType
+
+# 获取应用logger
+logger = logging.getLogger('server_watcher.alerts')
+
+OPERATORS = {">": operator.gt, ">=": operator.ge, "<": operator.lt, "<=": operator.le}
+
+AGGREGATES = ("last", "avg", "min", "max")
+
+# 每个窗口的窗格数，窗口边界的精度为窗口长度的 1/PANES
+PANES = 60
+
+# 趋势预测至少需要的样本数
+MIN_PREDICT_SAMPLES = 3
+
+# 序列键到规则的缓存条目上限，进程号等标签不断变化时清空重建
+SERIES_CACHE_LIMIT = 100000
+
+# 带标签的序列超过该时长（秒）没有出现（如进程已退出）时丢弃它的状态，正在触发的告警随之恢复
+SERIES_EXPIRE = 600
+
+FIRING = "firing"
+RESOLVED = "resolved"
+
+class RollingWindow:
+    """按窗格累加的滑动窗口，提供均值、最值和最小二乘斜率，每个样本 O(1)"""
+
+    def __init__(self, window, panes=PANES):
+        self.pane_width = window / panes
+        self.panes = panes
+        # 每个窗格: [编号, 计数, Σv, min, max, Σt, Σt², Σtv]
+        self.slots = deque()
+        self.n = 0
+        self.sv = self.st = self.stt = self.stv = 0.0
+        self.low = self.high = None
+        # 时间以第一个样本为原点，避免 epoch 秒的平方损失精度
+        self.origin = None
+        self.last = None
+
+    def add(self, timestamp, value):
+        if self.origin is None:
+            self.origin = timestamp
+        t = timestamp - self.origin
+        index = int(timestamp // self.pane_width)
+        if not self.slots or self.slots[-1][0] != index:
+            self._evict(index - self.panes)
+            self.slots.append([index, 0, 0.0, value, value, 0.0, 0.0, 0.0])
+        slot = self.slots[-1]
+        tt = t * t
+        tv = t * value
+        slot[1] += 1
+        slot[2] += value
+        if value < slot[3]:
+            slot[3] = value
+        if value > slot[4]:
+            slot[4] = value
+        slot[5] += t
+        slot[6] += tt
+        slot[7] += tv
+        self.n += 1
+        self.sv += value
+        self.st += t
+        self.stt += tt
+        self.stv += tv
+        if self.low is None or value < self.low:
+            self.low = value
+        if self.high is None or value > self.high:
+            self.high = value
+        self.last = (t, value)
+
+    def _evict(self, oldest):
+        evicted = False
+        while self.slots and self.slots[0][0] <= oldest:
+            _, n, sv, low, high, st, stt, stv = self.slots.popleft()
+            self.n -= n
+            self.sv -= sv
+            self.st -= st
+            self.stt -= stt
+            self.stv -= stv
+            evicted = evicted or low == self.low or high == self.high
+        if evicted:
+            # 只有滑出的窗格含有当前最值时才在剩余窗格中重新求最值
+            self.low = min((slot[3] for slot in self.slots), default=None)
+            self.high = max((slot[4] for slot in self.slots), default=None)
+
+    def aggregate(self, name):
+        if name == "avg":
+            return self.sv / self.n
+        if name == "min":
+            return self.low
+        if name == "max":
+            return self.high
+        return self.last[1]
+
+    def seconds_until(self, threshold, rising=True):
+        """按窗口内的线性趋势估算到达 threshold 还需的秒数，rising 为 False 时估算下降到 threshold 的时间。
+        趋势不朝向阈值或样本不足时返回 None"""
+        if self.n < MIN_PREDICT_SAMPLES:
+            return None
+        denominator = self.n * self.stt - self.st * self.st
+        if denominator <= 0:
+            return None
+        slope = (self.n * self.stv - self.st * self.sv) / denominator
+        intercept = (self.sv - slope * self.st) / self.n
+        t, _ = self.last
+        current = intercept + slope * t
+        if (current >= threshold) if rising else (current <= threshold):
+            return 0.0
+        if (slope <= 0) if rising else (slope >= 0):
+            return None
+        return (threshold - current) / slope
+
+class AlertRule:
+    """单条告警规则。
+
+    阈值规则: metric 的窗口聚合值（agg，默认 avg；window 为 0 时取最新值）与 threshold 比较，
+    条件持续 hold 秒后触发。趋势规则（predict）: 按 window 内的线性趋势预计 predict 秒内达到 threshold 时触发，
+    op 为 > / >= 时预测上升到阈值，< / <= 时预测下降到阈值（如可用内存降到下限）。
+    """
+
+    def __init__(self, name, metric, threshold=None, op=">", window=0, agg="avg", hold=0, predict=None,
+                 servers=None, severity="warning"):
+        if op not in OPERATORS:
+            raise ValueError(f"不支持的比较运算符: {op}")
+        if agg not in AGGREGATES:
+            raise ValueError(f"不支持的聚合方式: {agg}")
+        self.name = name
+        self.metric = metric
+        self.op = op
+        self.compare = OPERATORS[op]
+        self.window = parse_duration(window)
+        self.agg = agg if self.window else "last"
+        self.hold = parse_duration(hold)
+        self.predict = parse_duration(predict) if predict is not None else None
+        if self.predict is not None:
+            # 趋势规则默认预测使用率到 100%，窗口默认 1 小时
+            self.threshold = 100.0 if threshold is None else float(threshold)
+            self.window = self.window or 3600.0
+        elif threshold is None:
+            raise ValueError(f"告警规则 {name} 缺少 threshold")
+        else:
+            self.threshold = float(threshold)
+        self.servers = set(servers) if servers else None
+        self.severity = severity
+
+    @classmethod
+    def from_config(cls, rule_config):
+        options = dict(rule_config)
+        # for 是 Python 关键字，配置中的 for 对应 hold
+        if 'for' in options:
+            options['hold'] = options.pop('for')
+        return cls(**options)
+
+    def evaluate(self, window, timestamp, value):
+        """返回 (条件是否成立, 用于描述的值)"""
+        if window is None:
+            return self.compare(value, self.threshold), value
+        window.add(timestamp, value)
+        if self.predict is not None:
+            eta = window.seconds_until(self.threshold, rising=self.op in (">", ">="))
+            return eta is not None and eta <= self.predict, eta
+        current = window.aggregate(self.agg)
+        return self.compare(current, self.threshold), current
+
+    def describe(self, server_id, value, series=None):
+        metric = series or self.metric
+        if self.predict is not None:
+            direction = "升至" if self.op in (">", ">=") else "降至"
+            return f"{server_id} {metric} 按当前趋势预计 {value / 3600:.1f} 小时内{direction} {self.threshold:g}"
+        agg = f"{self.agg}({metric}, {self.window:g}s)" if self.agg != "last" else metric
+        return f"{server_id} {agg} = {value:.2f} {self.op} {self.threshold:g}"
+
+class _RuleState:
+    __slots__ = ("window", "pending_since", "firing", "last_seen")
+
+    def __init__(self, rule):
+        self.window = RollingWindow(rule.window) if rule.window else None
+        self.pending_since = None
+        self.firing = False
+        self.last_seen = None
+
+class AlertEngine:
+    """消费样本并维护每个 (规则, 服务器, 序列) 的状态。observe() 逐个样本更新，flush() 把本批产生的
+    触发/恢复事件一次性交给各告警输出；同一告警在恢复之前只发送一次触发事件。
+
+    规则的 metric 为不带标签的指标名（如 net_rx_bytes）时，同时匹配该指标的所有带标签序列，
+    每条序列（每个网卡、磁盘、进程）各自维护窗口和触发状态"""
+
+    def __init__(self, rules, sinks=()):
+        self.rules = rules
+        self.sinks = list(sinks)
+        self.by_metric = {}
+        for rule in rules:
+            self.by_metric.setdefault(rule.metric, []).append(rule)
+        self.states = {}
+        # 正在触发的告警: {(规则名, 服务器, 序列): 事件}
+        self.active = {}
+        self.events = []
+        # 带标签的序列键 -> 按指标名匹配到的规则，避免每个样本都重新解析序列键
+        self.series_rules = {}
+        self.last_expire = None
+
+    @classmethod
+    def from_config(cls, alerts_config, deliver=True, warn=logger.warning):
+        """根据 servers.yaml 的 alerts 配置构建引擎，未配置规则时返回 None。
+        deliver 为 False 时只维护告警状态（如看板订阅守护进程时由守护进程负责发送）"""
+        if not alerts_config or not alerts_config.get('rules'):
+            return None
+        rules = []
+        for rule_config in alerts_config['rules']:
+            try:
+                rules.append(AlertRule.from_config(rule_config))
+            except (TypeError, ValueError) as e:
+                warn(f"忽略无效的告警规则 {rule_config.get('name', rule_config)}: {e}")
+        sinks = []
+        for sink_config in (alerts_config.get('sinks') or [{'type': 'LogSink'}]) if deliver else []:
+            sink_type = sink_config.get('type')
+            sink_class = WatcherRegister.get_registered(WatcherModuleType.ALERT_SINK, sink_type, sink_config.get('module'))
+            if sink_class:
+                sinks.append(sink_class(**{k: v for k, v in sink_config.items() if k not in ('type', 'module')}))
+            else:
+                warn(f"未找到指定的告警输出类型: {sink_type}")
+        return cls(rules, sinks)
+
+    def observe(self, server_id, timestamp, values):
+        for metric, rules in self.by_metric.items():
+            value = values.get(metric)
+            if value is not None:
+                self._evaluate(rules, server_id, metric, timestamp, value)
+        for key, value in values.items():
+            if "{" not in key:
+                continue
+            rules = self.series_rules.get(key)
+            if rules is None:
+                if len(self.series_rules) > SERIES_CACHE_LIMIT:
+                    self.series_rules.clear()
+                rules = self.series_rules[key] = self.by_metric.get(base_name(key), ())
+            if rules:
+                self._evaluate(rules, server_id, key, timestamp, value)
+        if self.last_expire is None:
+            self.last_expire = timestamp
+        elif timestamp - self.last_expire >= SERIES_EXPIRE / 10:
+            self.last_expire = timestamp
+            self._expire(timestamp)
+
+    def _evaluate(self, rules, server_id, series, timestamp, value):
+        if value != value:
+            return
+        for rule in rules:
+            if rule.servers is not None and server_id not in rule.servers:
+                continue
+            key = (rule.name, server_id, series)
+            state = self.states.get(key)
+            if state is None:
+                state = self.states[key] = _RuleState(rule)
+            state.last_seen = timestamp
+            condition, current = rule.evaluate(state.window, timestamp, value)
+            if not condition:
+                state.pending_since = None
+                if state.firing:
+                    state.firing = False
+                    self._emit(rule, server_id, series, RESOLVED, timestamp, value)
+                continue
+            if state.pending_since is None:
+                state.pending_since = timestamp
+            if not state.firing and timestamp - state.pending_since >= rule.hold:
+                state.firing = True
+                self._emit(rule, server_id, series, FIRING, timestamp, current)
+
+    def _expire(self, now):
+        rules = {rule.name: rule for rule in self.rules}
+        for key in [key for key, state in self.states.items()
+                    if "{" in key[2] and now - state.last_seen > SERIES_EXPIRE]:
+            state = self.states.pop(key)
+            if state.firing:
+                self._emit(rules[key[0]], key[1], key[2], RESOLVED, now, None)
+
+    def _emit(self, rule, server_id, series, status, timestamp, value):
+        event = {"rule": rule.name, "server_id": server_id, "metric": series, "status": status,
+                 "severity": rule.severity, "timestamp": timestamp, "value": value,
+                 "message": rule.describe(server_id, value, series) if status == FIRING
+                 else f"{server_id} {rule.name} {series} 已恢复"}
+        if status == FIRING:
+            self.active[(rule.name, server_id, series)] = event
+            logger.warning(f"告警触发 [{rule.name}] {event['message']}")
+        else:
+            self.active.pop((rule.name, server_id, series), None)
+            logger.info(f"告警恢复 [{rule.name}] {event['message']}")
+        self.events.append(event)
+
+    def flush(self):
+        """把本批事件交给所有告警输出，返回事件列表"""
+        events, self.events = self.events, []
+        if events:
+            for sink in self.sinks:
+                try:
+                    sink.send(events)
+                except Exception as e:
+                    logger.error(f"告警输出 {type(sink).__name__} 发送失败: {e}")
+        return events
+
+    def forget(self, server_id):
+        """服务器被移除时丢弃它的状态"""
+        for key in [key for key in self.states if key[1] == server_id]:
+            del self.states[key]
+            self.active.pop(key, None)
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+@WatcherRegister.register(WatcherModuleType.ALERT_SINK)
+class LogSink:
+    """把事件以 JSON 行追加到文件"""
+
+    def __init__(self, path="alerts.log"):
+        self.path = path
+
+    def send(self, events):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for event in events:
+                f.write(json.dumps(event, ensure_ascii=False) + "\n")
+
+    def close(self):
+        pass
+
+@WatcherRegister.register(WatcherModuleType.ALERT_SINK)
+class WebhookSink:
+    """在后台线程中把每批事件以 JSON POST 到 url，接收端慢或不可用时不会阻塞采集和看板"""
+
+    def __init__(self, url, timeout=5, max_pending=1000):
+        self.url = url
+        self.timeout = timeout
+        self.queue = queue.Queue(max_pending)
+        self.thread = threading.Thread(target=self._send_loop, name="alert-webhook", daemon=True)
+        self.thread.start()
+
+    def send(self, events):
+        try:
+            self.queue.put_nowait(events)
+        except queue.Full:
+            logger.warning(f"告警 webhook 积压过多，丢弃 {len(events)} 个事件")
+
+    def _send_loop(self):
+        while True:
+            events = self.queue.get()
+            if events is None:
+                break
+            body = json.dumps({"alerts": events}, ensure_ascii=False).encode('utf-8')
+            request = urllib.request.Request(self.url, data=body, headers={"Content-Type": "application/json"})
+            try:
+                with urllib.request.urlopen(request, timeout=self.timeout):
+                    pass
+            except Exception as e:
+                logger.error(f"发送告警到 {self.url} 失败: {e}")
+
+    def close(self, timeout=5):
+        self.queue.put(None)
+        self.thread.join(timeout=timeout)
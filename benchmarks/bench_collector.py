@@ -0,0 +1,164 @@
+"""采集器扩展性基准：用本地模拟集群（fake_fleet.py）驱动 ServerManager，测量不同主机数下的
+样本吞吐、采集延迟、采集进程 CPU 与内存以及看板取数耗时。
+
+用法: python benchmarks/bench_collector.py [--hosts 10 100 1000] [--duration 30] [--output results.json]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_fleet import FleetOptions, serve
+from main import ServerManager
+from ssh_pool import pool_options
+
+_CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+
+def process_usage(pids):
+    """读取 /proc 得到一组进程的 (CPU 秒数, RSS 字节数)"""
+    cpu = 0.0
+    rss = 0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            with open(f"/proc/{pid}/statm") as f:
+                rss += int(f.read().split()[1]) * _PAGE_SIZE
+        except OSError:
+            continue
+        # utime、stime 是 ")" 之后的第 12、13 个字段
+        cpu += (int(fields[11]) + int(fields[12])) / _CLOCK_TICKS
+    return cpu, rss
+
+def collector_pids(manager):
+    pids = [os.getpid()]
+    for process, _, _ in getattr(manager.collector, "shards", []):
+        pids.append(process.pid)
+    return pids
+
+def percentiles(values, scale=1000.0):
+    if not len(values):
+        return None
+    values = np.asarray(values) * scale
+    return {name: round(float(value), 2) for name, value in
+            zip(("p50", "p90", "p99", "max"), np.percentile(values, [50, 90, 99, 100]))}
+
+def build_servers(hosts, port, args):
+    metrics = [{"type": "CpuMetric"}, {"type": "MemoryMetric"}, {"type": "DiskMetric"}]
+    return {
+        f"host-{index:04d}": {"id": f"host-{index:04d}", "hostname": "127.0.0.1", "port": port,
+                              "username": f"host-{index:04d}", "metrics": metrics}
+        for index in range(hosts)
+    }
+
+def run(hosts, port, args):
+    options = FleetOptions(args.rtt, args.latency, args.fail_rate, args.down_rate)
+    ready = multiprocessing.Event()
+    fleet = multiprocessing.Process(target=serve, args=(port, options, ready), daemon=True)
+    fleet.start()
+    if not ready.wait(30):
+        raise RuntimeError("模拟集群启动超时")
+
+    manager = ServerManager()
+    manager.servers = build_servers(hosts, port, args)
+    manager.interval = args.interval
+    manager.collector_workers = args.workers
+    manager.history_capacity = 600
+    manager.config = {"collector": {"socket": ""}}
+    manager.pool_options = {**pool_options({}), "handshake_rate": args.handshake_rate,
+                            "handshake_concurrency": args.handshake_concurrency}
+    expected = sum(1 for username in manager.servers if not options.is_down(username))
+
+    # 预热：等到所有可达主机都有首个样本
+    started = time.perf_counter()
+    manager.start_monitoring()
+    while time.perf_counter() - started < args.warmup_timeout:
+        manager.process_queue_data()
+        if sum(1 for buffer in manager.server_data.values() if len(buffer)) >= expected:
+            break
+        time.sleep(args.poll)
+    warmup = time.perf_counter() - started
+
+    pids = collector_pids(manager)
+    versions = {server_id: buffer.version for server_id, buffer in manager.server_data.items()}
+    latencies, drains = [], []
+    samples = 0
+    cpu_start, _ = process_usage(pids)
+    rss_peak = 0
+    measure_start = time.perf_counter()
+    while time.perf_counter() - measure_start < args.duration:
+        tick = time.perf_counter()
+        manager.process_queue_data()
+        drains.append(time.perf_counter() - tick)
+        now = time.time()
+        for server_id, buffer in manager.server_data.items():
+            new = buffer.version - versions[server_id]
+            if new:
+                # 从截止时间（样本时间戳）到看板取到该样本的延迟，包含轮询间隔
+                latencies.extend(now - buffer.timestamps_view(new))
+                versions[server_id] = buffer.version
+                samples += new
+        rss_peak = max(rss_peak, process_usage(pids)[1])
+        time.sleep(args.poll)
+    elapsed = time.perf_counter() - measure_start
+    cpu_end, _ = process_usage(pids)
+
+    manager.stop_monitoring()
+    fleet.terminate()
+    fleet.join()
+    return {
+        "hosts": hosts,
+        "reachable_hosts": expected,
+        "warmup_seconds": round(warmup, 2),
+        "samples": samples,
+        "samples_per_sec": round(samples / elapsed, 1),
+        "expected_samples_per_sec": round(expected / args.interval, 1),
+        "tick_latency_ms": percentiles(latencies),
+        "collector_cpu_percent": round((cpu_end - cpu_start) / elapsed * 100, 1),
+        "collector_rss_mb": round(rss_peak / 1024 / 1024, 1),
+        "drain_ms": percentiles(drains),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--hosts", type=int, nargs="+", default=[10, 100, 1000], help="依次测试的主机数")
+    parser.add_argument("--duration", type=float, default=30, help="每轮预热完成后的测量时长（秒）")
+    parser.add_argument("--interval", type=float, default=5, help="采集周期（秒）")
+    parser.add_argument("--workers", default=0, help="采集分片进程数，同 collector_workers")
+    parser.add_argument("--handshake-rate", type=float, default=200, help="每秒握手数上限")
+    parser.add_argument("--handshake-concurrency", type=int, default=32, help="同时进行的握手数上限")
+    parser.add_argument("--rtt", type=float, default=0.002, help="模拟的网络往返时间（秒）")
+    parser.add_argument("--latency", type=float, default=0.005, help="模拟的命令执行时间（秒）")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="命令失败的概率")
+    parser.add_argument("--down-rate", type=float, default=0.0, help="不可达主机的比例")
+    parser.add_argument("--warmup-timeout", type=float, default=120, help="等待所有主机出现首个样本的最长时间（秒）")
+    parser.add_argument("--poll", type=float, default=0.1, help="看板取数的轮询间隔（秒）")
+    parser.add_argument("--port", type=int, default=18022, help="模拟集群的起始端口，每轮加一")
+    parser.add_argument("--output", help="把结果以 JSON 写入该文件")
+    args = parser.parse_args()
+    args.workers = args.workers if args.workers == "auto" else int(args.workers)
+
+    results = []
+    for index, hosts in enumerate(args.hosts):
+        result = run(hosts, args.port + index, args)
+        results.append(result)
+        latency = result["tick_latency_ms"] or {}
+        print(f"{hosts:>5} 台: {result['samples_per_sec']:>8} 样本/秒 (期望 {result['expected_samples_per_sec']}), "
+              f"延迟 p50/p99 {latency.get('p50')}/{latency.get('p99')} ms, CPU {result['collector_cpu_percent']}%, "
+              f"RSS {result['collector_rss_mb']} MB, 取数 p99 {(result['drain_ms'] or {}).get('p99')} ms, "
+              f"预热 {result['warmup_seconds']} 秒")
+    if args.output:
+        config = {key: value for key, value in vars(args).items() if key not in ("output", "hosts")}
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({"python": platform.python_version(), "cpus": os.cpu_count(), "config": config,
+                       "results": results}, f, indent=2, ensure_ascii=False)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""看板渲染路径基准：回放录制的样本流（可把每台主机复制为 N 台），按看板主循环的顺序取数、
+写入缓冲区并渲染图表和最新数据，测量处理吞吐、样本延迟、取数和各面板的渲染耗时。
+
+没有录制文件时可以先用本地模拟集群（fake_fleet.py）录制一段:
+    python benchmarks/bench_render.py --record-hosts 20 --record-seconds 60 --recording fleet.swr
+之后重复使用同一录制文件，结果可以在不同版本之间对比:
+    python benchmarks/bench_render.py --recording fleet.swr --speed max --clones 1 10 50 --output render.json
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import streamlit as st
+from fake_fleet import FleetOptions, serve
+from bench_collector import build_servers
+from charts import ChartRenderer, DirtyTracker
+from collector import CollectorEngine
+from fleet import FleetRenderer
+from main import ServerManager, render_combined_metrics, show_latest_metrics
+from replay import ReplaySource, SampleRecorder
+from ssh_pool import pool_options
+
+def quantiles(histogram):
+    """直方图的分位数（毫秒），格式与 bench_collector.percentiles 相同"""
+    if histogram is None or not histogram.count:
+        return None
+    values = {f"p{int(q * 100)}": histogram.quantile(q) for q in (0.5, 0.9, 0.99)}
+    values["max"] = histogram.max
+    return {name: round(value * 1000, 2) for name, value in values.items()}
+
+def record(args):
+    """用模拟集群采集 record_seconds 秒，样本直接写入录制文件（录制文件作为采集引擎的样本通道）"""
+    ready = multiprocessing.Event()
+    fleet = multiprocessing.Process(target=serve, args=(args.port, FleetOptions(), ready), daemon=True)
+    fleet.start()
+    if not ready.wait(30):
+        raise RuntimeError("模拟集群启动超时")
+    servers = build_servers(args.record_hosts, args.port, args)
+    recorder = SampleRecorder(args.recording, {"interval": args.interval, "servers": list(servers.values())})
+    engine = CollectorEngine(args.interval, recorder, {**pool_options({}), "handshake_rate": 200,
+                                                       "handshake_concurrency": 32})
+    for server_config in servers.values():
+        engine.add_server(server_config)
+    time.sleep(args.record_seconds)
+    engine.shutdown()
+    recorder.close()
+    fleet.terminate()
+    fleet.join()
+    print(f"已录制 {recorder.count} 个样本到 {args.recording} ({os.path.getsize(args.recording) / 1024:.0f} KB)")
+
+def run(clones, args):
+    manager = ServerManager()
+    manager.load_replay(ReplaySource(args.recording, args.speed, clones, loop=True))
+    manager.history_capacity = args.history
+    manager.start_monitoring()
+    chart_placeholder, metrics_placeholder = st.empty(), st.empty()
+    renderer, tracker, fleet_renderer = ChartRenderer(manager.chart_width), DirtyTracker(), FleetRenderer()
+
+    samples = frames = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < args.duration:
+        before = sum(buffer.version for buffer in manager.server_data.values())
+        # 与看板主循环相同的顺序：取数、写入缓冲区，再渲染有变化的面板
+        manager.process_queue_data()
+        samples += sum(buffer.version for buffer in manager.server_data.values()) - before
+        if args.view == "fleet":
+            with manager.health.time("render", "集群概览"):
+                fleet_renderer.render(manager, chart_placeholder)
+        else:
+            render_combined_metrics(manager, chart_placeholder, renderer)
+            with manager.health.time("render", "最新数据"):
+                show_latest_metrics(manager, metrics_placeholder, tracker)
+        frames += 1
+        if manager.replay.speed is not None:
+            time.sleep(args.poll)
+    elapsed = time.perf_counter() - started
+    manager.stop_monitoring()
+
+    stages = manager.health.by_stage()
+    return {
+        "hosts": len(manager.servers),
+        "frames": frames,
+        "samples": samples,
+        "samples_per_sec": round(samples / elapsed, 1),
+        "frames_per_sec": round(frames / elapsed, 2),
+        # 不等待回放时样本时间戳保持录制间隔，延迟没有意义
+        "lag_ms": quantiles(stages.get("lag")) if manager.replay.speed is not None else None,
+        "drain_ms": quantiles(stages.get("drain")),
+        "render_ms": {panel: quantiles(histogram) for panel, histogram in manager.health.slowest_hosts("render")},
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--recording", required=True, help="录制文件路径（见 collector.py --record）")
+    parser.add_argument("--record-hosts", type=int, default=0, help="先用模拟集群录制该数量的主机")
+    parser.add_argument("--record-seconds", type=float, default=60, help="录制时长（秒）")
+    parser.add_argument("--interval", type=float, default=5, help="录制时的采集周期（秒）")
+    parser.add_argument("--port", type=int, default=18122, help="录制时模拟集群的端口")
+    parser.add_argument("--speed", default="max", help="回放倍速，max 表示不等待，默认 max")
+    parser.add_argument("--clones", type=int, nargs="+", default=[1, 10, 50], help="依次测试的主机复制倍数")
+    parser.add_argument("--view", choices=["single", "fleet"], default="single", help="渲染逐台图表或集群概览")
+    parser.add_argument("--duration", type=float, default=30, help="每轮的测量时长（秒）")
+    parser.add_argument("--history", type=int, default=3600, help="每个服务器的缓冲区容量")
+    parser.add_argument("--poll", type=float, default=1.0, help="按倍速回放时的取数间隔（秒），同看板主循环")
+    parser.add_argument("--output", help="把结果以 JSON 写入该文件")
+    args = parser.parse_args()
+    # 没有 Streamlit 会话时 st.* 调用仍会构建图表和表格消息，只是不发送给浏览器；屏蔽每次调用的缺少会话警告
+    logging.getLogger("streamlit.runtime.scriptrunner_utils.script_run_context").addFilter(lambda record: False)
+
+    if args.record_hosts:
+        record(args)
+    results = []
+    for clones in args.clones:
+        result = run(clones, args)
+        results.append(result)
+        render = ", ".join(f"{panel} p50/p99 {summary['p50']}/{summary['p99']} ms"
+                           for panel, summary in result["render_ms"].items())
+        print(f"{result['hosts']:>5} 台: {result['samples_per_sec']:>9} 样本/秒, {result['frames_per_sec']} 帧/秒, "
+              f"取数 p99 {(result['drain_ms'] or {}).get('p99')} ms, {render}")
+    if args.output:
+        config = {key: value for key, value in vars(args).items() if key not in ("output", "clones")}
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({"python": platform.python_version(), "cpus": os.cpu_count(), "config": config,
+                       "results": results}, f, indent=2, ensure_ascii=False)
+
+if __name__ == "__main__":
+    main()
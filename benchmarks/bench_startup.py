@@ -0,0 +1,150 @@
+"""采集守护进程启动基准：测量 collector 模块的导入耗时、从启动守护进程到订阅端收到首个样本的时间，
+以及每个采集分片进程的内存（RSS 和按共享页分摊后的 PSS）。
+
+守护进程以子进程方式运行（python collector.py），连接本地模拟集群（fake_fleet.py），结果可以在不同版本之间对比:
+    python benchmarks/bench_startup.py [--hosts 20] [--workers 2] [--runs 5] [--output startup.json]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import yaml
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fake_fleet import FleetOptions, serve
+from bench_collector import build_servers
+from ipc import SampleSubscriber
+
+# 检查采集进程是否导入了这些与采集无关的库
+HEAVY_MODULES = ("numpy", "yaml", "pandas", "streamlit", "plotly", "pyarrow", "sqlite3", "http.server")
+
+def import_time(module, runs):
+    """在新的解释器中导入 module，返回 (中位耗时毫秒, 导入后已加载的重型库)"""
+    code = (f"import sys, time; started = time.perf_counter(); import {module}; "
+            f"elapsed = time.perf_counter() - started; "
+            f"print(elapsed, ','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))")
+    timings, loaded = [], ""
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True,
+                                check=True).stdout.split()
+        timings.append(float(output[0]) * 1000)
+        loaded = output[1] if len(output) > 1 else ""
+    return round(statistics.median(timings), 1), loaded.split(",") if loaded else []
+
+def memory(pid):
+    """返回进程的 (RSS, PSS)，单位 MB"""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            name, _, rest = line.partition(":")
+            if name in ("Rss", "Pss"):
+                values[name] = int(rest.split()[0]) / 1024
+    return round(values["Rss"], 1), round(values["Pss"], 1)
+
+def shard_pids(pid):
+    """守护进程的采集分片子进程（不含 multiprocessing 的 resource_tracker）"""
+    with open(f"/proc/{pid}/task/{pid}/children") as f:
+        children = [int(child) for child in f.read().split()]
+    pids = []
+    for child in children:
+        with open(f"/proc/{child}/cmdline", 'rb') as f:
+            if b"resource_tracker" not in f.read():
+                pids.append(child)
+    return pids
+
+def run_daemon(config_path, socket_path, hosts, timeout):
+    """启动守护进程，返回 (首个样本秒数, 全部主机都有样本的秒数, 分片进程内存列表, 守护进程内存)"""
+    subscriber = SampleSubscriber(socket_path, retry_interval=0.01)
+    seen = set()
+    first = everyone = None
+    started = time.perf_counter()
+    daemon = subprocess.Popen([sys.executable, "collector.py", "--config", config_path, "--socket", socket_path],
+                              cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    subscriber.start()
+    try:
+        while everyone is None and time.perf_counter() - started < timeout:
+            for sample in subscriber.drain():
+                if sample.get("status") != "data":
+                    continue
+                if first is None:
+                    first = time.perf_counter() - started
+                seen.add(sample["server_id"])
+                if len(seen) >= hosts:
+                    everyone = time.perf_counter() - started
+            time.sleep(0.005)
+        workers = [memory(pid) for pid in shard_pids(daemon.pid)]
+        return first, everyone, workers, memory(daemon.pid)
+    finally:
+        subscriber.close()
+        daemon.terminate()
+        daemon.wait(10)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--hosts", type=int, default=20, help="模拟主机数")
+    parser.add_argument("--workers", type=int, default=2, help="采集分片进程数 (collector_workers)")
+    parser.add_argument("--interval", type=float, default=1, help="采集周期（秒），较短的周期使首个样本的时间主要取决于启动开销")
+    parser.add_argument("--runs", type=int, default=5, help="重复次数，取中位数")
+    parser.add_argument("--port", type=int, default=18123, help="模拟集群的端口")
+    parser.add_argument("--timeout", type=float, default=60, help="单次等待样本的超时（秒）")
+    parser.add_argument("--output", help="把结果以 JSON 写入该文件")
+    args = parser.parse_args()
+
+    ready = multiprocessing.Event()
+    fleet = multiprocessing.Process(target=serve, args=(args.port, FleetOptions(), ready), daemon=True)
+    fleet.start()
+    if not ready.wait(30):
+        raise RuntimeError("模拟集群启动超时")
+
+    import_ms, loaded = import_time("collector", args.runs)
+    print(f"import collector: {import_ms} ms，已加载: {', '.join(loaded) or '无'}")
+
+    workdir = tempfile.mkdtemp(prefix="sw-startup-")
+    config_path = os.path.join(workdir, "servers.yaml")
+    config = {"interval": args.interval, "collector_workers": args.workers,
+              "servers": list(build_servers(args.hosts, args.port, args).values())}
+    with open(config_path, 'w', encoding='utf-8') as f:
+        yaml.safe_dump(config, f, allow_unicode=True)
+
+    runs = []
+    for index in range(args.runs):
+        socket_path = os.path.join(workdir, f"collector-{index}.sock")
+        first, everyone, workers, daemon = run_daemon(config_path, socket_path, args.hosts, args.timeout)
+        runs.append({"first_sample_s": first, "all_hosts_s": everyone, "workers": workers, "daemon": daemon})
+        print(f"第 {index + 1} 次: 首个样本 {first and round(first, 3)} 秒，全部主机 {everyone and round(everyone, 3)} 秒，"
+              f"分片 RSS/PSS {', '.join(f'{rss}/{pss}' for rss, pss in workers)} MB，守护进程 RSS {daemon[0]} MB")
+    fleet.terminate()
+    fleet.join()
+
+    def median(values):
+        values = [value for value in values if value is not None]
+        return round(statistics.median(values), 3) if values else None
+
+    summary = {
+        "import_collector_ms": import_ms,
+        "import_loaded": loaded,
+        "first_sample_s": median(run["first_sample_s"] for run in runs),
+        "all_hosts_s": median(run["all_hosts_s"] for run in runs),
+        "worker_rss_mb": median(rss for run in runs for rss, _ in run["workers"]),
+        "worker_pss_mb": median(pss for run in runs for _, pss in run["workers"]),
+        "daemon_rss_mb": median(run["daemon"][0] for run in runs),
+    }
+    print(f"中位数: 首个样本 {summary['first_sample_s']} 秒，全部主机 {summary['all_hosts_s']} 秒，"
+          f"分片 RSS {summary['worker_rss_mb']} MB / PSS {summary['worker_pss_mb']} MB，"
+          f"守护进程 RSS {summary['daemon_rss_mb']} MB")
+    if args.output:
+        config = {key: value for key, value in vars(args).items() if key != "output"}
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({"python": platform.python_version(), "cpus": os.cpu_count(), "config": config,
+                       "summary": summary, "runs": runs}, f, indent=2, ensure_ascii=False)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""本地模拟服务器集群：一个 asyncssh 服务端按登录用户名区分主机（host-0000、host-0001 ...），
+每个用户名在采集端对应一个独立的连接，用于在没有真实服务器的情况下测量采集器的扩展能力。
+
+探测脚本不会真正执行，服务端从命令中解析出数据源名称，返回预先生成的 /proc/stat、/proc/meminfo、
+statvfs、/proc/diskstats、/proc/net/dev 和进程列表输出（计数器每次调用递增）。可配置网络往返时间、命令耗时、命令失败率和不可达主机比例。
+
+用法: python benchmarks/fake_fleet.py [--port 8022] [--rtt 0.002] [--latency 0.005] [--fail-rate 0] [--down-rate 0]
+"""
+import argparse
+import asyncio
+import random
+import re
+import asyncssh
+
+SECTION = re.compile(r"@@sw:(\w+)")
+
+MEMINFO = "MemTotal:       16384000 kB\nMemFree:         2048000 kB\nMemAvailable:    {available} kB\n"
+
+class FleetOptions:
+    def __init__(self, rtt=0.002, latency=0.005, fail_rate=0.0, down_rate=0.0, seed=0):
+        self.rtt = rtt
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.down_rate = down_rate
+        self.random = random.Random(seed)
+
+    def is_down(self, username):
+        # 按用户名哈希决定是否不可达，同一主机在整个测试中状态一致
+        return random.Random(username).random() < self.down_rate
+
+class FakeHost:
+    """单个模拟主机的计数器状态"""
+
+    def __init__(self, cores=4, interfaces=2, processes=50):
+        self.cores = cores
+        self.jiffies = [[0] * 8 for _ in range(cores)]
+        # 每个网卡: 接收字节、发送字节；磁盘: 读扇区、写扇区、繁忙毫秒；每个进程: CPU jiffies
+        self.netdev = [[0, 0] for _ in range(interfaces)]
+        self.diskstats = [0, 0, 0]
+        self.processes = [0] * processes
+
+    def stat(self, rng):
+        lines = []
+        for counters in self.jiffies:
+            # user, nice, system, idle, iowait, irq, softirq, steal
+            for index, step in enumerate((rng.randint(0, 60), 0, rng.randint(0, 20), rng.randint(20, 100),
+                                          rng.randint(0, 5), 0, rng.randint(0, 2), 0)):
+                counters[index] += step
+        total = [sum(column) for column in zip(*self.jiffies)]
+        lines.append("cpu  " + " ".join(map(str, total)) + " 0 0")
+        for index, counters in enumerate(self.jiffies):
+            lines.append(f"cpu{index} " + " ".join(map(str, counters)) + " 0 0")
+        return "\n".join(lines) + "\n"
+
+    def output(self, source, rng):
+        if source == "stat":
+            return self.stat(rng)
+        if source == "meminfo":
+            return MEMINFO.format(available=rng.randint(4000000, 12000000))
+        if source == "statvfs":
+            return "/ 65536000 30000000 27000000 4096\n"
+        if source == "netdev":
+            return self.netdev_output(rng)
+        if source == "diskstats":
+            return self.diskstats_output(rng)
+        if source == "pidstat":
+            return self.pidstat_output(rng)
+        return ""
+
+    def netdev_output(self, rng):
+        lines = ["Inter-|   Receive", " face |bytes packets errs drop fifo frame compressed multicast|bytes"]
+        for index, counters in enumerate(self.netdev):
+            counters[0] += rng.randint(0, 1000000)
+            counters[1] += rng.randint(0, 500000)
+            lines.append(f"  eth{index}: {counters[0]} 0 0 0 0 0 0 0 {counters[1]} 0 0 0 0 0 0 0")
+        return "\n".join(lines) + "\n"
+
+    def diskstats_output(self, rng):
+        counters = self.diskstats
+        counters[0] += rng.randint(0, 2000)
+        counters[1] += rng.randint(0, 4000)
+        counters[2] += rng.randint(0, 1000)
+        return f"   8       0 sda 0 0 {counters[0]} 0 0 0 {counters[1]} 0 0 {counters[2]} 0\n"
+
+    def pidstat_output(self, rng):
+        lines = []
+        for index in range(len(self.processes)):
+            self.processes[index] += rng.randint(0, 10)
+            lines.append(f"{1000 + index} (worker-{index}) S 1 0 0 0 -1 0 0 0 0 0 {self.processes[index]} 0 "
+                         f"0 0 20 0 1 0 100 0 {rng.randint(1000, 100000)}")
+        return "\n".join(lines) + "\n"
+
+class FleetServer(asyncssh.SSHServer):
+    def __init__(self, options):
+        self.options = options
+
+    async def begin_auth(self, username):
+        # 握手阶段的一次往返
+        await asyncio.sleep(self.options.rtt)
+        # 不可达主机：要求认证但不提供任何认证方式，客户端会收到认证失败
+        return self.options.is_down(username)
+
+    def password_auth_supported(self):
+        return False
+
+    def public_key_auth_supported(self):
+        return False
+
+def make_handler(options, hosts):
+    async def handle(process):
+        username = process.get_extra_info('username')
+        host = hosts.setdefault(username, FakeHost())
+        command = process.command or ""
+        await asyncio.sleep(options.rtt + options.latency)
+        if not command.startswith("echo") or options.random.random() < options.fail_rate:
+            # 流式代理（python3）等未模拟的命令以及按失败率注入的失败
+            process.exit(127 if not command.startswith("echo") else 1)
+            return
+        parts = []
+        for source in SECTION.findall(command):
+            parts.append(f"@@sw:{source}\n{host.output(source, options.random)}")
+        process.stdout.write("".join(parts))
+        process.exit(0)
+    return handle
+
+async def start_fleet(port=8022, options=None, host="127.0.0.1"):
+    options = options or FleetOptions()
+    hosts = {}
+    key = asyncssh.generate_private_key('ssh-ed25519')
+    return await asyncssh.create_server(lambda: FleetServer(options), host, port, server_host_keys=[key],
+                                        process_factory=make_handler(options, hosts))
+
+def serve(port, options, ready=None):
+    """在当前进程中运行模拟集群直到被终止，ready 为 multiprocessing.Event 时在开始监听后置位"""
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    loop.run_until_complete(start_fleet(port, options))
+    if ready is not None:
+        ready.set()
+    loop.run_forever()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8022)
+    parser.add_argument("--rtt", type=float, default=0.002, help="模拟的网络往返时间（秒）")
+    parser.add_argument("--latency", type=float, default=0.005, help="模拟的命令执行时间（秒）")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="命令失败的概率")
+    parser.add_argument("--down-rate", type=float, default=0.0, help="不可达主机的比例")
+    args = parser.parse_args()
+    print(f"模拟集群监听 127.0.0.1:{args.port}，以任意用户名登录即为一个主机")
+    serve(args.port, FleetOptions(args.rtt, args.latency, args.fail_rate, args.down_rate))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+import time
+import numpy as np
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+from series_buffer import to_datetimes
+from series import base_name, is_labeled, label_text
+from downsample import DownsampleCache, bucket_width_for
+
+COLORS = ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd', '#8c564b']
+
+class DirtyTracker:
+    """记录某个占位符上次渲染时各服务器缓冲区的版本号，用来判断哪些服务器有新样本"""
+
+    def __init__(self):
+        self.placeholder = None
+        self.versions = {}
+
+    def dirty(self, placeholder, server_data):
+        # Streamlit 重新运行脚本后占位符是新的，需要完整重绘
+        if placeholder is not self.placeholder:
+            return set(server_data)
+        return {server_id for server_id, buffer in server_data.items()
+                if self.versions.get(server_id) != buffer.version}
+
+    def mark(self, placeholder, server_data):
+        self.placeholder = placeholder
+        self.versions = {server_id: buffer.version for server_id, buffer in server_data.items()}
+
+class ChartRenderer:
+    """组合图表的增量渲染。
+
+    没有新样本时不重绘；指标集合不变时复用缓存的子图布局和曲线，
+    只更新有新样本的服务器对应的曲线数据。
+    """
+
+    def __init__(self, width=1600):
+        self.tracker = DirtyTracker()
+        self.figure = None
+        self.layout_key = None
+        self.traces = {}
+        # 每条曲线的点数预算：每个像素一个桶，每个桶最多两个点
+        self.width = width
+        self.window = None
+        self.cache = DownsampleCache()
+
+    def _metrics(self, server_data):
+        # 动态获取所有指标（使用列表而不是集合）
+        all_metrics = []
+        for buffer in server_data.values():
+            for metric in buffer.columns:
+                if metric not in all_metrics:
+                    all_metrics.append(metric)
+        return all_metrics
+
+    def _build_figure(self, server_manager, server_data, all_metrics):
+        # 带标签的序列按指标名合并到同一个子图，如每个网卡的 net_rx_bytes 是同一子图中的多条曲线
+        rows = {}
+        for metric in all_metrics:
+            rows.setdefault(base_name(metric), []).append(metric)
+        titles = []
+        for name in rows:
+            label = name
+            for server_id in server_data:
+                label = server_manager.get_metric_labels(server_id).get(name, label)
+            titles.append(label)
+        fig = make_subplots(rows=len(rows), cols=1, subplot_titles=titles,
+                            shared_xaxes=True, vertical_spacing=0.1 if len(rows) < 8 else 0.3 / len(rows))
+        self.traces = {}
+        for idx, server_id in enumerate(server_data):
+            color = COLORS[idx % len(COLORS)]
+            labels = server_manager.get_metric_labels(server_id)
+            for row, (name, metrics) in enumerate(rows.items(), 1):
+                for metric in metrics:
+                    labeled = is_labeled(metric)
+                    fig.add_trace(
+                        # 按各自周期采集的指标在其他样本中为 NaN，连接缺口以免曲线断成孤立的点
+                        go.Scatter(x=[], y=[], mode='lines+markers', connectgaps=True,
+                                   name=f"{server_id} {label_text(metric) if labeled else labels.get(metric, metric)}",
+                                   # 同一子图中有多条带标签的曲线时不填充，避免互相遮挡
+                                   line=dict(color=None if labeled else color, width=2),
+                                   fill=None if labeled else 'tozeroy', legendgroup=server_id),
+                        row=row, col=1
+                    )
+                    self.traces[(server_id, metric)] = len(fig.data) - 1
+
+        # uirevision 保持用户的缩放和图例状态，更新数据时不会被重置
+        fig.update_layout(height=300 * len(rows), title_text="所有服务器资源使用率", showlegend=True,
+                          legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
+                          uirevision="combined")
+        for i, name in enumerate(rows, 1):
+            fig.update_yaxes(range=[0, 100] if "percentage" in name or "usage" in name else None,
+                             row=i, col=1)
+        fig.update_xaxes(title_text="时间", row=len(rows), col=1)
+        return fig
+
+    def _series(self, server_id, buffer, metric, timestamps, columns):
+        """返回用于绘图的 (时间戳, 值)，点数超过预算时降采样"""
+        values = columns.get(metric)
+        if values is None or np.isnan(values).all():
+            return None, None
+        if len(timestamps) <= 2 * self.width:
+            return timestamps, values
+        span = self.window or timestamps[-1] - timestamps[0]
+        bucket_width = bucket_width_for(span, self.width)
+        return self.cache.get((server_id, metric, self.window, bucket_width), id(buffer),
+                              timestamps, values, bucket_width)
+
+    def _update_traces(self, server_data, server_ids, all_metrics):
+        for server_id in server_ids:
+            buffer = server_data[server_id]
+            start = time.time() - self.window if self.window else None
+            timestamps, columns = buffer.window(start)
+            for metric in all_metrics:
+                trace = self.figure.data[self.traces[(server_id, metric)]]
+                x, y = self._series(server_id, buffer, metric, timestamps, columns)
+                if x is None:
+                    trace.update(x=[], y=[], showlegend=False)
+                else:
+                    trace.update(x=to_datetimes(x), y=y, showlegend=True)
+
+    def render(self, server_manager, placeholder, plot, window=None, server_ids=None):
+        """有变化时更新图表并调用 plot(figure) 输出，返回是否重绘。
+        window 为显示的最近秒数，None 表示整个缓冲区；server_ids 只绘制其中的服务器（集群概览的下钻）"""
+        server_data = server_manager.server_data
+        if server_ids is not None:
+            server_data = {server_id: server_data[server_id] for server_id in server_ids if server_id in server_data}
+        dirty = self.tracker.dirty(placeholder, server_data)
+        if window != self.window:
+            self.window = window
+            dirty = set(server_data)
+        if not dirty:
+            return False
+        all_metrics = self._metrics(server_data)
+        layout_key = (tuple(all_metrics), tuple(server_data))
+        if layout_key != self.layout_key:
+            self.figure = self._build_figure(server_manager, server_data, all_metrics)
+            self.layout_key = layout_key
+            self.cache.clear()
+            dirty = set(server_data)
+        self._update_traces(server_data, dirty, all_metrics)
+        plot(self.figure)
+        self.tracker.mark(placeholder, server_data)
+        return True
@@ -0,0 +1,65 @@
+"""主机级熔断器：连接失败后按指数退避（带随机抖动）暂停连接尝试，到期后只放行一次半开探测"""
+import random
+import time
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class CircuitOpenError(ConnectionError):
+    """熔断器处于打开状态，本次调用未发起连接"""
+
+    def __init__(self, retry_in):
+        super().__init__(f"熔断中，{retry_in:.0f} 秒后重试")
+        self.retry_in = retry_in
+
+class CircuitBreaker:
+    """连接失败即打开，退避时间从 initial 开始每次失败翻倍，不超过 maximum；
+    实际等待时间在 [退避/2, 退避] 之间随机，避免大量主机同时恢复时集中重连"""
+
+    def __init__(self, initial=1.0, maximum=300.0, clock=time.monotonic):
+        self.initial = initial
+        self.maximum = maximum
+        self.clock = clock
+        self.state = CLOSED
+        self.failures = 0
+        self.retry_at = 0.0
+        self.last_error = None
+
+    def allow(self):
+        """是否允许发起一次连接。打开状态到期后转为半开，只放行一个探测，其余调用继续被拒绝"""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and self.clock() >= self.retry_at:
+            self.state = HALF_OPEN
+            return True
+        return False
+
+    def retry_in(self):
+        """距下一次允许探测的秒数；半开探测进行中时返回一个短的轮询间隔"""
+        if self.state == HALF_OPEN:
+            return 1.0
+        return max(self.retry_at - self.clock(), 0.0)
+
+    def abort(self):
+        """半开探测被取消（未得到结果）时回到打开状态，下一次调用可以立即重新探测"""
+        if self.state == HALF_OPEN:
+            self.state = OPEN
+
+    def record_success(self):
+        """返回 True 表示从熔断中恢复"""
+        recovered = self.state != CLOSED
+        self.state = CLOSED
+        self.failures = 0
+        self.last_error = None
+        return recovered
+
+    def record_failure(self, error=None):
+        """返回本次的退避秒数"""
+        self.failures += 1
+        self.last_error = error
+        backoff = min(self.maximum, self.initial * 2 ** (self.failures - 1))
+        delay = random.uniform(backoff / 2, backoff)
+        self.state = OPEN
+        self.retry_at = self.clock() + delay
+        return delay
@@ -0,0 +1,527 @@
+import argparse
+import asyncio
+import logging
+import multiprocessing
+from multiprocessing.connection import wait
+import os
+import signal
+import threading
+import time
+import zlib
+from collections import deque
+import yaml
+from monitor import NON_METRIC_KEYS, async_monitor_server
+from ipc import DEFAULT_SOCKET, SamplePublisher
+from instrumentation import RECORDER, REPORT_INTERVAL
+from config_watcher import ConfigWatcher, diff_servers, needs_restart, server_map
+from ssh_pool import ConnectionPool, pool_options, shard_key
+from scheduler import golden_phase
+from transport import SampleChannel
+from replay import SampleRecorder
+from series import merge_latest
+from watcher_register import WatcherRegister
+
+# 指标插件由 WatcherRegister 在配置用到时才导入；存储、告警和导出模块（numpy、sqlite3、http.server 等）
+# 只在守护进程启用对应功能时导入，fork 出的采集分片进程不会继承未使用的模块
+
+# 获取应用logger
+logger = logging.getLogger('server_watcher.collector')
+
+class CollectorEngine:
+    """在单个事件循环中以任务形式运行所有 ServerMonitor，样本写入二进制样本通道。
+    指向同一主机/用户/凭据的服务器通过连接池共用一个 SSH 连接。
+    instrumentation 为 True 时记录各阶段耗时直方图，并定期把增量作为 stats 样本写入通道"""
+
+    def __init__(self, interval=5, channel=None, pool_options=None, instrumentation=False):
+        self.channel = channel or SampleChannel()
+        self.instrumentation = instrumentation
+        self.interval = interval
+        self.pool = ConnectionPool(**(pool_options or {}))
+        self.servers = {}
+        # 按加入顺序给每个服务器分配黄金分割相位，采集时刻在周期内均匀错开
+        self.phases = {}
+        self.phase_index = 0
+        self.tasks = {}
+        # 已启动（未被停止或删除）的服务器，任务异常退出后由配置更新重新启动
+        self.wanted = set()
+        # 热加载的配置更新: {server_id: deque}，只保留最新一次，由运行中的任务在下个周期前取出
+        self.updates = {}
+        self.reporter = None
+        self.loop = None
+        self.thread = None
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self._run_loop, name="collector-loop", daemon=True)
+        self.thread.start()
+        if self.instrumentation:
+            RECORDER.enabled = True
+            self.loop.call_soon_threadsafe(self._start_reporter)
+        logger.info(f"采集引擎启动，PID: {os.getpid()}")
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.close()
+
+    def add_server(self, server_config, start=True):
+        server_id = server_config.get('id', server_config['hostname'])
+        self.servers[server_id] = server_config
+        if server_id not in self.phases:
+            # 按累计加入次数取相位，删除过服务器后新服务器也不会与现有服务器重复
+            self.phases[server_id] = golden_phase(self.phase_index)
+            self.phase_index += 1
+        if start:
+            self.start_server(server_id)
+        return server_id
+
+    def remove_server(self, server_id):
+        self.stop_server(server_id)
+        self.servers.pop(server_id, None)
+        self.phases.pop(server_id, None)
+        self.updates.pop(server_id, None)
+
+    def update_server(self, server_config):
+        """应用单个服务器的配置变化。连接相关字段（见 config_watcher.RESTART_KEYS）变化时重启该服务器的任务，
+        周期、指标等变化由运行中的任务原地应用，不断开连接"""
+        server_id = server_config.get('id', server_config['hostname'])
+        WatcherRegister.clear_missing()
+        old = self.servers.get(server_id)
+        if old is None:
+            return self.add_server(server_config)
+        self.servers[server_id] = server_config
+        if self.thread and self.thread.is_alive():
+            if needs_restart(old, server_config):
+                self.loop.call_soon_threadsafe(self._restart_task, server_id)
+            else:
+                self.loop.call_soon_threadsafe(self._push_update, server_id)
+        return server_id
+
+    def set_interval(self, interval):
+        """修改全局周期，未单独配置 interval 的服务器在下个周期按新周期采集"""
+        self.interval = interval
+        if self.thread and self.thread.is_alive():
+            for server_id in list(self.servers):
+                self.loop.call_soon_threadsafe(self._push_update, server_id)
+
+    def start_server(self, server_id):
+        if server_id not in self.servers:
+            logger.warning(f"未知的服务器: {server_id}")
+            return
+        self.wanted.add(server_id)
+        self.start()
+        self.loop.call_soon_threadsafe(self._create_task, server_id, self.servers[server_id])
+
+    def stop_server(self, server_id):
+        self.wanted.discard(server_id)
+        if self.thread and self.thread.is_alive():
+            self.loop.call_soon_threadsafe(self._cancel_task, server_id)
+
+    def is_running(self, server_id):
+        return server_id in self.tasks
+
+    def _create_task(self, server_id, server_config):
+        # 仅在事件循环线程中调用
+        if server_id in self.tasks:
+            return
+        updates = self.updates[server_id] = deque(maxlen=1)
+        task = self.loop.create_task(async_monitor_server(server_config, self.interval, self.channel, self.pool,
+                                                          self.phases[server_id], updates))
+        task.add_done_callback(lambda t, sid=server_id: self._on_task_done(sid, t))
+        self.tasks[server_id] = task
+
+    def _push_update(self, server_id):
+        # 仅在事件循环线程中调用
+        if self._revive(server_id):
+            return
+        updates = self.updates.get(server_id)
+        if server_id in self.tasks and server_id in self.servers and updates is not None:
+            updates.append((self.servers[server_id], self.interval))
+
+    def _revive(self, server_id):
+        # 仅在事件循环线程中调用。已启动但任务已异常退出的服务器按新配置重新启动，返回是否启动了任务
+        if server_id in self.tasks or server_id not in self.servers or server_id not in self.wanted:
+            return False
+        self._create_task(server_id, self.servers[server_id])
+        return True
+
+    def _restart_task(self, server_id):
+        # 仅在事件循环线程中调用。先创建新任务再取消旧任务，连接键不变时新任务先引用连接池中的连接，
+        # 旧任务释放时连接不会被关闭
+        if self._revive(server_id):
+            return
+        old = self.tasks.pop(server_id, None)
+        if old is None or server_id not in self.servers:
+            return
+        self._create_task(server_id, self.servers[server_id])
+        old.cancel()
+
+    def _start_reporter(self):
+        # 仅在事件循环线程中调用
+        self.reporter = self.loop.create_task(self._report_stats())
+
+    async def _report_stats(self):
+        while True:
+            await asyncio.sleep(REPORT_INTERVAL)
+            stats = RECORDER.take()
+            if stats:
+                self.channel.put({"server_id": "", "status": "stats", "stats": stats})
+
+    def _cancel_task(self, server_id):
+        task = self.tasks.get(server_id)
+        if task:
+            task.cancel()
+
+    def _on_task_done(self, server_id, task):
+        if self.tasks.get(server_id) is task:
+            del self.tasks[server_id]
+        if not task.cancelled() and task.exception():
+            logger.error(f"监控任务 {server_id} 异常退出: {task.exception()}")
+
+    async def _cancel_all(self):
+        tasks = list(self.tasks.values())
+        if self.reporter:
+            tasks.append(self.reporter)
+            self.reporter = None
+        for task in tasks:
+            task.cancel()
+        # 等待任务执行 finally 中的断开连接逻辑
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def shutdown(self, timeout=5):
+        if not self.thread or not self.thread.is_alive():
+            return
+        future = asyncio.run_coroutine_threadsafe(self._cancel_all(), self.loop)
+        try:
+            future.result(timeout=timeout)
+        except Exception as e:
+            logger.warning(f"停止监控任务超时或出错: {e}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=timeout)
+        if self.instrumentation:
+            RECORDER.enabled = False
+            RECORDER.clear()
+        logger.info("采集引擎已停止")
+
+    def drain(self):
+        return self.channel.drain()
+
+    def wait(self, timeout):
+        """阻塞到有样本可读或超时"""
+        return bool(wait([self.channel.reader], timeout))
+
+def _shard_main(command_queue, channel, interval, pool_options=None, instrumentation=False):
+    """分片进程入口：在本进程内运行一个 CollectorEngine，并执行主进程下发的命令"""
+    engine = CollectorEngine(interval, channel, pool_options, instrumentation)
+    engine.start()
+    while True:
+        command, payload = command_queue.get()
+        if command == "shutdown":
+            break
+        if command == "add":
+            server_config, start = payload
+            engine.add_server(server_config, start)
+        elif command == "remove":
+            engine.remove_server(payload)
+        elif command == "update":
+            engine.update_server(payload)
+        elif command == "interval":
+            engine.set_interval(payload)
+        elif command == "start":
+            engine.start_server(payload)
+        elif command == "stop":
+            engine.stop_server(payload)
+    engine.shutdown()
+
+class ShardedCollector:
+    """将服务器按连接目标哈希分片到 N 个事件循环进程中，内存随核数而非主机数增长。
+    同一主机/用户的服务器总在同一个分片中，从而能共用连接池中的连接"""
+
+    def __init__(self, interval=5, workers=None, pool_options=None, instrumentation=False):
+        self.interval = interval
+        self.workers = workers or os.cpu_count() or 1
+        self.instrumentation = instrumentation
+        # 握手的并发数和速率是整个采集器的预算，平均分给各分片。速率按实际比例分配（可以小于 1 次/秒），
+        # 各分片之和不超过配置值；并发数至少为 1，否则分片无法建立连接
+        self.pool_options = dict(pool_options or {})
+        if self.pool_options.get("handshake_rate"):
+            self.pool_options["handshake_rate"] = self.pool_options["handshake_rate"] / self.workers
+        if self.pool_options.get("handshake_concurrency"):
+            self.pool_options["handshake_concurrency"] = max(1, self.pool_options["handshake_concurrency"] // self.workers)
+        self.shards = []
+        self.assignments = {}
+
+    def start(self):
+        if self.shards:
+            return
+        for index in range(self.workers):
+            command_queue = multiprocessing.Queue()
+            # 每个分片一个通道，各自维护名称表
+            channel = SampleChannel()
+            process = multiprocessing.Process(
+                target=_shard_main,
+                args=(command_queue, channel, self.interval, self.pool_options, self.instrumentation),
+                name=f"collector-shard-{index}"
+            )
+            process.daemon = True
+            process.start()
+            self.shards.append((process, command_queue, channel))
+        logger.info(f"已启动 {self.workers} 个采集分片进程")
+
+    def _shard_for(self, server_config):
+        return zlib.crc32(shard_key(server_config).encode('utf-8')) % self.workers
+
+    def _send(self, server_id, command, payload):
+        shard = self.assignments.get(server_id)
+        if shard is None:
+            return
+        self.shards[shard][1].put((command, payload))
+
+    def add_server(self, server_config, start=True):
+        self.start()
+        server_id = server_config.get('id', server_config['hostname'])
+        self.assignments[server_id] = self._shard_for(server_config)
+        self._send(server_id, "add", (server_config, start))
+        return server_id
+
+    def remove_server(self, server_id):
+        self._send(server_id, "remove", server_id)
+        self.assignments.pop(server_id, None)
+
+    def update_server(self, server_config):
+        server_id = server_config.get('id', server_config['hostname'])
+        if self.assignments.get(server_id, self._shard_for(server_config)) != self._shard_for(server_config):
+            # 连接目标变化后属于另一个分片，从原分片移除后在新分片启动
+            self.remove_server(server_id)
+        if server_id not in self.assignments:
+            return self.add_server(server_config)
+        self._send(server_id, "update", server_config)
+        return server_id
+
+    def set_interval(self, interval):
+        self.interval = interval
+        for _, command_queue, _ in self.shards:
+            command_queue.put(("interval", interval))
+
+    def start_server(self, server_id):
+        self._send(server_id, "start", server_id)
+
+    def stop_server(self, server_id):
+        self._send(server_id, "stop", server_id)
+
+    def shutdown(self, timeout=5):
+        for _, command_queue, _ in self.shards:
+            command_queue.put(("shutdown", None))
+        for process, _, _ in self.shards:
+            process.join(timeout=timeout)
+            if process.is_alive():
+                process.terminate()
+                process.join(timeout=2)
+        self.shards.clear()
+        self.assignments.clear()
+        logger.info("所有采集分片进程已停止")
+
+    def drain(self):
+        samples = []
+        for _, _, channel in self.shards:
+            samples.extend(channel.drain())
+        return samples
+
+    def wait(self, timeout):
+        readers = [channel.reader for _, _, channel in self.shards]
+        if not readers:
+            time.sleep(timeout)
+            return False
+        return bool(wait(readers, timeout))
+
+def create_collector(interval=5, workers=0, pool_options=None, instrumentation=False):
+    """workers 为 0 时在当前进程的单个事件循环中采集；为正数或 'auto' 时按核数分片到多个进程。
+    pool_options 为 SSH 连接池参数（通道数上限、握手并发数和速率），见 ssh_pool.pool_options；
+    instrumentation 为 True 时启用各阶段耗时统计，见 instrumentation.py"""
+    if workers == "auto":
+        workers = os.cpu_count() or 1
+    if workers and int(workers) > 0:
+        return ShardedCollector(interval, int(workers), pool_options, instrumentation)
+    return CollectorEngine(interval, pool_options=pool_options, instrumentation=instrumentation)
+
+class CollectorDaemon:
+    """独立于看板运行的采集守护进程：持有所有 ServerMonitor，把样本写入本地存储，
+    并通过 Unix socket 发布给所有看板会话，看板数量不再放大对服务器的 SSH 连接数。
+    指定 config_path 时监视配置文件，只对增删改的服务器生效；指定 record_path 时把样本流录制到该文件（见 replay.py）。
+    配置了 collector.http 时在该地址提供 /metrics（OpenMetrics）和 /export（Arrow/Parquet）接口（见 export.py）"""
+
+    def __init__(self, config, socket_path=None, config_path=None, record_path=None):
+        self.config = config
+        self.watcher = ConfigWatcher(config_path) if config_path else None
+        self.socket_path = socket_path or config.get('collector', {}).get('socket', DEFAULT_SOCKET)
+        self.collector = create_collector(config.get('interval', 5), config.get('collector_workers', 0),
+                                          pool_options(config), config.get('instrumentation', False))
+        self.store = None
+        if config.get('storage'):
+            from storage import SampleStore
+            self.store = SampleStore.from_config(config['storage'])
+        self.publisher = SamplePublisher(self.socket_path)
+        # 守护进程运行时由它负责发送告警，看板只显示告警状态
+        self.alerts = self._alert_engine(config.get('alerts'))
+        self.recorder = SampleRecorder(record_path, config) if record_path else None
+        http_address = config.get('collector', {}).get('http')
+        self.exporter = self.openmetrics = None
+        if http_address:
+            from export import ExportServer, OpenMetricsRenderer
+            self.exporter = ExportServer(http_address, self.export)
+            self.openmetrics = OpenMetricsRenderer()
+        # 导出用的最近样本缓冲区和各服务器最新值，只在启用 HTTP 接口时维护
+        self.buffers = {}
+        self.latest = {}
+        self.history_capacity = config.get('history_capacity', 3600)
+        self.latest_dirty = False
+        self.rendered_at = 0
+        self.lock = threading.Lock()
+        self.running = False
+
+    @staticmethod
+    def _alert_engine(alerts_config):
+        if not alerts_config or not alerts_config.get('rules'):
+            return None
+        from alerts import AlertEngine
+        return AlertEngine.from_config(alerts_config)
+
+    def handle(self, data):
+        self.publisher.publish(data)
+        if self.recorder:
+            self.recorder.put(data)
+        if data.get("status") == "data" and (self.store or self.alerts or self.exporter):
+            server_id = data["server_id"]
+            values = {k: v for k, v in data.items() if k not in NON_METRIC_KEYS}
+            timestamp = data["timestamp"].timestamp()
+            if self.store:
+                self.store.append(server_id, timestamp, values)
+            if self.alerts:
+                self.alerts.observe(server_id, timestamp, values)
+            if self.exporter:
+                # 按各自周期采集时每个样本只有到期的指标，合并到上一次的值中
+                merge_latest(self.latest.setdefault(server_id, {}), timestamp, values, data.get("missing"))
+                self.latest_dirty = True
+                with self.lock:
+                    buffer = self.buffers.get(server_id)
+                    if buffer is None:
+                        from series_buffer import SeriesRingBuffer
+                        buffer = self.buffers[server_id] = SeriesRingBuffer(self.history_capacity)
+                    buffer.append(timestamp, values, data.get("missing"))
+
+    def render_metrics(self):
+        """每个周期最多渲染一次 /metrics 的响应体，抓取请求只读取缓存"""
+        now = time.monotonic()
+        if not self.latest_dirty or now - self.rendered_at < self.config.get('interval', 5):
+            return
+        self.exporter.update(self.openmetrics.render(self.latest))
+        self.latest_dirty = False
+        self.rendered_at = now
+
+    def export(self, query):
+        """/export 请求：按服务器、指标和时间范围导出内存缓冲区或本地存储中的序列"""
+        from export import FORMATS, buffer_table, store_table, write_table
+        fmt = query["format"]
+        if query["source"] == "store":
+            if not self.store:
+                raise ValueError("未配置本地存储 (storage)")
+            table = store_table(self.store, query["metrics"], query["start"], query["end"], query["server_ids"],
+                                query["resolution"])
+            return FORMATS[fmt], write_table(table, fmt)
+        # 持锁时只复制所选窗口，Parquet/Arrow 序列化在释放锁之后进行，不阻塞 handle 写入新样本
+        with self.lock:
+            table = buffer_table(self.buffers, query["server_ids"], query["metrics"], query["start"], query["end"],
+                                 copy=True)
+        return FORMATS[fmt], write_table(table, fmt)
+
+    def _forget(self, server_id):
+        if self.alerts:
+            self.alerts.forget(server_id)
+        self.latest.pop(server_id, None)
+        if self.openmetrics:
+            self.openmetrics.forget(server_id)
+        with self.lock:
+            self.buffers.pop(server_id, None)
+        self.latest_dirty = True
+
+    def stop(self, *_):
+        self.running = False
+
+    def reload(self):
+        config = self.watcher.poll() if self.watcher else None
+        if config is None:
+            return
+        WatcherRegister.clear_missing()
+        old, new = server_map(self.config), server_map(config)
+        added, removed, changed = diff_servers(old, new)
+        for server_id in removed:
+            self.collector.remove_server(server_id)
+            self._forget(server_id)
+        for server_id in added:
+            self.collector.add_server(new[server_id])
+        for server_id in changed:
+            self.collector.update_server(new[server_id])
+        if config.get('interval', 5) != self.config.get('interval', 5):
+            self.collector.set_interval(config.get('interval', 5))
+        if config.get('alerts') != self.config.get('alerts'):
+            if self.alerts:
+                self.alerts.close()
+            self.alerts = self._alert_engine(config.get('alerts'))
+        self.config = config
+        logger.info(f"配置已重新加载: 新增 {len(added)} 个、删除 {len(removed)} 个、变化 {len(changed)} 个服务器")
+
+    def run(self):
+        self.running = True
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGTERM, self.stop)
+        self.publisher.start()
+        if self.exporter:
+            self.exporter.start()
+        if self.store:
+            self.store.start()
+        for server_config in self.config.get('servers', []):
+            self.collector.add_server(server_config)
+        logger.info(f"采集守护进程已启动，监控 {len(self.config.get('servers', []))} 个服务器")
+        try:
+            while self.running:
+                self.reload()
+                if self.exporter:
+                    self.render_metrics()
+                if not self.collector.wait(0.5):
+                    continue
+                for data in self.collector.drain():
+                    self.handle(data)
+                if self.alerts:
+                    self.alerts.flush()
+        finally:
+            self.collector.shutdown()
+            self.publisher.close()
+            if self.exporter:
+                self.exporter.close()
+            if self.alerts:
+                self.alerts.close()
+            if self.store:
+                self.store.close()
+            if self.recorder:
+                self.recorder.close()
+            logger.info("采集守护进程已退出")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Server Watcher 采集守护进程")
+    parser.add_argument("--config", default=os.path.join('config', 'servers.yaml'), help="配置文件路径")
+    parser.add_argument("--socket", default=None, help=f"发布样本的 Unix socket 路径，默认 {DEFAULT_SOCKET}")
+    parser.add_argument("--record", default=None, help="把样本流录制到该文件，供看板回放（streamlit run main.py -- --replay）")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+                        datefmt='%Y-%m-%d %H:%M:%S')
+    with open(args.config, 'r', encoding="utf-8") as f:
+        config = yaml.safe_load(f)
+    CollectorDaemon(config, args.socket, args.config, args.record).run()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""servers.yaml 热加载：轮询文件变化并计算服务器的增删改差异，只对变化的服务器生效；配置写入带防抖"""
+import copy
+import logging
+import os
+import threading
+import time
+import yaml
+
+# 获取应用logger
+logger = logging.getLogger('server_watcher.config')
+
+# 变化后需要重启该服务器采集任务的字段；其余字段（interval、metrics 等）由运行中的任务原地应用，不断开连接
+RESTART_KEYS = ('hostname', 'port', 'username', 'password', 'key_filename', 'transport', 'root', 'mode')
+
+def server_map(config):
+    """{服务器 id: 服务器配置}"""
+    return {server.get('id', server['hostname']): server for server in (config or {}).get('servers') or []}
+
+def diff_servers(old, new):
+    """比较两个 server_map，返回 (新增, 删除, 变化) 的服务器 id 列表"""
+    added = [server_id for server_id in new if server_id not in old]
+    removed = [server_id for server_id in old if server_id not in new]
+    changed = [server_id for server_id in new if server_id in old and new[server_id] != old[server_id]]
+    return added, removed, changed
+
+def needs_restart(old, new):
+    return any(old.get(key) != new.get(key) for key in RESTART_KEYS)
+
+class ConfigWatcher:
+    """按修改时间和大小检测配置文件变化，最多每 poll_interval 秒检查一次"""
+
+    def __init__(self, path, poll_interval=2.0):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.last_poll = time.monotonic()
+        self.stamp = self._stamp()
+
+    def _stamp(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def poll(self):
+        """文件有变化时返回重新解析的配置，否则返回 None。解析失败时记录错误，继续使用当前配置"""
+        now = time.monotonic()
+        if now - self.last_poll < self.poll_interval:
+            return None
+        self.last_poll = now
+        stamp = self._stamp()
+        if stamp is None or stamp == self.stamp:
+            return None
+        self.stamp = stamp
+        try:
+            with open(self.path, 'r', encoding="utf-8") as f:
+                config = yaml.safe_load(f)
+            if not config or 'servers' not in config:
+                raise ValueError("必须包含 'servers' 部分")
+            return config
+        except Exception as e:
+            logger.error(f"重新加载配置文件失败，继续使用当前配置: {e}")
+            return None
+
+class ConfigWriter:
+    """防抖写入：delay 秒内的多次保存只写入最后一次。先写临时文件再原子替换，
+    ConfigWatcher 不会读到写了一半的文件"""
+
+    def __init__(self, path, delay=1.0):
+        self.path = path
+        self.delay = delay
+        self.pending = None
+        self.timer = None
+        self.lock = threading.Lock()
+
+    def save(self, config):
+        with self.lock:
+            self.pending = copy.deepcopy(config)
+            if self.timer:
+                self.timer.cancel()
+            self.timer = threading.Timer(self.delay, self.flush)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def flush(self):
+        with self.lock:
+            config, self.pending = self.pending, None
+            self.timer = None
+        if config is None:
+            return
+        try:
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, 'w', encoding="utf-8") as f:
+                yaml.dump(config, f, default_flow_style=False, allow_unicode=True)
+            os.replace(temp_path, self.path)
+        except Exception as e:
+            logger.error(f"保存配置文件失败: {e}")
@@ -0,0 +1,87 @@
+"""长时间范围图表的降采样：每条曲线按图表宽度给定固定的点数预算，每个像素桶只保留最小值和最大值两个点"""
+from collections import OrderedDict
+import numpy as np
+
+# 桶宽取这些“整齐”的秒数，窗口长度小幅变化时桶宽保持不变，缓存可以继续复用
+BUCKET_WIDTHS = [1, 2, 5, 10, 15, 30, 60, 120, 300, 600, 900, 1800, 3600, 7200, 14400, 21600, 43200, 86400]
+
+def bucket_width_for(span, budget):
+    """选择能把 span 秒分成不超过 budget 个桶的最小桶宽"""
+    target = span / max(budget, 1)
+    for width in BUCKET_WIDTHS:
+        if width >= target:
+            return width
+    return BUCKET_WIDTHS[-1]
+
+def minmax(timestamps, values, bucket_width):
+    """按对齐到整数倍 bucket_width 的时间桶降采样，每个桶按时间顺序保留最小值点和最大值点。
+
+    timestamps 必须递增，NaN 值被忽略。全部为向量化运算，返回 (时间戳, 值, 桶编号)。
+    """
+    valid = ~np.isnan(values)
+    t = timestamps[valid]
+    v = values[valid]
+    if not len(t):
+        return t, v, np.empty(0, dtype=np.int64)
+    buckets = (t // bucket_width).astype(np.int64)
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    lengths = np.diff(np.r_[starts, len(t)])
+    segment = np.repeat(np.arange(len(starts)), lengths)
+    # 每个桶中第一个等于桶内最小值/最大值的位置
+    lo_hits = np.flatnonzero(v == np.repeat(np.minimum.reduceat(v, starts), lengths))
+    hi_hits = np.flatnonzero(v == np.repeat(np.maximum.reduceat(v, starts), lengths))
+    lo = lo_hits[np.r_[True, segment[lo_hits][1:] != segment[lo_hits][:-1]]]
+    hi = hi_hits[np.r_[True, segment[hi_hits][1:] != segment[hi_hits][:-1]]]
+    first = np.minimum(lo, hi)
+    second = np.maximum(lo, hi)
+    index = np.column_stack([first, second]).ravel()
+    keep = np.column_stack([np.ones(len(first), dtype=bool), second != first]).ravel()
+    index = index[keep]
+    return t[index], v[index], buckets[index]
+
+class DownsampleCache:
+    """按 (服务器, 指标, 窗口, 桶宽) 缓存降采样结果的 LRU 缓存。
+
+    桶按绝对时间对齐，新样本只会改变最后一个桶、窗口滑动只会截断第一个桶，
+    所以序列更新时只重新计算首尾两个桶，中间的桶直接复用。
+    """
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+
+    def clear(self):
+        self.entries.clear()
+
+    def get(self, key, source, timestamps, values, bucket_width):
+        """source 标识数据来源（如缓冲区对象的 id），来源变化时整条重新计算"""
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        result = self._update(entry, source, timestamps, values, bucket_width)
+        self.entries[key] = (source, *result)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return result[0], result[1]
+
+    def _update(self, entry, source, timestamps, values, bucket_width):
+        if not len(timestamps):
+            return timestamps, values, np.empty(0, dtype=np.int64)
+        if entry is None or entry[0] != source or not len(entry[3]):
+            return minmax(timestamps, values, bucket_width)
+        _, cached_t, cached_v, cached_b = entry
+        first = int(timestamps[0] // bucket_width)
+        last = int(cached_b[-1])
+        if first >= last or timestamps[-1] < cached_t[-1]:
+            return minmax(timestamps, values, bucket_width)
+        # 头部：窗口起点所在的桶可能已被截断，重新计算
+        head_end = int(np.searchsorted(timestamps, (first + 1) * bucket_width, side='left'))
+        head = minmax(timestamps[:head_end], values[:head_end], bucket_width)
+        # 中部：完整且不会再变化的桶直接取缓存
+        middle = slice(int(np.searchsorted(cached_b, first, side='right')),
+                       int(np.searchsorted(cached_b, last, side='left')))
+        # 尾部：缓存中最后一个桶可能还在接收新样本，从它开始重新计算
+        tail_start = int(np.searchsorted(timestamps, last * bucket_width, side='left'))
+        tail = minmax(timestamps[tail_start:], values[tail_start:], bucket_width)
+        return tuple(np.concatenate([h, c[middle], t]) for h, c, t in
+                     zip(head, (cached_t, cached_v, cached_b), tail))
@@ -0,0 +1,266 @@
+"""数据导出：内存缓冲区和本地存储的批量导出（Arrow/Parquet），以及 OpenMetrics 文本格式的 /metrics 抓取端点。
+
+缓冲区导出的时间戳和值列直接引用 SeriesRingBuffer 的 numpy 内存，或在持锁时只做一次内存复制，序列化在释放锁之后进行；
+/metrics 的响应体在采集端每个周期渲染一次并缓存，抓取请求只返回缓存，不会访问 ServerMonitor 或触发远端命令。
+Arrow/Parquet 导出需要安装 pyarrow（可选依赖），/metrics 不需要。
+"""
+import logging
+import math
+import threading
+import time
+import numpy as np
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from series import base_name
+from storage import ROLLUPS
+
+# pyarrow 在首次导出时才导入，不影响采集进程的启动时间
+pa = pq = None
+
+# 获取应用logger
+logger = logging.getLogger('server_watcher.export')
+
+OPENMETRICS_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+FORMATS = {"parquet": "application/vnd.apache.parquet", "arrow": "application/vnd.apache.arrow.stream"}
+
+def _require_pyarrow():
+    global pa, pq
+    if pa is not None:
+        return
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError("导出 Arrow/Parquet 需要安装 pyarrow: pip install pyarrow")
+    pa, pq = pyarrow, pyarrow.parquet
+
+def match_metric(key, metrics):
+    """metrics 为空表示全部；指标名（如 net_rx_bytes）匹配其所有带标签的序列，也可以写完整的序列键"""
+    return not metrics or key in metrics or base_name(key) in metrics
+
+def buffer_table(buffers, server_ids=None, metrics=None, start=None, end=None, copy=False):
+    """把内存缓冲区 {server_id: SeriesRingBuffer} 导出为长格式的 pyarrow.Table。
+
+    列: server_id、metric（字典编码）、timestamp（epoch 秒）、value（缺失为 null）。
+    每个 (服务器, 序列) 是一个分块，timestamp 和 value 分块直接引用缓冲区内存；
+    缓冲区随后续样本滚动，返回的表应在下一次写入缓冲区之前序列化。copy 为 True 时复制所选窗口，
+    返回的表不再引用缓冲区，可以在释放锁之后序列化。
+    """
+    _require_pyarrow()
+    servers, names = [], []
+    server_chunks, metric_chunks, timestamp_chunks, value_chunks = [], [], [], []
+    for server_id, buffer in buffers.items():
+        if server_ids and server_id not in server_ids:
+            continue
+        timestamps, columns = buffer.window(start, end)
+        if not len(timestamps):
+            continue
+        if copy:
+            timestamps = timestamps.copy()
+        server_index = len(servers)
+        servers.append(server_id)
+        timestamp_array = pa.array(timestamps)
+        for key, values in columns.items():
+            if not match_metric(key, metrics):
+                continue
+            if copy:
+                values = values.copy()
+            n = len(values)
+            server_chunks.append((server_index, n))
+            metric_chunks.append((len(names), n))
+            names.append(key)
+            timestamp_chunks.append(timestamp_array)
+            # from_pandas 把 NaN 记为 null，值缓冲区本身仍是零拷贝
+            value_chunks.append(pa.array(values, from_pandas=True))
+    return _assemble(servers, names, server_chunks, metric_chunks, {"timestamp": timestamp_chunks,
+                                                                    "value": value_chunks})
+
+def store_table(store, metrics=None, start=None, end=None, server_ids=None, resolution="auto"):
+    """把本地存储中的序列导出为 pyarrow.Table。列: server_id、metric、timestamp、value（平均值）、min、max，
+    resolution 为 None（原始样本）、汇总层级名称（1m/10m/1h）或 auto（按时间范围选择）"""
+    _require_pyarrow()
+    end = time.time() if end is None else end
+    start = end - store.retention["raw"] if start is None else start
+    servers, names = [], []
+    server_chunks, metric_chunks = [], []
+    chunks = {"timestamp": [], "value": [], "min": [], "max": []}
+    server_index = {}
+    for metric in store.metrics():
+        if not match_metric(metric, metrics):
+            continue
+        for server_id, data in store.query(metric, start, end, server_ids, resolution).items():
+            if server_id not in server_index:
+                server_index[server_id] = len(servers)
+                servers.append(server_id)
+            n = len(data["timestamp"])
+            server_chunks.append((server_index[server_id], n))
+            metric_chunks.append((len(names), n))
+            names.append(metric)
+            for column, source in (("timestamp", "timestamp"), ("value", "avg"), ("min", "min"), ("max", "max")):
+                chunks[column].append(pa.array(data[source]))
+    return _assemble(servers, names, server_chunks, metric_chunks, chunks)
+
+def _assemble(servers, names, server_chunks, metric_chunks, columns):
+    server_dictionary = pa.array(servers, pa.string())
+    metric_dictionary = pa.array(names, pa.string())
+    dictionary_type = pa.dictionary(pa.int32(), pa.string())
+    arrays = {
+        # 字典编码：每个分块只有一个 int32 索引数组，服务器名和序列键各只保存一次
+        "server_id": pa.chunked_array([_constant(index, n, server_dictionary) for index, n in server_chunks],
+                                      dictionary_type),
+        "metric": pa.chunked_array([_constant(index, n, metric_dictionary) for index, n in metric_chunks],
+                                   dictionary_type),
+    }
+    for column, chunks in columns.items():
+        arrays[column] = pa.chunked_array(chunks, pa.float64())
+    return pa.table(arrays)
+
+def _constant(index, n, dictionary):
+    return pa.DictionaryArray.from_arrays(pa.array(np.full(n, index, dtype=np.int32)), dictionary)
+
+def write_table(table, fmt="parquet"):
+    """序列化为 Parquet 或 Arrow IPC 流，返回 bytes"""
+    _require_pyarrow()
+    if fmt not in FORMATS:
+        raise ValueError(f"不支持的导出格式: {fmt}")
+    sink = pa.BufferOutputStream()
+    if fmt == "parquet":
+        pq.write_table(table, sink, compression="zstd")
+    else:
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+def _format_value(value):
+    if value != value:
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+class OpenMetricsRenderer:
+    """把各服务器的最新样本渲染为 OpenMetrics 文本。每个序列都加上 server 标签，同一指标的样本连续输出，
+    序列的行前缀（指标名和标签）只在首次出现时拼接一次"""
+
+    def __init__(self):
+        self.prefixes = {}
+
+    def _prefix(self, server_id, key):
+        """返回 (指标名, 行前缀)"""
+        prefix = self.prefixes.get((server_id, key))
+        if prefix is None:
+            name, brace, body = key.partition("{")
+            labels = f'server="{_escape(server_id)}"' + (f",{body[:-1]}" if brace else "")
+            prefix = self.prefixes[(server_id, key)] = (name, f"{name}{{{labels}}} ")
+        return prefix
+
+    def render(self, latest):
+        """latest: {server_id: {序列键: (timestamp, 值)}}（见 series.merge_latest），返回 UTF-8 编码的响应体"""
+        families = {}
+        count = 0
+        for server_id, values in latest.items():
+            count += len(values)
+            for key, (timestamp, value) in values.items():
+                name, prefix = self._prefix(server_id, key)
+                families.setdefault(name, []).append(f"{prefix}{_format_value(value)} {timestamp:.3f}")
+        if len(self.prefixes) > 2 * count + 1000:
+            # 已消失的序列（如退出的进程）不再出现在 latest 中，缓存超过当前序列数较多时只保留仍在使用的前缀
+            self.prefixes = {(server_id, key): self.prefixes[(server_id, key)]
+                             for server_id, values in latest.items() for key in values}
+        lines = []
+        for name, samples in families.items():
+            lines.append(f"# TYPE {name} gauge")
+            lines.extend(samples)
+        lines.append("# EOF\n")
+        return "\n".join(lines).encode('utf-8')
+
+    def forget(self, server_id):
+        for key in [key for key in self.prefixes if key[0] == server_id]:
+            del self.prefixes[key]
+
+class ExportServer:
+    """本地 HTTP 服务: GET /metrics 返回预渲染的 OpenMetrics 文本；GET /export 调用 exporter(查询参数)
+    返回 (Content-Type, 响应体)，查询参数见 parse_export_query"""
+
+    def __init__(self, address, exporter=None):
+        host, _, port = str(address).rpartition(":")
+        self.address = (host or "127.0.0.1", int(port))
+        self.exporter = exporter
+        self.body = b"# EOF\n"
+        self.server = None
+        self.thread = None
+
+    def update(self, body):
+        # 整体替换引用，抓取线程读到的总是完整的一次渲染结果
+        self.body = body
+
+    def start(self):
+        endpoint = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path == "/metrics":
+                    self._reply(200, OPENMETRICS_TYPE, endpoint.body)
+                elif url.path == "/export" and endpoint.exporter:
+                    try:
+                        content_type, body = endpoint.exporter(parse_export_query(url.query))
+                    except (ValueError, RuntimeError) as e:
+                        self._reply(400, "text/plain; charset=utf-8", f"{e}\n".encode('utf-8'))
+                        return
+                    except Exception as e:
+                        logger.error(f"导出失败: {e}")
+                        self._reply(500, "text/plain; charset=utf-8", b"internal error\n")
+                        return
+                    self._reply(200, content_type, body)
+                else:
+                    self._reply(404, "text/plain; charset=utf-8", b"not found\n")
+
+            def _reply(self, status, content_type, body):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.debug(format % args)
+
+        self.server = ThreadingHTTPServer(self.address, Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, name="export-http", daemon=True)
+        self.thread.start()
+        logger.info(f"导出服务已启动: http://{self.address[0]}:{self.server.server_port}/metrics")
+
+    def close(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+def parse_export_query(query):
+    """/export 的查询参数: server、metric 可重复；start、end 为 epoch 秒；format 为 parquet（默认）或 arrow；
+    source 为 buffer（默认，内存中的最近样本）或 store（本地存储）；resolution 为 raw、1m、10m、1h 或 auto"""
+    params = parse_qs(query)
+    def single(name, default=None):
+        return params[name][-1] if name in params else default
+    fmt = single("format", "parquet")
+    if fmt not in FORMATS:
+        raise ValueError(f"不支持的导出格式: {fmt}")
+    source = single("source", "buffer")
+    if source not in ("buffer", "store"):
+        raise ValueError(f"不支持的数据来源: {source}")
+    resolution = single("resolution", "auto")
+    if resolution not in ("raw", "auto", *ROLLUPS):
+        raise ValueError(f"不支持的汇总层级: {resolution}")
+    return {
+        "server_ids": set(params.get("server", [])) or None,
+        "metrics": set(params.get("metric", [])) or None,
+        "start": float(single("start")) if "start" in params else None,
+        "end": float(single("end")) if "end" in params else None,
+        "format": fmt,
+        "source": source,
+        "resolution": None if resolution == "raw" else resolution,
+    }
@@ -0,0 +1,156 @@
+"""集群概览：把所有服务器的同一指标按时间桶对齐成 服务器 × 时间 矩阵，
+一次性计算跨服务器的分位数、热力图和最差主机排行，绘图开销不随服务器数量增长"""
+import time
+import warnings
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import streamlit as st
+from plotly.subplots import make_subplots
+from charts import DirtyTracker
+from downsample import bucket_width_for
+from series_buffer import to_datetimes
+from series import is_labeled
+
+PERCENTILES = [50, 90, 99]
+PERCENTILE_COLORS = {"p50": '#2ca02c', "p90": '#ff7f0e', "p99": '#d62728', "max": '#7f7f7f'}
+
+def fleet_matrix(server_data, metric, start, end, bucket_width):
+    """返回 (桶起始时间, 服务器列表, 矩阵)，矩阵[i, j] 为服务器 i 在桶 j 内的平均值，没有数据为 NaN"""
+    first = int(start // bucket_width)
+    n = int(end // bucket_width) - first + 1
+    server_ids = list(server_data)
+    rows, buckets, samples = [], [], []
+    for row, server_id in enumerate(server_ids):
+        timestamps, columns = server_data[server_id].window(start, end)
+        values = columns.get(metric)
+        if values is None:
+            continue
+        rows.append(np.full(len(values), row))
+        buckets.append((timestamps // bucket_width).astype(np.int64) - first)
+        samples.append(values)
+    sums = np.zeros(len(server_ids) * n)
+    counts = np.zeros(len(server_ids) * n)
+    if samples:
+        # 所有服务器的样本拼在一起，用一次 bincount 完成分桶求和
+        flat = np.concatenate(rows) * n + np.concatenate(buckets)
+        values = np.concatenate(samples)
+        valid = ~np.isnan(values)
+        sums = np.bincount(flat[valid], weights=values[valid], minlength=len(sums))
+        counts = np.bincount(flat[valid], minlength=len(counts))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        matrix = (sums / counts).reshape(len(server_ids), n)
+    return (np.arange(first, first + n) * bucket_width).astype(float), server_ids, matrix
+
+def fleet_percentiles(matrix):
+    """对矩阵的每一列（时间桶）计算跨服务器的 p50/p90/p99/max"""
+    with warnings.catch_warnings():
+        # 所有服务器都没有数据的桶结果为 NaN，不需要警告
+        warnings.simplefilter("ignore", RuntimeWarning)
+        result = dict(zip([f"p{p}" for p in PERCENTILES], np.nanpercentile(matrix, PERCENTILES, axis=0)))
+        result["max"] = np.nanmax(matrix, axis=0)
+    return result
+
+def latest_table(server_manager, all_metrics, labels):
+    """每个服务器最新一次样本组成的表格，行为服务器，列为指标"""
+    rows = []
+    for server_id, buffer in server_manager.server_data.items():
+        timestamp, latest = buffer.latest()
+        if timestamp is None:
+            continue
+        row = {"服务器": server_id, "主机": server_manager.servers.get(server_id, {}).get('hostname', ''),
+               "数据延迟(秒)": round(time.time() - timestamp, 1)}
+        for metric in all_metrics:
+            row[labels.get(metric, metric)] = latest.get(metric, np.nan)
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+class FleetRenderer:
+    """集群概览视图：每个指标一张分位数折线图、所选指标的 服务器 × 时间 热力图和最差主机表。
+
+    曲线数量只和指标数量有关，热力图是单个 trace，表格只显示前 N 行，
+    因此服务器从几台增加到几百台时渲染开销基本不变。
+    """
+
+    def __init__(self, columns=240):
+        # 时间轴上的桶数，同时决定分位数曲线的点数和热力图的列数
+        self.columns = columns
+        self.tracker = DirtyTracker()
+        self.options = None
+        self.metrics = []
+
+    def _labels(self, server_manager):
+        labels = {}
+        for server_id in server_manager.server_data:
+            for metric, label in server_manager.get_metric_labels(server_id).items():
+                labels.setdefault(metric, label)
+        return labels
+
+    def _span(self, server_data, window, now):
+        if window:
+            return now - window
+        starts = [buffer.timestamps_view()[0] for buffer in server_data.values() if len(buffer)]
+        return min(starts) if starts else now
+
+    def _percentile_figure(self, matrices, labels):
+        fig = make_subplots(rows=len(matrices), cols=1, shared_xaxes=True, vertical_spacing=0.08,
+                            subplot_titles=[f"{labels.get(metric, metric)}（全部服务器）" for metric in matrices])
+        for row, (metric, (times, _, matrix)) in enumerate(matrices.items(), 1):
+            x = to_datetimes(times)
+            for name, values in fleet_percentiles(matrix).items():
+                fig.add_trace(go.Scatter(x=x, y=values, mode='lines', name=name, legendgroup=name,
+                                         showlegend=row == 1, line=dict(color=PERCENTILE_COLORS[name], width=2)),
+                              row=row, col=1)
+            if "percentage" in metric or "usage" in metric:
+                fig.update_yaxes(range=[0, 100], row=row, col=1)
+        fig.update_layout(height=250 * len(matrices), title_text="集群资源分布", uirevision="fleet",
+                          legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1))
+        return fig
+
+    def _heatmap_figure(self, metric, label, times, server_ids, matrix):
+        # 按窗口内的平均值排序，负载最高的服务器在最上面
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            order = np.argsort(np.nan_to_num(np.nanmean(matrix, axis=1), nan=-np.inf))
+        fig = go.Figure(go.Heatmap(z=matrix[order], x=to_datetimes(times), y=[server_ids[i] for i in order],
+                                   colorscale="YlOrRd", zmin=0, zmax=100 if "percentage" in metric or "usage" in metric
+                                   else None, colorbar=dict(title=label)))
+        fig.update_layout(height=max(300, min(12 * len(server_ids), 1200)), title_text=f"{label} 热力图",
+                          uirevision="heatmap")
+        return fig
+
+    def render(self, server_manager, placeholder, window=None, heatmap_metric=None, top_n=20):
+        """渲染集群概览，返回当前可选的指标列表，供侧边栏选择热力图和排序指标"""
+        server_data = server_manager.server_data
+        options = (window, heatmap_metric, top_n)
+        if options == self.options and not self.tracker.dirty(placeholder, server_data):
+            return self.metrics
+        all_metrics = []
+        for buffer in server_data.values():
+            for metric in buffer.columns:
+                # 带标签的序列（网卡、进程等）在不同服务器之间没有可比性，不参与跨服务器的分位数
+                if metric not in all_metrics and not is_labeled(metric):
+                    all_metrics.append(metric)
+        self.metrics = all_metrics
+        if not all_metrics:
+            return all_metrics
+        labels = self._labels(server_manager)
+        now = time.time()
+        start = self._span(server_data, window, now)
+        bucket_width = bucket_width_for(now - start, self.columns)
+        matrices = {metric: fleet_matrix(server_data, metric, start, now, bucket_width) for metric in all_metrics}
+        heatmap_metric = heatmap_metric if heatmap_metric in matrices else all_metrics[0]
+        label = labels.get(heatmap_metric, heatmap_metric)
+        table = latest_table(server_manager, all_metrics, labels)
+        with placeholder.container():
+            st.plotly_chart(self._percentile_figure(matrices, labels), use_container_width=True)
+            st.plotly_chart(self._heatmap_figure(heatmap_metric, label, *matrices[heatmap_metric]),
+                            use_container_width=True)
+            st.subheader(f"最差主机 Top {top_n}（按 {label}）")
+            if label in table:
+                # st.dataframe 支持点击列头重新排序
+                st.dataframe(table.sort_values(label, ascending=False).head(top_n).set_index("服务器"),
+                             use_container_width=True)
+        self.tracker.mark(placeholder, server_data)
+        self.options = options
+        return all_metrics
@@ -0,0 +1,156 @@
+"""采集链路自监控：按 (阶段, 主机) 记录耗时直方图，定位看板卡顿出在连接、远端执行、解析、传输、取数还是渲染。
+
+直方图按对数分桶（每个 2 的幂区间 4 个桶，相对误差约 19%），记录一次只是一次字典累加；
+分桶固定，不同进程的直方图可以直接相加，采集分片把增量经样本通道发给看板合并。
+未启用时 time() 返回空的上下文管理器，observe() 立即返回。
+"""
+import contextlib
+import math
+import time
+
+# 阶段名称 -> 显示名称
+STAGES = {
+    "connect": "SSH 握手",
+    "exec": "远端执行",
+    "parse": "指标解析",
+    "collect": "采集耗时（截止时间→入队）",
+    "lag": "样本延迟（截止时间→看板取出）",
+    "drain": "看板取数",
+    "render": "看板渲染",
+}
+
+# 采集端向看板上报直方图增量的间隔（秒）
+REPORT_INTERVAL = 5.0
+
+_SUB_BUCKETS = 4
+_MIN_SECONDS = 1e-6
+
+def bucket_of(seconds):
+    if seconds <= _MIN_SECONDS:
+        return 0
+    return int(math.log2(seconds / _MIN_SECONDS) * _SUB_BUCKETS) + 1
+
+def bucket_upper(index):
+    return _MIN_SECONDS * 2 ** (index / _SUB_BUCKETS)
+
+class Histogram:
+    __slots__ = ("buckets", "count", "total", "max")
+
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        index = bucket_of(seconds)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def merge(self, snapshot):
+        for index, count in snapshot["buckets"].items():
+            # 经 JSON 传输后桶编号变成字符串
+            index = int(index)
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.count += snapshot["count"]
+        self.total += snapshot["total"]
+        self.max = max(self.max, snapshot["max"])
+
+    def snapshot(self):
+        return {"buckets": dict(self.buckets), "count": self.count, "total": self.total, "max": self.max}
+
+    def quantile(self, q):
+        """返回分位数所在桶的上界（不超过最大值）"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                return min(bucket_upper(index), self.max)
+        return self.max
+
+    def summary(self):
+        """以毫秒为单位的次数、均值和分位数"""
+        return {
+            "次数": self.count,
+            "平均 (ms)": self.total / self.count * 1000 if self.count else None,
+            **{f"p{int(q * 100)} (ms)": self.quantile(q) * 1000 for q in (0.5, 0.9, 0.99)},
+            "最大 (ms)": self.max * 1000,
+        }
+
+class _Timer:
+    __slots__ = ("recorder", "stage", "host", "started")
+
+    def __init__(self, recorder, stage, host):
+        self.recorder = recorder
+        self.stage = stage
+        self.host = host
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.recorder.observe(self.stage, self.host, time.perf_counter() - self.started)
+
+_DISABLED = contextlib.nullcontext()
+
+class Recorder:
+    """按 (阶段, 主机) 索引的直方图集合。主机为空字符串表示不区分主机的阶段（如看板取数、渲染）"""
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.histograms = {}
+
+    def observe(self, stage, host, seconds):
+        if not self.enabled:
+            return
+        histogram = self.histograms.get((stage, host))
+        if histogram is None:
+            histogram = self.histograms[(stage, host)] = Histogram()
+        histogram.record(seconds)
+
+    def time(self, stage, host=""):
+        """with recorder.time("exec", server_id): ... 记录代码块的耗时"""
+        if not self.enabled:
+            return _DISABLED
+        return _Timer(self, stage, host)
+
+    def take(self):
+        """取出自上次调用以来的增量并清空，返回可 JSON 序列化的 [[阶段, 主机, 直方图], ...]"""
+        histograms, self.histograms = self.histograms, {}
+        return [[stage, host, histogram.snapshot()] for (stage, host), histogram in histograms.items()]
+
+    def merge(self, snapshot):
+        """合并 take() 或 export() 的结果"""
+        for stage, host, data in snapshot:
+            histogram = self.histograms.get((stage, host))
+            if histogram is None:
+                histogram = self.histograms[(stage, host)] = Histogram()
+            histogram.merge(data)
+
+    def export(self):
+        return [[stage, host, histogram.snapshot()] for (stage, host), histogram in self.histograms.items()]
+
+    def clear(self):
+        self.histograms.clear()
+
+    def by_stage(self):
+        """把各主机的直方图按阶段合并，返回 {阶段: Histogram}"""
+        merged = {}
+        for (stage, _), histogram in self.histograms.items():
+            merged.setdefault(stage, Histogram()).merge(histogram.snapshot())
+        return merged
+
+    def slowest_hosts(self, stage, n=10):
+        """该阶段 p99 最高的 n 个主机，返回 [(主机, Histogram), ...]"""
+        hosts = [(host, histogram) for (name, host), histogram in self.histograms.items() if name == stage and host]
+        return sorted(hosts, key=lambda item: item[1].quantile(0.99), reverse=True)[:n]
+
+# 采集进程内的全局记录器，由 CollectorEngine 按配置启用，增量定期经样本通道上报
+RECORDER = Recorder()
@@ -0,0 +1,189 @@
+"""采集守护进程与看板之间的本地 IPC：守护进程通过 Unix socket 以二进制样本格式向所有订阅者广播样本"""
+import logging
+import os
+import socket
+import struct
+import threading
+import time
+from transport import SampleEncoder, SampleDecoder
+
+# 获取应用logger
+logger = logging.getLogger('server_watcher.ipc')
+
+def default_socket_path():
+    """默认 socket 路径：$XDG_RUNTIME_DIR（仅当前用户可访问）下，否则为 /tmp 中按用户区分的私有目录"""
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if not runtime_dir or not os.path.isdir(runtime_dir):
+        runtime_dir = os.path.join("/tmp", f"server_watcher-{os.getuid()}")
+    return os.path.join(runtime_dir, "server_watcher.sock")
+
+DEFAULT_SOCKET = default_socket_path()
+
+def _ensure_private_dir(path):
+    """创建 socket 所在目录（0700）。目录必须属于当前用户或 root，且其他用户不可写（或设置了粘滞位，如 /tmp），
+    否则其他本地用户可以替换 socket 冒充守护进程"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    st = os.stat(directory)
+    if st.st_uid not in (os.getuid(), 0) or (st.st_mode & 0o022 and not st.st_mode & 0o1000):
+        raise RuntimeError(f"socket 目录 {directory} 可被其他用户修改，拒绝在其中创建 socket")
+
+def _owned_by_current_user(path):
+    try:
+        return os.stat(path).st_uid == os.getuid()
+    except OSError:
+        return False
+
+def _answers(path):
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+        return True
+    except OSError:
+        return False
+    finally:
+        probe.close()
+
+class SamplePublisher:
+    """在 Unix socket 上接受订阅者，并把每个样本广播给所有订阅者"""
+
+    def __init__(self, socket_path=DEFAULT_SOCKET, send_timeout=1.0):
+        self.socket_path = socket_path
+        self.send_timeout = send_timeout
+        self.server = None
+        self.subscribers = []
+        self.encoder = SampleEncoder()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def start(self):
+        _ensure_private_dir(self.socket_path)
+        if os.path.exists(self.socket_path):
+            # 只清理残留的 socket 文件，不抢占仍在运行的守护进程
+            if _answers(self.socket_path):
+                raise RuntimeError(f"{self.socket_path} 上已有采集守护进程在运行")
+            os.unlink(self.socket_path)
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(self.socket_path)
+        # 样本包含整个集群的指标，只允许当前用户连接
+        os.chmod(self.socket_path, 0o600)
+        self.server.listen()
+        self.thread = threading.Thread(target=self._accept_loop, name="sample-publisher", daemon=True)
+        self.thread.start()
+        logger.info(f"样本发布服务已启动: {self.socket_path}")
+
+    def _accept_loop(self):
+        while True:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                break
+            # 发送超时的订阅者会被断开，慢订阅者不会阻塞采集
+            conn.settimeout(self.send_timeout)
+            with self.lock:
+                # 新订阅者先收到完整的名称表，之后的记录帧才能被解码
+                try:
+                    conn.sendall(self.encoder.catalog())
+                except OSError:
+                    conn.close()
+                    continue
+                self.subscribers.append(conn)
+            logger.info(f"新的订阅者已连接，当前订阅者数: {len(self.subscribers)}")
+
+    def publish(self, data):
+        with self.lock:
+            frame = self.encoder.encode(data)
+            subscribers = list(self.subscribers)
+        for conn in subscribers:
+            try:
+                conn.sendall(frame)
+            except OSError:
+                self._drop(conn)
+
+    def _drop(self, conn):
+        with self.lock:
+            if conn in self.subscribers:
+                self.subscribers.remove(conn)
+        conn.close()
+        logger.info(f"订阅者已断开，当前订阅者数: {len(self.subscribers)}")
+
+    def close(self):
+        if not self.server:
+            return
+        self.server.close()
+        self.server = None
+        with self.lock:
+            for conn in self.subscribers:
+                conn.close()
+            self.subscribers.clear()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+class SampleSubscriber:
+    """连接采集守护进程的只读订阅者，在后台线程中接收并批量解码样本，断开后自动重连"""
+
+    def __init__(self, socket_path, retry_interval=2.0):
+        self.socket_path = socket_path
+        self.retry_interval = retry_interval
+        self.samples = []
+        self.lock = threading.Lock()
+        self.sock = None
+        self.running = False
+        self.thread = None
+
+    @staticmethod
+    def available(socket_path):
+        """检测是否有当前用户的采集守护进程在监听。其他用户创建的 socket 不使用，避免接收伪造的样本"""
+        if not socket_path or not os.path.exists(socket_path):
+            return False
+        if not _owned_by_current_user(socket_path):
+            logger.warning(f"{socket_path} 不属于当前用户，忽略该采集守护进程")
+            return False
+        return _answers(socket_path)
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._receive_loop, name="sample-subscriber", daemon=True)
+        self.thread.start()
+
+    def _receive_loop(self):
+        while self.running:
+            try:
+                self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                self.sock.connect(self.socket_path)
+                # 每次连接都会重新收到名称表
+                decoder = SampleDecoder()
+                while self.running:
+                    chunk = self.sock.recv(1024 * 1024)
+                    if not chunk:
+                        raise ConnectionError("连接已关闭")
+                    samples = decoder.feed(chunk)
+                    if samples:
+                        with self.lock:
+                            self.samples.extend(samples)
+            except OSError as e:
+                if self.running:
+                    logger.warning(f"与采集守护进程的连接中断: {e}，{self.retry_interval} 秒后重连")
+                    time.sleep(self.retry_interval)
+            except (ValueError, KeyError, struct.error) as e:
+                # 守护进程与看板版本不一致或帧损坏时丢弃当前连接，重连后用新的解码器从名称表重新开始
+                if self.running:
+                    logger.error(f"无法解码采集守护进程的样本: {e!r}，{self.retry_interval} 秒后重连")
+                    time.sleep(self.retry_interval)
+            finally:
+                if self.sock:
+                    self.sock.close()
+                    self.sock = None
+
+    def drain(self):
+        with self.lock:
+            samples, self.samples = self.samples, []
+        return samples
+
+    def close(self):
+        self.running = False
+        if self.sock:
+            try:
+                self.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
@@ -1,18 +1,26 @@
 import streamlit as st
+import argparse
 import time
-import pandas as pd
-import multiprocessing
-import queue
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
 import yaml
 import os
+import json
 import logging
+import pandas as pd
 from logging.handlers import RotatingFileHandler
-from monitor import ServerMonitor, monitor_server
-from watcher_register import WatcherRegister, WatcherModuleType
-
-import metrics
+from monitor import NON_METRIC_KEYS, build_monitor
+from collector import create_collector
+from ssh_pool import pool_options
+from series_buffer import SeriesRingBuffer
+from series import is_labeled, label_text, parse_series_key
+from charts import ChartRenderer, DirtyTracker
+from fleet import FleetRenderer
+from storage import SampleStore
+from ipc import DEFAULT_SOCKET, SampleSubscriber
+from instrumentation import STAGES, Recorder
+from alerts import AlertEngine
+from config_watcher import ConfigWatcher, ConfigWriter, diff_servers, server_map
+from replay import ReplaySource
+from watcher_register import WatcherRegister
 
 # Configure logging with UTF-8 support
 log_file = 'monitor.log'
@@ -34,13 +42,34 @@ logger = logging.getLogger('server_watcher')
 class ServerManager:
     def __init__(self):
         self.servers = {}
-        self.processes = {}
-        self.data_queue = multiprocessing.Queue()
+        self.collector = None
+        self.collector_workers = 0
+        self.pool_options = {}
         self.server_data = {}
         self.monitoring = False
         self.interval = 5
         self.last_data_time = None
         self.monitors = {}
+        self.history_capacity = 3600
+        self.chart_width = 1600
+        self.config = {}
+        self.store = None
+        self.subscriber = None
+        # 回放录制的样本流时代替采集器作为数据来源
+        self.replay = None
+        # 不可达或出错的服务器: {server_id: (状态, 消息)}，状态变化时 host_status_version 加一
+        self.host_status = {}
+        self.host_status_version = 0
+        # 已有首次连接结果（成功或不可达）的服务器，用于显示启动预热进度
+        self.reported_servers = set()
+        self.monitoring_started = None
+        # 采集链路自监控：看板侧的取数、渲染耗时，以及合并自采集端上报的各阶段直方图
+        self.instrumentation = False
+        self.health = Recorder()
+        self.alerts = None
+        # 配置文件热加载和防抖写入
+        self.watcher = None
+        self.writer = None
 
     def load_config(self, config_file):
         try:
@@ -49,86 +78,200 @@ class ServerManager:
             if not config or 'servers' not in config:
                 st.error("配置文件格式错误，必须包含 'servers' 部分")
                 return False
-            self.servers = {server.get('id', server['hostname']): server for server in config['servers']}
+            self.servers = server_map(config)
             self.interval = config.get('interval', 5)
+            self._apply_settings(config)
+            self.watcher = ConfigWatcher(config_file)
+            self.writer = ConfigWriter(config_file)
+            if self.store:
+                self.store.close()
+            self.store = SampleStore.from_config(config.get('storage'))
+            if self.store:
+                self.store.start()
             return True
         except Exception as e:
             st.error(f"加载配置文件失败: {e}")
             return False
 
-    def save_config(self, config_file, servers, interval=5):
-        try:
-            config = {'interval': interval, 'servers': servers}
-            with open(config_file, 'w') as f:
-                yaml.dump(config, f, default_flow_style=False)
-            return True
-        except Exception as e:
-            st.error(f"保存配置文件失败: {e}")
-            return False
+    def load_replay(self, replay):
+        """使用录制文件作为数据来源，服务器列表取自录制文件（包括复制出的主机），并启用自监控统计"""
+        self.replay = replay
+        self.servers = replay.servers
+        self.interval = replay.interval
+        self._apply_settings({'instrumentation': True})
+
+    def _apply_settings(self, config):
+        """读取服务器列表以外的设置。连接池、分片数和存储等设置在下次开始监控时生效"""
+        self.collector_workers = config.get('collector_workers', 0)
+        self.pool_options = pool_options(config)
+        self.history_capacity = config.get('history_capacity', 3600)
+        self.chart_width = config.get('chart_width', 1600)
+        self.instrumentation = config.get('instrumentation', False)
+        self.health.enabled = self.instrumentation
+        self.config = config
+
+    def save_config(self):
+        """把当前间隔和服务器列表写回配置文件，保留其他部分（如 storage）。
+        写入经过防抖，连续拖动滑块只写入最后一次"""
+        self.config = {**self.config, 'interval': self.interval, 'servers': list(self.servers.values())}
+        if self.writer:
+            self.writer.save(self.config)
+
+    def set_interval(self, interval):
+        """修改全局周期，运行中的采集任务在下个周期生效，不重启监控"""
+        self.interval = interval
+        if self.collector:
+            self.collector.set_interval(interval)
+        self.save_config()
+
+    def reload_config(self):
+        """配置文件被修改时只对变化的部分生效：新增的服务器开始监控，删除的停止，
+        周期和指标的变化由运行中的采集任务原地应用，不影响其他服务器的连接和历史数据"""
+        config = self.watcher.poll() if self.watcher else None
+        if config is None:
+            return
+        WatcherRegister.clear_missing()
+        new_servers = server_map(config)
+        added, removed, changed = diff_servers(self.servers, new_servers)
+        interval = config.get('interval', 5)
+        alerts_changed = config.get('alerts') != self.config.get('alerts')
+        self.servers = new_servers
+        self._apply_settings(config)
+        if self.monitoring:
+            for server_id in removed:
+                if server_id in self.server_data:
+                    self._stop_server(server_id)
+            for server_id in added:
+                self._start_server(server_id)
+            for server_id in changed:
+                if server_id in self.server_data:
+                    if self.collector:
+                        self.collector.update_server(new_servers[server_id])
+                    self.monitors[server_id] = build_monitor(new_servers[server_id], warn=st.warning)
+            if interval != self.interval and self.collector:
+                self.collector.set_interval(interval)
+            if alerts_changed:
+                if self.alerts:
+                    self.alerts.close()
+                self.alerts = AlertEngine.from_config(config.get('alerts'), deliver=not self.subscriber,
+                                                      warn=st.warning)
+        self.interval = interval
+        self.host_status_version += 1
+        logger.info(f"配置已重新加载: 新增 {len(added)} 个、删除 {len(removed)} 个、变化 {len(changed)} 个服务器")
+
+    def _start_server(self, server_id):
+        server_config = self.servers[server_id]
+        self.server_data[server_id] = SeriesRingBuffer(self.history_capacity)
+        if self.collector:
+            self.collector.add_server(server_config)
+        self.monitors[server_id] = build_monitor(server_config, warn=st.warning)
+
+    def _stop_server(self, server_id):
+        if self.collector:
+            self.collector.remove_server(server_id)
+        self.server_data.pop(server_id, None)
+        self.monitors.pop(server_id, None)
+        self.host_status.pop(server_id, None)
+        self.reported_servers.discard(server_id)
+        if self.alerts:
+            self.alerts.forget(server_id)
 
     def start_monitoring(self, selected_servers=None):
         if self.monitoring:
             return
         self.monitoring = True
-        self.server_data = {server_id: [] for server_id in (selected_servers or self.servers.keys())}
+        self.server_data = {}
         self.last_data_time = time.time()
-        servers_to_monitor = {k: v for k, v in self.servers.items() if k in (selected_servers or self.servers.keys())}
-        for server_id, server_config in servers_to_monitor.items():
-            process = multiprocessing.Process(
-                target=monitor_server,
-                args=(server_config, self.interval, self.data_queue)
-            )
-            process.daemon = True
-            process.start()
-            self.processes[server_id] = process
-
-            monitor = ServerMonitor(
-                server_id=server_id,
-                hostname=server_config['hostname'],
-                username=server_config['username'],
-                password=server_config.get('password'),
-                key_filename=server_config.get('key_filename'),
-                port=server_config.get('port', 22)
-            )
-
-            # Dynamically register metrics based on configuration
-            for metric_config in server_config.get('metrics', []):
-                metric_type = metric_config.get('type')
-                metric_class = WatcherRegister.get_registered(WatcherModuleType.METRIC, metric_type)
-                if metric_class:
-                    monitor.register_metric(metric_class())
-                else:
-                    st.warning(f"未找到指定的监控指标类型: {metric_type}")
-
-            self.monitors[server_id] = monitor
+        self.monitoring_started = time.time()
+        self.health.clear()
+        socket_path = self.config.get('collector', {}).get('socket', DEFAULT_SOCKET)
+        if self.replay:
+            self.replay.start()
+        elif SampleSubscriber.available(socket_path):
+            # 已有采集守护进程时只订阅其样本，不再自行建立 SSH 连接
+            self.subscriber = SampleSubscriber(socket_path)
+            self.subscriber.start()
+        else:
+            self.collector = create_collector(self.interval, self.collector_workers, self.pool_options,
+                                              self.instrumentation)
+        # 订阅守护进程时由守护进程发送告警，看板只维护告警状态用于显示
+        self.alerts = AlertEngine.from_config(self.config.get('alerts'), deliver=not self.subscriber, warn=st.warning)
+        for server_id in self.servers:
+            if server_id in (selected_servers or self.servers):
+                self._start_server(server_id)
+        if self.store:
+            self.load_history()
+
+    def load_history(self):
+        """从本地存储回填最近的样本，重启后图表不会从空白开始"""
+        since = time.time() - self.history_capacity * self.interval
+        for server_id, buffer in self.server_data.items():
+            for timestamp, values in self.store.recent(server_id, since)[-self.history_capacity:]:
+                buffer.append(timestamp, values)
 
     def stop_monitoring(self):
         if not self.monitoring:
             return
-        for _, process in self.processes.items():
-            if process.is_alive():
-                process.terminate()
-                process.join(timeout=2)
-        self.processes.clear()
+        if self.collector:
+            self.collector.shutdown()
+            self.collector = None
+        if self.subscriber:
+            self.subscriber.close()
+            self.subscriber = None
+        if self.alerts:
+            self.alerts.close()
+            self.alerts = None
         self.monitoring = False
         self.last_data_time = None
+        self.host_status.clear()
+        self.reported_servers.clear()
+        self.host_status_version += 1
 
     def process_queue_data(self):
-        while True:
-            try:
-                data = self.data_queue.get(timeout=0.1)
-                server_id = data.get("server_id")
-                if not server_id or server_id not in self.server_data:
-                    continue
-                if data.get("status") == "data":
-                    self.server_data[server_id].append(data)
-                    self.last_data_time = time.time()
-                    if len(self.server_data[server_id]) > 100:
-                        self.server_data[server_id] = self.server_data[server_id][-100:]
-                elif data.get("status") == "error":
-                    st.error(f"服务器 {server_id} 错误: {data.get('message', '未知错误')}")
-            except queue.Empty:
-                break
+        # 一次取出通道中积压的全部样本，不再逐条带超时等待
+        source = self.subscriber or self.collector or self.replay
+        if not source:
+            return
+        with self.health.time("drain"):
+            self._process_samples(source.drain())
+
+    def _process_samples(self, samples):
+        now = time.time()
+        for data in samples:
+            if data.get("status") == "stats":
+                self.health.merge(data["stats"])
+                continue
+            server_id = data.get("server_id")
+            if not server_id or server_id not in self.server_data:
+                continue
+            if server_id not in self.reported_servers:
+                self.reported_servers.add(server_id)
+                self.host_status_version += 1
+            if data.get("status") == "data":
+                if self.host_status.pop(server_id, None):
+                    self.host_status_version += 1
+                values = {k: v for k, v in data.items() if k not in NON_METRIC_KEYS}
+                timestamp = data["timestamp"].timestamp()
+                self.health.observe("lag", server_id, now - timestamp)
+                self.server_data[server_id].append(timestamp, values, data.get("missing"))
+                if self.alerts:
+                    self.alerts.observe(server_id, timestamp, values)
+                self.last_data_time = time.time()
+                # 订阅守护进程时由守护进程负责持久化
+                if self.store and not self.subscriber:
+                    self.store.append(server_id, timestamp, values)
+            elif data.get("status") in ("error", "down"):
+                # 只记录状态，由状态面板统一显示，不再每个周期输出一条错误
+                status = (data["status"], data.get('message', '未知错误'))
+                if self.host_status.get(server_id) != status:
+                    self.host_status[server_id] = status
+                    self.host_status_version += 1
+            elif data.get("status") in ("up", "connected", "warmup"):
+                if self.host_status.pop(server_id, None):
+                    self.host_status_version += 1
+        if self.alerts and self.alerts.flush():
+            # 告警触发或恢复时重绘状态面板
+            self.host_status_version += 1
 
     def get_metric_labels(self, server_id):
         if server_id in self.monitors:
@@ -152,89 +295,151 @@ def create_sample_config():
         return config_path
     return config_path
 
-def render_combined_metrics(server_manager, chart_placeholder):
-    """渲染图表到指定占位符"""
-    with chart_placeholder.container():
-        if not any(server_manager.server_data.values()):
+# 图表显示范围: 标签 -> 最近的秒数，None 表示整个缓冲区
+TIME_WINDOWS = {"全部": None, "5 分钟": 300, "15 分钟": 900, "1 小时": 3600, "6 小时": 21600, "24 小时": 86400}
+
+# 选择的服务器超过该数量时默认显示集群概览
+FLEET_VIEW_THRESHOLD = 20
+
+def render_combined_metrics(server_manager, chart_placeholder, renderer, window=None, server_ids=None):
+    """渲染图表到指定占位符，没有新样本时保留上一帧"""
+    if not any(server_manager.server_data.values()):
+        with chart_placeholder.container():
             if server_manager.last_data_time and (time.time() - server_manager.last_data_time) > 5:
                 st.info("正在等待服务器数据...")
-            return
+        return
+    with server_manager.health.time("render", "图表"):
+        renderer.render(server_manager, chart_placeholder,
+                        lambda fig: chart_placeholder.plotly_chart(fig, use_container_width=True), window, server_ids)
+
+def show_host_status(server_manager, status_placeholder, rendered):
+    """在状态面板中汇总显示不可达和出错的服务器，只在状态变化时重绘"""
+    if rendered.get("version") == server_manager.host_status_version:
+        return
+    rendered["version"] = server_manager.host_status_version
+    with status_placeholder.container():
+        total = len(server_manager.server_data)
+        reported = len(server_manager.reported_servers)
+        if server_manager.monitoring and reported < total:
+            # 连接按握手速率逐步建立，服务器较多时首个样本需要一段时间
+            elapsed = time.time() - server_manager.monitoring_started
+            st.progress(reported / total, text=f"正在建立连接: {reported}/{total}，已用 {elapsed:.0f} 秒")
+        down = {k: v for k, (status, v) in server_manager.host_status.items() if status == "down"}
+        errors = {k: v for k, (status, v) in server_manager.host_status.items() if status == "error"}
+        if down:
+            st.error(f"{len(down)} 个服务器不可达，正在按退避间隔重连: " +
+                     "; ".join(f"{server_id} ({message})" for server_id, message in down.items()))
+        for server_id, message in errors.items():
+            st.warning(f"服务器 {server_id} 错误: {message}")
+        if server_manager.alerts:
+            for event in server_manager.alerts.active.values():
+                show = st.error if event["severity"] == "critical" else st.warning
+                show(f"告警 [{event['rule']}] {event['message']}")
+
+# 采集健康面板的刷新间隔（秒）
+HEALTH_REFRESH = 5
 
-        # 动态获取所有指标（使用列表而不是集合）
-        all_metrics = []
-        for data_list in server_manager.server_data.values():
-            for data in data_list:
-                metrics = [k for k in data.keys() if k not in ["server_id", "status", "timestamp"]]
-                for metric in metrics:
-                    if metric not in all_metrics:
-                        all_metrics.append(metric)
-        
-        # 创建子图，基于指标数量动态调整
-        fig = make_subplots(rows=len(all_metrics), cols=1, 
-                            subplot_titles=[server_manager.get_metric_labels(server_id).get(metric, metric) 
-                                            for server_id in server_manager.server_data.keys() 
-                                            for metric in all_metrics][:len(all_metrics)], 
-                            shared_xaxes=True, vertical_spacing=0.1)
-        colors = ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd', '#8c564b']
-
-        for idx, (server_id, data) in enumerate(server_manager.server_data.items()):
-            if not data:
+def show_collector_health(server_manager, health_placeholder, rendered):
+    """采集健康面板：各阶段耗时分位数，握手、执行和样本延迟最慢的主机，以及各面板的渲染耗时"""
+    health = server_manager.health
+    if not health.histograms or time.time() - rendered.get("time", 0) < HEALTH_REFRESH:
+        return
+    rendered["time"] = time.time()
+    with health_placeholder.container():
+        st.subheader("采集健康")
+        stages = health.by_stage()
+        rows = [{"阶段": label, **stages[stage].summary()} for stage, label in STAGES.items() if stage in stages]
+        st.dataframe(pd.DataFrame(rows).round(2), hide_index=True, use_container_width=True)
+        cols = st.columns(3)
+        for col, stage in zip(cols, ("connect", "exec", "lag")):
+            slowest = health.slowest_hosts(stage)
+            if not slowest:
                 continue
-            df = pd.DataFrame(data)
-            color = colors[idx % len(colors)]
-            labels = server_manager.get_metric_labels(server_id)
-            for row, metric in enumerate(all_metrics, 1):
-                if metric in df.columns and not df[metric].isna().all():
-                    fig.add_trace(
-                        go.Scatter(x=df['timestamp'], y=df[metric], mode='lines+markers', 
-                                   name=f"{server_id} {labels.get(metric, metric)}",
-                                   line=dict(color=color, width=2), fill='tozeroy', legendgroup=server_id),
-                        row=row, col=1
-                    )
-
-        fig.update_layout(height=300 * len(all_metrics), title_text="所有服务器资源使用率", showlegend=True,
-                          legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1))
-        for i in range(1, len(all_metrics) + 1):
-            fig.update_yaxes(range=[0, 100] if "percentage" in all_metrics[i-1] or "usage" in all_metrics[i-1] else None, 
-                             row=i, col=1)
-        fig.update_xaxes(title_text="时间", row=len(all_metrics), col=1)
-        st.plotly_chart(fig, use_container_width=True)
-
-def show_latest_metrics(server_manager, metrics_placeholder):
-    """显示最新数据到指定占位符"""
+            with col:
+                st.caption(f"{STAGES[stage]} p99 最慢的主机")
+                st.dataframe(pd.DataFrame([{"主机": host, **histogram.summary()} for host, histogram in slowest]).round(2),
+                             hide_index=True, use_container_width=True)
+        # 渲染阶段按面板（图表、最新数据、集群概览）分别记录
+        panels = health.slowest_hosts("render")
+        if panels:
+            st.caption("各面板渲染耗时")
+            st.dataframe(pd.DataFrame([{"面板": panel, **histogram.summary()} for panel, histogram in panels]).round(2),
+                         hide_index=True, use_container_width=True)
+
+def show_labeled_table(keys, latest, labels):
+    """按标签名分组，每组一张表：行为标签值（如 eth0、1234/nginx），列为指标"""
+    tables = {}
+    for key in keys:
+        name, key_labels = parse_series_key(key)
+        rows = tables.setdefault(tuple(key_labels), {})
+        rows.setdefault(label_text(key), {})[labels.get(name, name)] = latest[key]
+    for label_names, rows in tables.items():
+        table = pd.DataFrame.from_dict(rows, orient='index').rename_axis("/".join(label_names))
+        st.dataframe(table.round(2), use_container_width=True)
+
+def show_latest_metrics(server_manager, metrics_placeholder, tracker):
+    """显示最新数据到指定占位符，没有新样本时不重绘"""
+    if not tracker.dirty(metrics_placeholder, server_manager.server_data):
+        return
+    tracker.mark(metrics_placeholder, server_manager.server_data)
     with metrics_placeholder.container():
         st.subheader("最新数据")
-        for server_id, data in server_manager.server_data.items():
-            if not data:
+        for server_id, buffer in server_manager.server_data.items():
+            if not len(buffer):
                 continue
-            df = pd.DataFrame(data)
-            latest = df.iloc[-1]
+            _, latest = buffer.latest()
             hostname = server_manager.servers[server_id]['hostname']
             st.markdown(f"### {server_id} ({hostname})")
             
             labels = server_manager.get_metric_labels(server_id)
-            metric_keys = [key for key in latest.index if key not in ["server_id", "status", "timestamp"]]
+            # 带标签的序列（每个网卡、磁盘、进程一条）数量可能很多，不逐个显示卡片，汇总为表格
+            metric_keys = [key for key in latest if not is_labeled(key)]
+            labeled_keys = [key for key in latest if is_labeled(key)]
+            if labeled_keys:
+                show_labeled_table(labeled_keys, latest, labels)
+            if not metric_keys:
+                continue
             cols = st.columns(min(len(metric_keys), 3))
             
             for idx, key in enumerate(metric_keys):
                 label = labels.get(key, key)
                 value = latest[key]
-                if pd.isna(value):
-                    continue
                 with cols[idx % 3]:
                     unit = "MB" if "memory" in key and key != "memory_percentage" else "%"
                     st.metric(label=label, value=f"{value:.2f}{unit}")
             
+            if buffer.last_missing:
+                st.caption(f"本次采样缺失指标: {', '.join(buffer.last_missing)}")
+
             if 'memory_used' in latest and 'memory_total' in latest:
-                with cols[1]:
+                with cols[1 % len(cols)]:
                     st.text(f"已用内存: {latest['memory_used']:.0f}MB / {latest['memory_total']:.0f}MB")
 
+def parse_args(argv=None):
+    """命令行参数通过 streamlit run main.py -- --replay ... 传入"""
+    parser = argparse.ArgumentParser(description="多服务器监控系统看板")
+    parser.add_argument("--replay", default=None, help="回放录制文件（见 collector.py --record），不连接服务器")
+    parser.add_argument("--speed", default="1", help="回放倍速，max 表示不等待，默认 1")
+    parser.add_argument("--clones", type=int, default=1, help="把每台主机复制为 N 台，默认 1")
+    parser.add_argument("--loop", action="store_true", help="播放完毕后从头继续")
+    return parser.parse_known_args(argv)[0]
+
+def fleet_options(server_manager):
+    """集群概览侧边栏的选项: (热力图指标, 可下钻的服务器)。
+    带标签的序列（每个进程、网卡一条）不适合跨主机比较，与集群概览的指标列表一致只列出普通指标"""
+    metrics = list(dict.fromkeys(metric for buffer in server_manager.server_data.values()
+                                 for metric in buffer.columns if not is_labeled(metric)))
+    return metrics, list(server_manager.server_data)
+
 def main():
     st.set_page_config(page_title="多服务器监控系统", page_icon="🖥️", layout="wide")
     st.title("多服务器资源监控仪表盘")
 
     if 'server_manager' not in st.session_state:
         st.session_state.server_manager = ServerManager()
+        args = parse_args()
+        if args.replay:
+            st.session_state.server_manager.load_replay(ReplaySource(args.replay, args.speed, args.clones, args.loop))
     server_manager = st.session_state.server_manager
 
     config_file = os.path.join('config', 'servers.yaml')
@@ -246,12 +451,28 @@ def main():
 
     with st.sidebar:
         st.header("监控控制")
-        interval = st.slider("刷新间隔 (秒)", min_value=1, max_value=60, value=server_manager.interval, key="interval")
-        if interval != server_manager.interval:
-            server_manager.interval = interval
-            server_manager.save_config(config_file, list(server_manager.servers.values()), interval)
+        # 亚秒级间隔仅建议在 mode: stream 的服务器上使用
+        interval = st.slider("刷新间隔 (秒)", min_value=0.1, max_value=60.0, value=float(server_manager.interval),
+                             step=0.1, key="interval")
+        # 只在滑块被拖动时应用；配置文件被外部修改后滑块保留旧值，不能据此把文件改回去
+        if interval != st.session_state.get("applied_interval", interval):
+            server_manager.set_interval(interval)
+        st.session_state.applied_interval = interval
         selected_servers = st.multiselect("选择要监控的服务器", options=list(server_manager.servers.keys()),
                                          default=list(server_manager.servers.keys()), key="selected_servers")
+        window_label = st.selectbox("显示范围", options=list(TIME_WINDOWS), key="time_window")
+        # 服务器较多时默认使用集群概览，逐台绘图会产生上千条曲线和组件
+        view = st.radio("视图", options=["单服务器", "集群概览"], index=int(len(selected_servers) > FLEET_VIEW_THRESHOLD),
+                        key="view")
+        sidebar_options = fleet_options(server_manager)
+        if view == "集群概览":
+            fleet_metrics, fleet_servers = sidebar_options
+            heatmap_metric = st.selectbox("热力图/排序指标", options=fleet_metrics, key="heatmap_metric")
+            top_n = st.number_input("最差主机数量", min_value=5, max_value=200, value=20, step=5, key="top_n")
+            drilldown = st.multiselect("查看服务器详情", options=fleet_servers, key="drilldown")
+        if server_manager.health.histograms:
+            st.download_button("导出自监控数据", data=json.dumps(server_manager.health.export()),
+                               file_name="collector_health.json", mime="application/json", key="export_health")
         col1, col2 = st.columns(2)
         with col1:
             start_button = st.button("开始监控", key="start_btn")
@@ -260,19 +481,46 @@ def main():
 
     if start_button and not server_manager.monitoring and selected_servers:
         server_manager.start_monitoring(selected_servers)
-        st.success(f"开始监控 {len(selected_servers)} 个服务器")
+        if server_manager.subscriber:
+            st.success(f"已连接采集守护进程，开始显示 {len(selected_servers)} 个服务器")
+        else:
+            st.success(f"开始监控 {len(selected_servers)} 个服务器")
     if stop_button and server_manager.monitoring:
         server_manager.stop_monitoring()
         st.warning("监控已停止")
 
+    status_placeholder = st.empty()
+    health_placeholder = st.empty()
     chart_placeholder = st.empty()
     metrics_placeholder = st.empty()
+    if 'chart_renderer' not in st.session_state:
+        st.session_state.chart_renderer = ChartRenderer(server_manager.chart_width)
+        st.session_state.latest_tracker = DirtyTracker()
+        st.session_state.fleet_renderer = FleetRenderer()
 
+    status_rendered = {}
+    health_rendered = {}
     while True:
+        server_manager.reload_config()
         server_manager.process_queue_data()
-        if server_manager.monitoring:
-            render_combined_metrics(server_manager, chart_placeholder)
-            show_latest_metrics(server_manager, metrics_placeholder)
+        show_host_status(server_manager, status_placeholder, status_rendered)
+        show_collector_health(server_manager, health_placeholder, health_rendered)
+        if server_manager.monitoring and view == "集群概览":
+            # 侧边栏的选项只在脚本运行时计算一次：开始监控后首批指标到达、或出现新的指标时重新运行一次以更新选项
+            if fleet_options(server_manager) != sidebar_options:
+                st.rerun()
+            with server_manager.health.time("render", "集群概览"):
+                st.session_state.fleet_renderer.render(server_manager, chart_placeholder, TIME_WINDOWS[window_label],
+                                                       heatmap_metric, top_n)
+            if drilldown:
+                # 下钻：只为选中的服务器绘制原有的逐台图表
+                render_combined_metrics(server_manager, metrics_placeholder, st.session_state.chart_renderer,
+                                        TIME_WINDOWS[window_label], drilldown)
+        elif server_manager.monitoring:
+            render_combined_metrics(server_manager, chart_placeholder, st.session_state.chart_renderer,
+                                    TIME_WINDOWS[window_label])
+            with server_manager.health.time("render", "最新数据"):
+                show_latest_metrics(server_manager, metrics_placeholder, st.session_state.latest_tracker)
         elif not selected_servers:
             st.warning("未选择任何服务器，请在侧边栏选择要监控的服务器")
         else:
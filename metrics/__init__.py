@@ -1,3 +1,10 @@
-from .cpu_metric import CpuMetric
-from .memory_metric import MemoryMetric
-from .disk_metric import DiskMetric
\ No newline at end of file
+"""内置监控指标。各指标模块由 WatcherRegister 在配置用到时才导入，新增指标不需要修改本文件；
+仍然可以直接导入，如 from metrics import CpuMetric"""
+from importlib import import_module
+from watcher_register import BUILTIN_MODULES, WatcherModuleType
+
+def __getattr__(name):
+    module = BUILTIN_MODULES[WatcherModuleType.METRIC].get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(import_module(module), name)
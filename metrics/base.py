@@ -1,15 +1,51 @@
+from probe import build_probe_script, parse_probe_output
+
 class Metric:
+    # 数据源声明 {名称: 远端命令}。ServerMonitor 每个周期把所有指标的数据源合并成一次远端执行，
+    # 再把各自的分段输出交给 parse
+    sources = {}
+    # 可能因 I/O 挂起的数据源（如 stale NFS 上的 statvfs）排在探测脚本末尾
+    slow = False
+    # 每个周期的超时预算（秒），超时的指标在该周期的样本中标记为缺失
+    timeout = 5
+    # 采集周期（秒），None 表示使用服务器的周期。周期较长的昂贵指标只在到期时才加入探测脚本
+    interval = None
+    # 速率类指标首次采样（或计数器回退后）只记录基线时由 parse 返回，表示尚无数据，
+    # 不计入样本的缺失指标，也不会被当作采集失败
+    WARMING_UP = object()
+
     def __init__(self, name, sub_metrics):
         self.name = name
         self.sub_metrics = sub_metrics
 
+    @staticmethod
+    def labeled(sub_key, *labels):
+        """带标签的子指标键，labels 为 (标签名, 值) 对，例如 labeled("rx_bytes", ("iface", "eth0"))
+        在样本中展开为 net_rx_bytes{iface="eth0"}。标签集合可以随每次采样变化，新序列自动出现"""
+        return (sub_key, labels)
+
+    def parse(self, monitor, sections):
+        """Parse this metric's value from the probe sections ({source name: output}).
+        Returns {sub_key: value}; labeled series use keys built with labeled()."""
+        raise NotImplementedError("Subclasses that declare sources must implement parse method")
+
     def get_value(self, monitor):
-        raise NotImplementedError("Subclasses must implement get_value method")
-    
+        if not self.sources:
+            raise NotImplementedError("Subclasses must implement get_value method or declare sources")
+        output = monitor.execute_command(build_probe_script(self.sources))
+        if output is None:
+            return None
+        return self.parse(monitor, parse_probe_output(output))
+
     async def get_value_async(self, monitor):
-        """Async version of get_value. By default falls back to synchronous version.
-        Subclasses should override this for improved performance."""
-        return self.get_value(monitor)
+        """Async version of get_value. Metrics that declare sources run only their own probe;
+        otherwise falls back to the synchronous version."""
+        if not self.sources:
+            return self.get_value(monitor)
+        output = await monitor.execute_command_async(build_probe_script(self.sources))
+        if output is None:
+            return None
+        return self.parse(monitor, parse_probe_output(output))
 
     def get_sub_metrics(self):
-        return self.sub_metrics
\ No newline at end of file
+        return self.sub_metrics
@@ -5,28 +5,73 @@ from .base import Metric
 # 获取logger
 logger = logging.getLogger('server_watcher.metrics.cpu')
 
+# /proc/stat 中 cpu 行前 8 列: user nice system idle iowait irq softirq steal
+# (guest/guest_nice 已计入 user/nice，不重复累加)
+_FIELDS = 8
+
+def _parse_stat(output):
+    counters = {}
+    for line in output.splitlines():
+        if not line.startswith("cpu"):
+            continue
+        fields = line.split()
+        counters[fields[0]] = [int(v) for v in fields[1:_FIELDS + 1]]
+    return counters
+
+def _usage(previous, current):
+    if sum(current) <= sum(previous):
+        return None
+    # 部分内核的 iowait 计数会轻微回退，单项按 0 处理
+    deltas = [max(c - p, 0) for p, c in zip(previous, current)]
+    total = sum(deltas)
+    user, nice, system, idle, iowait, irq, softirq, steal = deltas + [0] * (_FIELDS - len(deltas))
+    return {
+        "usage": 100.0 * (total - idle - iowait) / total,
+        "iowait": 100.0 * iowait / total,
+        "steal": 100.0 * steal / total,
+        "irq": 100.0 * (irq + softirq) / total,
+    }
+
 @WatcherRegister.register(WatcherModuleType.METRIC)
 class CpuMetric(Metric):
-    def __init__(self):
-        sub_metrics = [("usage", "CPU使用率")]
+    sources = {"stat": "cat /proc/stat"}
+
+    def __init__(self, per_core=False):
+        sub_metrics = [
+            ("usage", "CPU使用率"),
+            ("iowait", "CPU IO等待"),
+            ("steal", "CPU Steal"),
+            ("irq", "CPU 中断"),
+        ]
         super().__init__("cpu", sub_metrics)
+        self.per_core = per_core
 
-    def get_value(self, monitor):
-        result = monitor.execute_command("top -bn1 | grep 'Cpu(s)' | awk '{print $2 + $4}'")
-        if result:
-            try:
-                return {"usage": float(result.strip())}
-            except Exception as e:
-                logger.error(f"解析CPU使用率失败: {e}")
-                return None
-        return None
-        
-    async def get_value_async(self, monitor):
-        result = await monitor.execute_command_async("top -bn1 | grep 'Cpu(s)' | awk '{print $2 + $4}'")
-        if result:
-            try:
-                return {"usage": float(result.strip())}
-            except Exception as e:
-                logger.error(f"异步解析CPU使用率失败: {e}")
-                return None
-        return None
\ No newline at end of file
+    def parse(self, monitor, sections):
+        output = sections.get("stat")
+        if not output:
+            return None
+        try:
+            counters = _parse_stat(output)
+        except Exception as e:
+            logger.error(f"解析CPU使用率失败: {e}")
+            return None
+
+        # 上一次的 jiffy 计数保存在各主机的 monitor 中，首个样本只记录基线
+        state = monitor.metric_state.setdefault(self.name, {})
+        previous = state.get("counters")
+        state["counters"] = counters
+        if not previous or "cpu" not in previous or "cpu" not in counters:
+            return self.WARMING_UP
+
+        value = _usage(previous["cpu"], counters["cpu"])
+        if value is None:
+            # 计数器回退（例如主机重启），重新建立基线
+            return self.WARMING_UP
+        if self.per_core:
+            # 每个核心是 cpu_usage 的一条带标签序列 cpu_usage{core="N"}，与总使用率画在同一个子图中
+            for core in sorted((name for name in counters if name != "cpu"), key=lambda n: int(n[3:])):
+                if core in previous:
+                    core_value = _usage(previous[core], counters[core])
+                    if core_value is not None:
+                        value[self.labeled("usage", ("core", core[3:]))] = core_value["usage"]
+        return value
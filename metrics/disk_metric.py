@@ -5,34 +5,41 @@ from .base import Metric
 # Get the logger
 logger = logging.getLogger('server_watcher.metrics.disk')
 
+ALL_MOUNTS_COMMAND = ("stat -f -c '%n %b %f %a %S' / $(awk '$1 ~ \"^/dev/\" && $3 != \"squashfs\" && $2 != \"/\" "
+                      "&& !seen[$1]++ {print $2}' /proc/mounts)")
+
 @WatcherRegister.register(WatcherModuleType.METRIC)
 class DiskMetric(Metric):
-    def __init__(self):
+    # 输出格式: 路径 总块数 空闲块数 非特权可用块数 块大小，与 agent 中的 statvfs 数据源一致
+    sources = {"statvfs": "stat -f -c '%n %b %f %a %S' /"}
+    slow = True
+
+    def __init__(self, all_mounts=False):
         sub_metrics = [("usage", "磁盘使用率")]
         super().__init__("disk", sub_metrics)
+        if all_mounts:
+            # 根目录之外，每个块设备取第一个挂载点（跳过 squashfs），输出为 disk_usage{mount="..."}
+            self.sources = {"statvfs_all": ALL_MOUNTS_COMMAND}
 
-    def get_value(self, monitor):
-        disk_cmd = "df -h / | grep -v Filesystem | awk '{print $5}'"
-        disk_usage = monitor.execute_command(disk_cmd)
-        
-        if disk_usage:
-            try:
-                percentage = float(disk_usage.strip().replace('%', ''))
-                return {"usage": percentage}
-            except Exception as e:
-                logger.error(f"解析磁盘使用率失败: {e}")
-                return None
-        return None
-        
-    async def get_value_async(self, monitor):
-        disk_cmd = "df -h / | grep -v Filesystem | awk '{print $5}'"
-        disk_usage = await monitor.execute_command_async(disk_cmd)
-        
-        if disk_usage:
-            try:
-                percentage = float(disk_usage.strip().replace('%', ''))
-                return {"usage": percentage}
-            except Exception as e:
-                logger.error(f"异步解析磁盘使用率失败: {e}")
-                return None
-        return None
\ No newline at end of file
+    def parse(self, monitor, sections):
+        output = sections.get(next(iter(self.sources)))
+        if not output:
+            return None
+        try:
+            result = {}
+            for line in output.splitlines():
+                # 挂载点可能含空格，从右侧拆分
+                path, blocks, free, available, _ = line.rsplit(None, 4)
+                # 与 df 相同：已用 / (已用 + 非特权可用)
+                used = float(blocks) - float(free)
+                if used + float(available) <= 0:
+                    continue
+                percentage = used / (used + float(available)) * 100
+                if path == "/":
+                    result["usage"] = percentage
+                else:
+                    result[self.labeled("usage", ("mount", path))] = percentage
+            return result or None
+        except Exception as e:
+            logger.error(f"解析磁盘使用率失败: {e}")
+            return None
@@ -0,0 +1,77 @@
+from watcher_register import WatcherRegister, WatcherModuleType
+from fnmatch import fnmatch
+import logging
+import re
+import time
+from .base import Metric
+
+# 获取logger
+logger = logging.getLogger('server_watcher.metrics.diskio')
+
+# /proc/diskstats 的扇区固定为 512 字节，与设备的实际扇区大小无关
+_SECTOR = 512
+
+# 分区和虚拟设备不单独输出：分区的 I/O 已计入整块磁盘
+_SKIPPED = re.compile(r"^(loop|ram|zram|fd|sr)\d|^((sd|vd|xvd|hd)[a-z]+\d+|(nvme\d+n\d+|mmcblk\d+)p\d+)$")
+
+def _parse_diskstats(output, devices=None):
+    """返回 {设备: (读扇区, 写扇区, 繁忙毫秒)}"""
+    counters = {}
+    for line in output.splitlines():
+        fields = line.split()
+        if len(fields) < 13:
+            continue
+        device = fields[2]
+        if devices is not None:
+            if not any(fnmatch(device, pattern) for pattern in devices):
+                continue
+        elif _SKIPPED.match(device):
+            continue
+        counters[device] = (int(fields[5]), int(fields[9]), int(fields[12]))
+    return counters
+
+@WatcherRegister.register(WatcherModuleType.METRIC)
+class DiskIOMetric(Metric):
+    sources = {"diskstats": "cat /proc/diskstats"}
+
+    def __init__(self, devices=None):
+        sub_metrics = [
+            ("read_bytes", "磁盘读取 (B/s)"),
+            ("write_bytes", "磁盘写入 (B/s)"),
+            ("util", "磁盘繁忙度"),
+        ]
+        super().__init__("diskio", sub_metrics)
+        # 设备名通配符列表，如 ["sd*", "nvme*"]；默认输出所有整块磁盘
+        self.devices = devices
+
+    def parse(self, monitor, sections):
+        output = sections.get("diskstats")
+        if not output:
+            return None
+        try:
+            counters = _parse_diskstats(output, self.devices)
+        except Exception as e:
+            logger.error(f"解析磁盘 I/O 失败: {e}")
+            return None
+
+        # 与 CpuMetric 相同，上一次的计数保存在各主机的 monitor 中，首个样本只记录基线
+        now = time.monotonic()
+        state = monitor.metric_state.setdefault(self.name, {})
+        previous, last = state.get("counters"), state.get("time")
+        state["counters"], state["time"] = counters, now
+        if not previous or now <= last:
+            return self.WARMING_UP
+        elapsed = now - last
+        result = {}
+        for device, (read, written, busy) in counters.items():
+            if device not in previous:
+                continue
+            last_read, last_written, last_busy = previous[device]
+            if read < last_read or written < last_written or busy < last_busy:
+                # 计数器回退（设备重新挂载或主机重启），跳过该设备一个周期
+                continue
+            labels = (("device", device),)
+            result[self.labeled("read_bytes", *labels)] = (read - last_read) * _SECTOR / elapsed
+            result[self.labeled("write_bytes", *labels)] = (written - last_written) * _SECTOR / elapsed
+            result[self.labeled("util", *labels)] = min((busy - last_busy) / (elapsed * 10), 100.0)
+        return result
@@ -7,6 +7,8 @@ logger = logging.getLogger('server_watcher.metrics.memory')
 
 @WatcherRegister.register(WatcherModuleType.METRIC)
 class MemoryMetric(Metric):
+    sources = {"meminfo": "cat /proc/meminfo"}
+
     def __init__(self):
         sub_metrics = [
             ("percentage", "内存使用率"),
@@ -15,46 +17,27 @@ class MemoryMetric(Metric):
         ]
         super().__init__("memory", sub_metrics)
 
-    def get_value(self, monitor):
-        total_cmd = "free -m | grep 'Mem:' | awk '{print $2}'"
-        used_cmd = "free -m | grep 'Mem:' | awk '{print $3}'"
-        
-        total_mem = monitor.execute_command(total_cmd)
-        used_mem = monitor.execute_command(used_cmd)
-        
-        if total_mem and used_mem:
-            try:
-                total = float(total_mem.strip())
-                used = float(used_mem.strip())
-                percentage = (used / total) * 100
-                return {
-                    "percentage": percentage,
-                    "used": used,
-                    "total": total
-                }
-            except Exception as e:
-                logger.error(f"解析内存数据失败: {e}")
-                return None
-        return None
-        
-    async def get_value_async(self, monitor):
-        total_cmd = "free -m | grep 'Mem:' | awk '{print $2}'"
-        used_cmd = "free -m | grep 'Mem:' | awk '{print $3}'"
-        
-        total_mem = await monitor.execute_command_async(total_cmd)
-        used_mem = await monitor.execute_command_async(used_cmd)
-        
-        if total_mem and used_mem:
-            try:
-                total = float(total_mem.strip())
-                used = float(used_mem.strip())
-                percentage = (used / total) * 100
-                return {
-                    "percentage": percentage,
-                    "used": used,
-                    "total": total
-                }
-            except Exception as e:
-                logger.error(f"异步解析内存数据失败: {e}")
-                return None
-        return None
\ No newline at end of file
+    def parse(self, monitor, sections):
+        output = sections.get("meminfo")
+        if not output:
+            return None
+        try:
+            # /proc/meminfo 单位为 kB，与 free 一致按 total - available 计算已用内存
+            info = {}
+            for line in output.splitlines():
+                key, _, value = line.partition(":")
+                info[key] = float(value.split()[0])
+            available = info.get("MemAvailable")
+            if available is None:
+                available = info["MemFree"] + info.get("Buffers", 0) + info.get("Cached", 0)
+            total = info["MemTotal"] / 1024
+            used = (info["MemTotal"] - available) / 1024
+            percentage = (used / total) * 100
+            return {
+                "percentage": percentage,
+                "used": used,
+                "total": total
+            }
+        except Exception as e:
+            logger.error(f"解析内存数据失败: {e}")
+            return None
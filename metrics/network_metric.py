@@ -0,0 +1,73 @@
+from watcher_register import WatcherRegister, WatcherModuleType
+from fnmatch import fnmatch
+import logging
+import time
+from .base import Metric
+
+# 获取logger
+logger = logging.getLogger('server_watcher.metrics.network')
+
+def _parse_netdev(output, interfaces=None):
+    """返回 {网卡: (接收字节, 发送字节, 错误数, 丢包数)}，跳过两行表头和回环网卡"""
+    counters = {}
+    for line in output.splitlines()[2:]:
+        name, _, values = line.partition(":")
+        name = name.strip()
+        if interfaces is not None:
+            if not any(fnmatch(name, pattern) for pattern in interfaces):
+                continue
+        elif name == "lo":
+            continue
+        fields = values.split()
+        if len(fields) < 12:
+            continue
+        # 接收: bytes packets errs drop ...，发送从第 9 列开始
+        counters[name] = (int(fields[0]), int(fields[8]),
+                          int(fields[2]) + int(fields[10]), int(fields[3]) + int(fields[11]))
+    return counters
+
+@WatcherRegister.register(WatcherModuleType.METRIC)
+class NetworkMetric(Metric):
+    sources = {"netdev": "cat /proc/net/dev"}
+
+    def __init__(self, interfaces=None):
+        sub_metrics = [
+            ("rx_bytes", "网络接收 (B/s)"),
+            ("tx_bytes", "网络发送 (B/s)"),
+            ("errors", "网络错误 (个/s)"),
+            ("drops", "网络丢包 (个/s)"),
+        ]
+        super().__init__("net", sub_metrics)
+        # 网卡名通配符列表，如 ["eth*", "ens*"]；默认输出除 lo 外的所有网卡
+        self.interfaces = interfaces
+
+    def parse(self, monitor, sections):
+        output = sections.get("netdev")
+        if not output:
+            return None
+        try:
+            counters = _parse_netdev(output, self.interfaces)
+        except Exception as e:
+            logger.error(f"解析网络流量失败: {e}")
+            return None
+
+        now = time.monotonic()
+        state = monitor.metric_state.setdefault(self.name, {})
+        previous, last = state.get("counters"), state.get("time")
+        state["counters"], state["time"] = counters, now
+        if not previous or now <= last:
+            return self.WARMING_UP
+        elapsed = now - last
+        result = {}
+        for iface, current in counters.items():
+            before = previous.get(iface)
+            if before is None:
+                continue
+            deltas = [c - p for p, c in zip(before, current)]
+            if min(deltas) < 0:
+                # 计数器回退（网卡重建或 32 位计数器回绕），跳过该网卡一个周期
+                continue
+            labels = (("iface", iface),)
+            for (sub_key, _), delta in zip(self.sub_metrics, deltas):
+                result[self.labeled(sub_key, *labels)] = delta / elapsed
+        return result
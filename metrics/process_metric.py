@@ -0,0 +1,75 @@
+from watcher_register import WatcherRegister, WatcherModuleType
+import heapq
+import logging
+import time
+from .base import Metric
+
+# 获取logger
+logger = logging.getLogger('server_watcher.metrics.process')
+
+# USER_HZ 和页大小在远端无法廉价获取，按 Linux 上几乎通用的 100 和 4 KiB 计算
+_CLK_TCK = 100
+_PAGE_MB = 4096 / (1024 * 1024)
+
+def _parse_pid_stats(output):
+    """返回 {(pid, 启动时间): (进程名, CPU jiffies, 常驻页数)}"""
+    processes = {}
+    for line in output.splitlines():
+        # 进程名可能包含空格和括号，以最后一个右括号为界
+        close = line.rfind(")")
+        if close < 0:
+            continue
+        pid, _, comm = line[:close].partition(" (")
+        fields = line[close + 2:].split()
+        if len(fields) < 22:
+            continue
+        # fields[0] 为 stat 的第 3 列 state，utime/stime/starttime/rss 为第 14/15/22/24 列
+        processes[(pid, fields[19])] = (comm, int(fields[11]) + int(fields[12]), int(fields[21]))
+    return processes
+
+@WatcherRegister.register(WatcherModuleType.METRIC)
+class TopProcessesMetric(Metric):
+    # 进程多时输出较大，建议配合较长的 interval 使用
+    sources = {"pidstat": "cat /proc/[0-9]*/stat 2>/dev/null"}
+
+    def __init__(self, n=10, by="cpu"):
+        sub_metrics = [
+            ("cpu", "进程 CPU 使用率"),
+            ("rss", "进程内存 (MB)"),
+        ]
+        super().__init__("proc", sub_metrics)
+        if by not in ("cpu", "rss"):
+            raise ValueError(f"不支持的排序方式: {by}")
+        self.n = n
+        self.by = by
+
+    def parse(self, monitor, sections):
+        output = sections.get("pidstat")
+        if not output:
+            return None
+        try:
+            processes = _parse_pid_stats(output)
+        except Exception as e:
+            logger.error(f"解析进程列表失败: {e}")
+            return None
+
+        now = time.monotonic()
+        state = monitor.metric_state.setdefault(self.name, {})
+        previous, last = state.get("processes"), state.get("time")
+        state["processes"], state["time"] = processes, now
+        if not previous or now <= last:
+            return self.WARMING_UP
+        elapsed = now - last
+        rows = []
+        for key, (comm, jiffies, pages) in processes.items():
+            # 以 (pid, 启动时间) 识别进程，pid 被复用时不会算出错误的差值
+            before = previous.get(key)
+            cpu = (jiffies - before[1]) / _CLK_TCK / elapsed * 100 if before else 0.0
+            rows.append((cpu, pages * _PAGE_MB, key[0], comm))
+        index = 0 if self.by == "cpu" else 1
+        result = {}
+        for cpu, rss, pid, comm in heapq.nlargest(self.n, rows, key=lambda row: row[index]):
+            labels = (("pid", pid), ("comm", comm))
+            result[self.labeled("cpu", *labels)] = cpu
+            result[self.labeled("rss", *labels)] = rss
+        return result
@@ -1,9 +1,20 @@
 import asyncio
+import inspect
+import json
 import logging
+import shlex
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import os
 from watcher_register import WatcherRegister, WatcherModuleType
-import asyncssh
+from probe import SECTION_MARKER, collect_sources, build_probe_script, parse_probe_output
+from ssh_pool import ConnectionPool, connection_key
+from circuit_breaker import CircuitOpenError
+from instrumentation import RECORDER
+from scheduler import MetricSchedule, hash_phase
+from series import series_key
+import agent
 
 # 获取应用logger
 logger = logging.getLogger('server_watcher.monitor')
@@ -12,8 +23,15 @@ logger = logging.getLogger('server_watcher.monitor')
 asyncssh_logger = logging.getLogger('asyncssh')
 asyncssh_logger.setLevel(logging.WARNING)  # 只显示警告和错误信息
 
+# 样本中不属于监控指标的字段
+NON_METRIC_KEYS = ["server_id", "status", "timestamp", "missing"]
+
+# 流式模式下经 stdin 发送给远端 python3 的代理源码
+AGENT_SOURCE = inspect.getsource(agent)
+
 class ServerMonitor:
-    def __init__(self, server_id, hostname, username, password=None, key_filename=None, port=22):
+    def __init__(self, server_id, hostname, username, password=None, key_filename=None, port=22, mode="exec",
+                 pool=None):
         self.server_id = server_id
         self.hostname = hostname
         self.username = username
@@ -24,48 +42,52 @@ class ServerMonitor:
         self.conn = None  # asyncssh connection
         self.connected = False
         self.metrics = []
+        self.metric_state = {}  # 指标在采样之间需要保留的状态，如 CPU 的上一次 jiffy 计数
+        self.mode = mode  # "exec": 每个周期执行一次探测脚本; "stream": 远端常驻代理推送
+        self.stream = None
+        self.stream_exit_status = None
+        self.stream_channels = None
+        # 连接来自连接池，指向同一主机/用户/凭据的监控共用一个连接；未指定时使用独占的连接池
+        self.pool = pool or ConnectionPool()
+        self.pooled = None
 
     def register_metric(self, metric):
         self.metrics.append(metric)
 
     async def connect_async(self):
         try:
-            # Use asyncssh for async connections
-            if self.key_filename:
-                self.conn = await asyncssh.connect(
-                    host=self.hostname,
-                    username=self.username,
-                    client_keys=[self.key_filename],
-                    port=self.port,
-                    known_hosts=None
-                )
-            else:
-                self.conn = await asyncssh.connect(
-                    host=self.hostname,
-                    username=self.username,
-                    password=self.password,
-                    port=self.port,
-                    known_hosts=None
-                )
+            if self.pooled is None:
+                self.pooled = self.pool.acquire(connection_key({
+                    'hostname': self.hostname, 'port': self.port, 'username': self.username,
+                    'password': self.password, 'key_filename': self.key_filename}))
+            # 传入当前连接：若它已失效则重连，若共享者已经重连则直接使用新连接
+            self.conn = await self.pooled.open(stale=self.conn)
             self.connected = True
             return True
+        except CircuitOpenError:
+            # 主机处于熔断期，不发起连接也不记录日志
+            self.connected = False
+            return False
         except Exception as e:
-            logger.error(f"异步连接 {self.hostname} 失败: {e}")
+            # 连接失败的日志由连接池按熔断状态记录，避免每个周期重复输出
+            logger.debug(f"异步连接 {self.hostname} 失败: {e}")
             self.connected = False
             return False
     
     async def disconnect_async(self):
-        if self.conn:
-            self.conn.close()
-            await self.conn.wait_closed()
-            self.connected = False
+        if self.pooled:
+            # 连接由连接池管理，最后一个共享者释放时才真正关闭
+            await self.pool.release(self.pooled)
+            self.pooled = None
+        self.conn = None
+        self.connected = False
     
     def disconnect(self):
         if self.client:
             self.client.close()
             self.connected = False
-        # Also close asyncssh connection if exists
-        if self.conn:
+        # Also close asyncssh connection if exists (only when not shared with other monitors)
+        if self.conn and (self.pooled is None or self.pooled.refcount <= 1):
             self.conn.close()
             self.connected = False
     
@@ -74,7 +96,9 @@ class ServerMonitor:
             if not await self.connect_async():
                 return None
         try:
-            result = await self.conn.run(command, timeout=10)
+            async with self.pooled.channels:
+                with RECORDER.time("exec", self.server_id):
+                    result = await self.conn.run(command, timeout=10)
             if result.stderr:
                 logger.error(f"命令执行错误 ({self.hostname}): {result.stderr}")
                 return None
@@ -101,19 +125,165 @@ class ServerMonitor:
             self.connected = False
             return None
     
-    async def get_metrics_data_async(self):
+    async def _probe_into(self, sources, futures):
+        """执行探测脚本并逐段读取输出，某个数据源的分段一结束就完成对应的 future，
+        排在后面的慢数据源不会拖慢前面的指标"""
+        current = None
+        lines = []
+        try:
+            if not self.connected and not await self.connect_async():
+                raise ConnectionError("连接失败")
+            # 同一连接上同时打开的通道数受连接池限制，通道关闭后才归还名额
+            async with self.pooled.channels:
+                started = time.perf_counter()
+                process = await self.conn.create_process(build_probe_script(sources))
+                try:
+                    async for line in process.stdout:
+                        if line.startswith(SECTION_MARKER):
+                            _resolve_section(futures, current, lines)
+                            current = line[len(SECTION_MARKER):].strip()
+                            lines = []
+                        else:
+                            lines.append(line)
+                    _resolve_section(futures, current, lines)
+                    RECORDER.observe("exec", self.server_id, time.perf_counter() - started)
+                finally:
+                    process.close()
+        except Exception as e:
+            logger.error(f"异步命令执行失败 ({self.hostname}): {e}")
+            self.connected = False
+        finally:
+            # 未输出的数据源视为失败，对应指标会在解析时返回 None
+            for future in futures.values():
+                if not future.done():
+                    future.set_result(None)
+
+    async def _evaluate_metric(self, metric, futures):
+        try:
+            if not metric.sources:
+                return await asyncio.wait_for(metric.get_value_async(self), metric.timeout)
+            _, pending = await asyncio.wait([futures[name] for name in metric.sources], timeout=metric.timeout)
+            if pending:
+                logger.warning(f"指标 {metric.name} 超过 {metric.timeout} 秒未返回 ({self.hostname})")
+                return None
+            with RECORDER.time("parse", self.server_id):
+                return metric.parse(self, {name: futures[name].result() for name in metric.sources})
+        except asyncio.TimeoutError:
+            logger.warning(f"指标 {metric.name} 超过 {metric.timeout} 秒未返回 ({self.hostname})")
+            return None
+        except Exception as e:
+            logger.error(f"计算指标 {metric.name} 失败 ({self.hostname}): {e}")
+            return None
+
+    async def start_stream_async(self, interval):
+        """通过现有连接在远端启动常驻采集代理"""
+        if not self.connected:
+            if not await self.connect_async():
+                return False
+        sources = collect_sources(self.metrics)
+        command = f"python3 -u - {interval} {shlex.quote(json.dumps(sources))}"
+        # 常驻代理在整个流式期间占用一个通道名额，stop_stream 时归还
+        channels = self.pooled.channels
+        await channels.acquire()
+        try:
+            self.stream = await self.conn.create_process(command)
+            self.stream.stdin.write(AGENT_SOURCE)
+            self.stream.stdin.write_eof()
+            self.stream_channels = channels
+            return True
+        except Exception as e:
+            channels.release()
+            logger.error(f"启动采集代理失败 ({self.hostname}): {e}")
+            self.connected = False
+            return False
+
+    def stop_stream(self):
+        if self.stream:
+            self.stream_exit_status = self.stream.exit_status
+            self.stream.close()
+            self.stream = None
+            self.stream_channels.release()
+
+    async def stream_frames(self, interval):
+        """异步迭代代理推送的数据帧，每帧为 {数据源: 输出}"""
+        if not await self.start_stream_async(interval):
+            return
+        lines = []
+        try:
+            async for line in self.stream.stdout:
+                if line.rstrip("\n") == agent.FRAME_END:
+                    yield parse_probe_output("".join(lines))
+                    lines = []
+                else:
+                    lines.append(line)
+        except Exception as e:
+            logger.error(f"读取采集代理数据失败 ({self.hostname}): {e}")
+        finally:
+            self.stop_stream()
+
+    async def collect_async(self, sections=None, metrics=None):
+        """并发计算所有指标，每个指标有独立的超时预算，超时的指标不会拖慢其他指标。
+        sections 为 None 时本周期执行一次探测脚本，否则使用流式代理推送的数据帧。
+        metrics 为本周期到期的指标，默认为全部指标，探测脚本只包含它们的数据源。
+        返回 (数据, 本周期缺失的指标名列表)，首次采样只建立基线的指标不计入缺失"""
         data = {}
-        for metric in self.metrics:
-            # Check if the metric has an async version
-            if hasattr(metric, 'get_value_async'):
-                value = await metric.get_value_async(self)
-            else:
-                # Fall back to synchronous method
-                value = metric.get_value(self)
-            
-            if value is not None:
-                for sub_key, sub_value in value.items():
-                    data[f"{metric.name}_{sub_key}"] = sub_value
+        missing = []
+        async for stage_data, stage_missing, _ in self.collect_stages(metrics, sections=sections):
+            data.update(stage_data)
+            missing.extend(stage_missing)
+        return data, missing
+
+    async def collect_stages(self, metrics=None, budget=None, sections=None):
+        """与 collect_async 相同，但分批产出 (数据, 缺失的指标名列表, 本批指标)：
+        慢指标（声明了 slow，或超时预算超过 budget 秒）各自返回后单独产出，其余指标全部返回后立即产出，
+        慢数据源不会推迟快指标的样本。budget 为 None 时所有指标一起产出"""
+        metrics = self.metrics if metrics is None else metrics
+        loop = asyncio.get_running_loop()
+        sources = collect_sources(metrics)
+        futures = {name: loop.create_future() for name in sources}
+        probe_task = None
+        if sections is None:
+            if sources:
+                probe_task = asyncio.create_task(self._probe_into(sources, futures))
+        else:
+            for name, future in futures.items():
+                future.set_result(sections.get(name))
+        tasks = {asyncio.ensure_future(self._evaluate_metric(metric, futures)): metric for metric in metrics}
+        try:
+            pending = set(tasks)
+            fast = {task for task, metric in tasks.items()
+                    if budget is None or not (metric.slow or metric.timeout > budget)}
+            if fast:
+                await asyncio.wait(fast)
+                pending -= fast
+                yield self._stage(tasks, fast)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                yield self._stage(tasks, done)
+        finally:
+            for task in tasks:
+                task.cancel()
+            if probe_task:
+                # 所有指标已返回或超时，关闭仍在运行的远端脚本
+                probe_task.cancel()
+
+    def _stage(self, tasks, done):
+        data = {}
+        missing = []
+        metrics = []
+        for task, metric in tasks.items():
+            if task not in done:
+                continue
+            metrics.append(metric)
+            value = task.result()
+            if value is None:
+                missing.append(metric.name)
+            elif value is not metric.WARMING_UP:
+                _flatten(metric, value, data)
+        return data, missing, metrics
+
+    async def get_metrics_data_async(self):
+        data, _ = await self.collect_async()
         return data
     
     def get_metrics_data(self):
@@ -121,10 +291,18 @@ class ServerMonitor:
         for metric in self.metrics:
             value = metric.get_value(self)
             if value is not None:
-                for sub_key, sub_value in value.items():
-                    data[f"{metric.name}_{sub_key}"] = sub_value
+                _flatten(metric, value, data)
         return data
     
+    def reconfigure(self, server_config, warn=logger.warning):
+        """配置热加载时原地替换指标列表。指标间的状态（如 CPU 的上次计数）按指标名保存在 monitor 中，
+        不会因替换而丢失；连接保持不变"""
+        self.metrics = build_metrics(server_config, warn)
+
+    def schedule(self, interval, phase=0.0):
+        """按各指标的 interval（未配置时为服务器周期）建立截止时间表"""
+        return MetricSchedule({metric: metric.interval or interval for metric in self.metrics}, phase, default=interval)
+
     def get_metric_labels(self):
         labels = {}
         for metric in self.metrics:
@@ -132,53 +310,293 @@ class ServerMonitor:
                 labels[f"{metric.name}_{key}"] = label
         return labels
 
-async def async_monitor_server(server_config, interval, data_queue):
+class LocalServerMonitor(ServerMonitor):
+    """本地传输：在采集进程内直接读取 /proc 和调用 os.statvfs，不建立 SSH 连接。
+
+    数据源与 SSH 探测脚本相同，由 agent.read_source 读取，因此现有指标无需修改。
+    root 为主机根目录，在容器中通过绑定挂载监控宿主机时设为挂载点（如 /host）。
+    """
+
+    def __init__(self, server_id, hostname="localhost", root="/"):
+        super().__init__(server_id, hostname, username=None)
+        self.root = root
+        # 本地传输没有常驻代理，流式模式等同于逐周期读取
+        self.mode = "exec"
+        # 各数据源正在进行的读取: {数据源: concurrent.futures.Future}
+        self.reading = {}
+
+    async def connect_async(self):
+        self.connected = True
+        return True
+
+    async def disconnect_async(self):
+        self.connected = False
+
+    async def execute_command_async(self, command):
+        try:
+            process = await asyncio.create_subprocess_shell(command, stdout=asyncio.subprocess.PIPE,
+                                                            stderr=asyncio.subprocess.PIPE)
+            stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=10)
+            if stderr:
+                logger.error(f"命令执行错误 ({self.hostname}): {stderr.decode('utf-8', 'replace')}")
+                return None
+            return stdout.decode('utf-8')
+        except Exception as e:
+            logger.error(f"本地命令执行失败 ({self.hostname}): {e}")
+            return None
+
+    async def _probe_into(self, sources, futures):
+        started = time.perf_counter()
+        await asyncio.gather(*(self._read_into(name, command, futures) for name, command in sources.items()))
+        RECORDER.observe("exec", self.server_id, time.perf_counter() - started)
+
+    async def _read_into(self, name, command, futures):
+        output = None
+        previous = self.reading.get(name)
+        if previous is not None and not previous.done():
+            # 上次读取仍挂起（如 stale NFS 上的 statvfs），不再占用新的线程，本次视为失败
+            logger.warning(f"本地数据源 {name} 的上次读取尚未结束，跳过本次读取 ({self.hostname})")
+        else:
+            read = self.reading[name] = _local_executor().submit(agent.read_source, name, command, 10, self.root)
+            try:
+                output = await asyncio.wrap_future(read)
+            except Exception as e:
+                logger.error(f"读取本地数据源 {name} 失败: {e}")
+        future = futures.get(name)
+        if future and not future.done():
+            future.set_result(output)
+
+# 本地数据源读取使用独立的有界线程池，挂起的读取不会占满事件循环默认线程池（asyncssh 解析 DNS 等也使用它）
+LOCAL_READ_WORKERS = 4
+_local_read_pool = None
+
+def _local_executor():
+    global _local_read_pool
+    if _local_read_pool is None:
+        _local_read_pool = ThreadPoolExecutor(LOCAL_READ_WORKERS, thread_name_prefix="local-read")
+    return _local_read_pool
+
+# 所有指标通用的配置项，直接设置为指标属性而不传给构造函数
+_COMMON_METRIC_OPTIONS = ('timeout', 'interval')
+
+def is_local(server_config):
+    """transport: local，或未指定 transport 且主机名为 localhost 时使用本地传输"""
+    return server_config.get('transport', 'local' if server_config['hostname'] == 'localhost' else 'ssh') == 'local'
+
+def build_monitor(server_config, warn=logger.warning, pool=None):
+    """根据服务器配置构建 ServerMonitor 并注册配置中的监控指标"""
     server_id = server_config.get('id', server_config['hostname'])
-    logger.info(f"异步进程 {server_id} 启动，PID: {os.getpid()}")
-    monitor = ServerMonitor(
-        server_id=server_id,
-        hostname=server_config['hostname'],
-        username=server_config['username'],
-        password=server_config.get('password'),
-        key_filename=server_config.get('key_filename'),
-        port=server_config.get('port', 22)
-    )
+    if is_local(server_config):
+        monitor = LocalServerMonitor(server_id, server_config['hostname'], server_config.get('root', '/'))
+    else:
+        monitor = ServerMonitor(
+            server_id=server_id,
+            hostname=server_config['hostname'],
+            username=server_config['username'],
+            password=server_config.get('password'),
+            key_filename=server_config.get('key_filename'),
+            port=server_config.get('port', 22),
+            mode=server_config.get('mode', 'exec'),
+            pool=pool
+        )
+
+    for metric in build_metrics(server_config, warn):
+        monitor.register_metric(metric)
+    return monitor
 
+def build_metrics(server_config, warn=logger.warning):
+    """根据服务器配置中的 metrics 列表创建指标实例"""
+    metrics = []
     # Dynamically register metrics based on configuration
     for metric_config in server_config.get('metrics', []):
         metric_type = metric_config.get('type')
-        metric_class = WatcherRegister.get_registered(WatcherModuleType.METRIC, metric_type)
+        # module 声明第三方指标所在的模块，未声明时从内置指标和 entry point 中查找
+        metric_class = WatcherRegister.get_registered(WatcherModuleType.METRIC, metric_type, metric_config.get('module'))
         if metric_class:
-            monitor.register_metric(metric_class())
+            options = {k: v for k, v in metric_config.items() if k not in ('type', 'module') + _COMMON_METRIC_OPTIONS}
+            metric = metric_class(**options)
+            for option in _COMMON_METRIC_OPTIONS:
+                if option in metric_config:
+                    setattr(metric, option, metric_config[option])
+            metrics.append(metric)
+        else:
+            warn(f"未找到指定的监控指标类型: {metric_type}")
+    return metrics
+
+def _flatten(metric, value, data):
+    """把指标返回的 {子指标: 值} 展开为样本键 指标名_子指标，带标签的子指标展开为序列键"""
+    for sub_key, sub_value in value.items():
+        if isinstance(sub_key, tuple):
+            sub_key, labels = sub_key
+            data[series_key(f"{metric.name}_{sub_key}", labels)] = sub_value
         else:
-            logger.warning(f"未找到指定的监控指标类型: {metric_type}")
+            data[f"{metric.name}_{sub_key}"] = sub_value
+
+def _resolve_section(futures, name, lines):
+    future = futures.get(name)
+    if future and not future.done():
+        future.set_result("".join(lines))
+
+def _put_sample(data_queue, server_id, timestamp, metrics_data, missing=None):
+    if metrics_data:
+        sample = {
+            "server_id": server_id,
+            "status": "data",
+            "timestamp": timestamp,
+            **metrics_data
+        }
+        if missing:
+            # 部分指标超时或失败时仍发送其余指标，并标记缺失项
+            sample["missing"] = missing
+        data_queue.put(sample)
+        return True
+    if not missing:
+        # 没有失败的指标，只是速率类指标（如 CPU）首次采样还在建立基线，不是采集失败
+        data_queue.put({"server_id": server_id, "status": "warmup", "timestamp": timestamp,
+                        "message": "正在建立基线，下个周期开始有数据"})
+        return True
+    data_queue.put({"server_id": server_id, "status": "error", "message": "获取数据失败"})
+    return False
+
+def _report_no_metrics(monitor, data_queue):
+    # 配置中没有指标或指标类型都无法识别（包括热加载后删除了全部指标）时每个周期报告错误，任务继续运行等待配置修正
+    data_queue.put({"server_id": monitor.server_id, "status": "error", "message": "没有可采集的指标，请检查 metrics 配置"})
+
+async def _ensure_connected(monitor, data_queue):
+    """连接不可用时按熔断器的退避时间等待重连，期间不采集任何指标。
+    不可达期间只发送一次 down 事件，恢复后发送一次 up 事件"""
+    down = False
+    while not monitor.connected and not await monitor.connect_async():
+        breaker = monitor.pooled.breaker
+        if not down:
+            down = True
+            data_queue.put({"server_id": monitor.server_id, "status": "down",
+                            "message": f"主机不可达: {breaker.last_error or '连接失败'}"})
+        await asyncio.sleep(breaker.retry_in())
+    if down:
+        data_queue.put({"server_id": monitor.server_id, "status": "up"})
+
+def _apply_update(monitor, updates, phase):
+    """取出最新的配置更新 (服务器配置, 全局周期) 并原地应用，返回新的截止时间表；没有更新时返回 None"""
+    if not updates:
+        return None
+    server_config, interval = updates.pop()
+    monitor.reconfigure(server_config)
+    logger.info(f"{monitor.server_id} 的配置已更新")
+    return monitor.schedule(server_config.get('interval', interval), phase)
+
+async def _stream_monitor(monitor, schedule, data_queue, updates=None, phase=0.0):
+    """流式模式：消费远端常驻代理推送的数据帧。远端无法运行代理时返回 False，由调用方回退到逐周期执行。
+    代理按最短周期推送，每帧只计算按各自周期到期的指标。配置更新后在同一连接上重启代理"""
+    streamed = False
+    interval = schedule.base
+    while True:
+        await _ensure_connected(monitor, data_queue)
+        updated = None
+        frames = monitor.stream_frames(interval)
+        async for sections in frames:
+            streamed = True
+            updated = _apply_update(monitor, updates, phase)
+            if updated:
+                break
+            due = schedule.due(tolerance=interval / 2)
+            if not schedule.intervals:
+                _report_no_metrics(monitor, data_queue)
+                continue
+            if not due:
+                continue
+            metrics_data, missing = await monitor.collect_async(sections, due)
+            _put_sample(data_queue, monitor.server_id, datetime.now(), metrics_data, missing)
+        # 关闭远端代理进程，连接保持不变
+        await frames.aclose()
+        if updated:
+            # 周期或数据源可能已变化，按新配置立即重启代理
+            schedule = updated
+            interval = schedule.base
+            continue
+        if not streamed and monitor.stream_exit_status is not None:
+            logger.warning(f"{monitor.hostname} 无法运行采集代理 (退出码 {monitor.stream_exit_status})，回退到逐周期执行模式")
+            return False
+        # 连接已断开时启动代理会失败并把 connected 置为 False，下一轮由 _ensure_connected 按退避重连
+        await asyncio.sleep(interval)
+
+async def async_monitor_server(server_config, interval, data_queue, pool=None, phase=None, updates=None):
+    """监控单个服务器直到任务被取消。服务器配置中的 interval 优先于全局周期；
+    phase 为 [0, 1) 内的相位，用于把不同服务器的采集时刻错开，默认按服务器 id 哈希。
+    updates 为热加载使用的 deque，其中的 (服务器配置, 全局周期) 在下一个周期开始前原地生效"""
+    server_id = server_config.get('id', server_config['hostname'])
+    logger.info(f"监控任务 {server_id} 启动，PID: {os.getpid()}")
+    monitor = build_monitor(server_config, pool=pool)
+    phase = hash_phase(server_id) if phase is None else phase
+    schedule = monitor.schedule(server_config.get('interval', interval), phase)
+    # 每个周期的采集在独立的任务中运行，慢指标未返回时不阻塞下一个周期；
+    # 上一次采集仍未返回的指标在本周期跳过，不会重复堆积。在 try 之前创建，连接或流式模式期间被取消时 finally 同样可用
+    inflight = set()
+    collections = set()
+    clock = _SampleClock()
 
-    if not await monitor.connect_async():
-        data_queue.put({"server_id": server_id, "status": "error", "message": "连接失败"})
-        return
-    data_queue.put({"server_id": server_id, "status": "connected"})
     try:
+        await _ensure_connected(monitor, data_queue)
+        data_queue.put({"server_id": server_id, "status": "connected"})
+        if monitor.mode == "stream" and await _stream_monitor(monitor, schedule, data_queue, updates, phase):
+            return
         while True:
-            timestamp = datetime.now()
-            metrics_data = await monitor.get_metrics_data_async()
-            if metrics_data:
-                data = {
-                    "server_id": server_id,
-                    "status": "data",
-                    "timestamp": timestamp,
-                    **metrics_data
-                }
-                data_queue.put(data)
-            else:
-                data_queue.put({"server_id": server_id, "status": "error", "message": "获取数据失败"})
-                await monitor.connect_async()
-            await asyncio.sleep(interval)
+            await _ensure_connected(monitor, data_queue)
+            schedule = _apply_update(monitor, updates, phase) or schedule
+            # 按绝对截止时间触发，采集耗时不会累积成周期漂移
+            deadline, due = await schedule.wait()
+            if not schedule.intervals:
+                _report_no_metrics(monitor, data_queue)
+                continue
+            due = [metric for metric in due if metric not in inflight]
+            if not due:
+                continue
+            inflight.update(due)
+            task = asyncio.create_task(_collect_tick(monitor, deadline, due, schedule.base, data_queue,
+                                                     inflight, clock))
+            collections.add(task)
+            task.add_done_callback(collections.discard)
     except Exception as e:
         logger.error(f"监控服务器 {server_id} 时出错: {e}")
         data_queue.put({"server_id": server_id, "status": "error", "message": str(e)})
     finally:
+        for task in list(collections):
+            task.cancel()
+        monitor.stop_stream()
         await monitor.disconnect_async()
 
+class _SampleClock:
+    """同一服务器发出的样本时间戳单调递增。慢指标的样本在返回时才发出，使用返回时刻，
+    且不早于已发出的样本，看板缓冲区和存储中的时间序列保持有序"""
+
+    def __init__(self):
+        self.last = 0.0
+
+    def stamp(self, timestamp):
+        self.last = max(self.last, timestamp)
+        return datetime.fromtimestamp(self.last)
+
+async def _collect_tick(monitor, deadline, metrics, budget, data_queue, inflight, clock):
+    """执行一个周期的采集：快指标全部返回后立即发出样本，慢指标各自返回后单独发出"""
+    collected = False
+    first = True
+    try:
+        async for metrics_data, missing, done in monitor.collect_stages(metrics, budget):
+            inflight.difference_update(done)
+            if first:
+                RECORDER.observe("collect", monitor.server_id, time.time() - deadline)
+            timestamp = clock.stamp(deadline if first else time.time())
+            first = False
+            if metrics_data or (not collected and not inflight.intersection(metrics)):
+                # 连接层面的失败会把 monitor.connected 置为 False，下一轮先按退避重连
+                collected = _put_sample(data_queue, monitor.server_id, timestamp, metrics_data, missing) or collected
+            elif missing:
+                # 其他阶段已经或将要发出样本时，失败的指标仍单独报告，消费端据此不再显示它们的旧值
+                data_queue.put({"server_id": monitor.server_id, "status": "data", "timestamp": timestamp,
+                                "missing": missing})
+    finally:
+        inflight.difference_update(metrics)
+
 def monitor_server(server_config, interval, data_queue):
     """Legacy synchronous monitor_server function that wraps the async version"""
     server_id = server_config.get('id', server_config['hostname'])
@@ -0,0 +1,29 @@
+"""将多个监控指标声明的数据源合并成一次远端执行，并按分段解析输出"""
+
+from agent import SECTION_MARKER
+
+def collect_sources(metrics):
+    """合并所有指标声明的数据源，同名数据源只执行一次；慢指标的数据源排在最后"""
+    sources = {}
+    for metric in sorted(metrics, key=lambda m: m.slow):
+        for name, command in metric.sources.items():
+            sources.setdefault(name, command)
+    return sources
+
+def build_probe_script(sources):
+    """为每个数据源输出一个分段标记，随后是该数据源命令的输出"""
+    parts = []
+    for name, command in sources.items():
+        parts.append(f"echo '{SECTION_MARKER}{name}'; {command} 2>/dev/null")
+    return "; ".join(parts)
+
+def parse_probe_output(output):
+    sections = {}
+    current = None
+    for line in output.splitlines():
+        if line.startswith(SECTION_MARKER):
+            current = line[len(SECTION_MARKER):].strip()
+            sections[current] = []
+        elif current is not None:
+            sections[current].append(line)
+    return {name: "\n".join(lines) for name, lines in sections.items()}
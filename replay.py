@@ -0,0 +1,155 @@
+"""样本流的录制与回放，用于在没有真实服务器集群时对看板做可重复的负载测试。
+
+录制文件: MAGIC + <头部长度:u32> + 头部 JSON（服务器列表、周期，不含凭据）+ 传输格式的帧（见 transport.py），
+与采集端写入样本通道的字节流完全相同，每个值 25 字节，服务器和指标名称只出现一次。
+
+回放源 ReplaySource 提供与采集器相同的 drain() 接口，可以直接作为 ServerManager 的数据来源，
+按 1×、10× 等倍速或不等待（max）重放，并可把每台主机复制为 N 台合成更大的集群。
+"""
+import json
+import logging
+import struct
+import time
+from datetime import datetime
+from transport import SampleDecoder, SampleEncoder
+
+# 获取应用logger
+logger = logging.getLogger('server_watcher.replay')
+
+MAGIC = b"SWREC1\n"
+_LENGTH = struct.Struct("<I")
+_CHUNK = 1024 * 1024
+
+# 录制到头部的服务器字段（用于看板显示主机和指标名称），密码和密钥路径不写入录制文件
+SERVER_FIELDS = ('id', 'hostname', 'port', 'username', 'transport', 'interval', 'metrics')
+
+class SampleRecorder:
+    """把样本按传输格式追加写入录制文件，接口与样本通道的 put() 相同"""
+
+    def __init__(self, path, config):
+        self.path = path
+        self.encoder = SampleEncoder()
+        self.count = 0
+        header = {
+            "interval": config.get('interval', 5),
+            "servers": [{key: server[key] for key in SERVER_FIELDS if key in server}
+                        for server in config.get('servers') or []],
+            "started": time.time(),
+        }
+        raw = json.dumps(header, ensure_ascii=False).encode('utf-8')
+        self.file = open(path, 'wb')
+        self.file.write(MAGIC + _LENGTH.pack(len(raw)) + raw)
+        logger.info(f"开始录制样本到 {path}")
+
+    def put(self, sample):
+        # 自监控统计不属于样本流，不录制
+        if sample.get("status") == "stats":
+            return
+        self.file.write(self.encoder.encode(sample))
+        self.count += 1
+
+    def close(self):
+        self.file.close()
+        logger.info(f"录制结束，共 {self.count} 个样本: {self.path}")
+
+def read_header(f):
+    if f.read(len(MAGIC)) != MAGIC:
+        raise ValueError("不是有效的录制文件")
+    length, = _LENGTH.unpack(f.read(_LENGTH.size))
+    return json.loads(f.read(length).decode('utf-8'))
+
+def read_samples(path):
+    """依次产生录制文件中的样本，按块读取和解码，不会一次载入整个文件"""
+    with open(path, 'rb') as f:
+        read_header(f)
+        decoder = SampleDecoder()
+        while True:
+            chunk = f.read(_CHUNK)
+            if not chunk:
+                break
+            yield from decoder.feed(chunk)
+
+def parse_speed(speed):
+    """'max'、0 或 None 表示不等待，其余为倍速"""
+    if speed in (None, "max"):
+        return None
+    return float(speed) or None
+
+class ReplaySource:
+    """按录制时的时间间隔回放样本，时间戳平移到回放开始的时刻（倍速回放时按倍速压缩）。
+
+    clones 大于 1 时每台主机复制为 clones 台（id 为 原id#序号），样本内容相同；
+    speed 为 None 时不等待，每次 drain() 返回录制中一个周期的样本；loop 为 True 时播放完毕后从头继续。
+    """
+
+    def __init__(self, path, speed=1.0, clones=1, loop=False):
+        self.path = path
+        self.speed = parse_speed(speed)
+        self.clones = max(int(clones), 1)
+        self.loop = loop
+        with open(path, 'rb') as f:
+            header = read_header(f)
+        self.interval = header.get('interval', 5)
+        self.servers = {}
+        for server in header.get('servers', []):
+            server_id = server.get('id', server['hostname'])
+            for index in range(self.clones):
+                clone_id = self._clone_id(server_id, index)
+                self.servers[clone_id] = {**server, 'id': clone_id}
+        self.finished = False
+        self.start()
+
+    @staticmethod
+    def _clone_id(server_id, index):
+        return server_id if index == 0 else f"{server_id}#{index}"
+
+    def start(self):
+        """从头开始回放"""
+        self.samples = read_samples(self.path)
+        self.pending = None
+        self.first = self.last = None
+        self.offset = 0.0
+        self.started = time.time()
+        self.cursor = 0.0
+        self.finished = False
+
+    def _next(self):
+        if self.pending is None:
+            self.pending = next(self.samples, None)
+            if self.pending is None and self.loop and self.first is not None:
+                # 从头继续，录制时间整体后移，回放的时间戳保持递增
+                self.offset += self.last - self.first + self.interval
+                self.samples = read_samples(self.path)
+                self.pending = next(self.samples, None)
+        return self.pending
+
+    def drain(self):
+        """返回到当前回放时刻为止的全部样本，格式与采集器 drain() 相同"""
+        if self.speed is None:
+            self.cursor += self.interval
+            due = self.cursor
+        else:
+            due = (time.time() - self.started) * self.speed
+        batch = []
+        while True:
+            sample = self._next()
+            if sample is None:
+                self.finished = True
+                break
+            recorded = sample["timestamp"].timestamp()
+            if self.first is None:
+                self.first = recorded
+            elapsed = recorded - self.first + self.offset
+            if elapsed > due:
+                break
+            self.pending = None
+            self.last = recorded
+            # 回放时刻：不等待时保持录制的间隔，倍速时按倍速压缩
+            timestamp = datetime.fromtimestamp(self.started + (elapsed if self.speed is None else elapsed / self.speed))
+            for index in range(self.clones):
+                batch.append({**sample, "server_id": self._clone_id(sample["server_id"], index),
+                              "timestamp": timestamp})
+        return batch
+
+    def close(self):
+        self.samples.close()
@@ -0,0 +1,67 @@
+"""按绝对截止时间调度采集：周期不随采集耗时漂移，错过的截止时间直接跳过，
+不同服务器按相位错开，避免所有主机在同一时刻集中采集"""
+import asyncio
+import math
+import time
+import zlib
+
+# 黄金分割比的小数部分：第 n 个服务器的相位取 n * GOLDEN_RATIO 的小数部分，任意数量的服务器都能在周期内均匀分布
+GOLDEN_RATIO = (math.sqrt(5) - 1) / 2
+
+def golden_phase(index):
+    """第 index 个服务器的相位，取值 [0, 1)"""
+    return (index * GOLDEN_RATIO) % 1.0
+
+def hash_phase(key):
+    """没有序号时按名称哈希得到稳定的相位，取值 [0, 1)"""
+    return zlib.crc32(str(key).encode('utf-8')) / 2 ** 32
+
+class MetricSchedule:
+    """一个服务器上各指标的截止时间表。
+
+    intervals 为 {指标: 周期秒数}。所有截止时间都是 offset + k * 周期 形式的绝对时间，
+    offset 由相位和最短周期决定，因此周期互为整数倍的指标（如 CPU 1 秒、磁盘 60 秒）会在同一时刻到期，
+    共用一次远端执行。没有任何指标时按 default（服务器周期）空转，每个周期返回空的到期列表。
+    """
+
+    def __init__(self, intervals, phase=0.0, clock=time.time, default=None):
+        self.intervals = dict(intervals)
+        self.clock = clock
+        self.base = min(self.intervals.values()) if self.intervals else default
+        self.offset = phase * self.base
+        now = clock()
+        self.deadlines = {name: self._align(now, interval) for name, interval in self.intervals.items()}
+        self.skipped = 0
+
+    def _align(self, now, interval):
+        """不早于 now 的第一个截止时间"""
+        return now + (self.offset - now) % interval
+
+    def next_deadline(self):
+        if not self.deadlines:
+            return self._align(self.clock(), self.base)
+        return min(self.deadlines.values())
+
+    def due(self, now=None, tolerance=0.0):
+        """返回 now（允许提前 tolerance 秒）已到期的指标列表，并把它们推进到下一个截止时间。
+        采集耗时超过周期时跳过错过的截止时间，不会补采"""
+        now = self.clock() if now is None else now
+        due = []
+        for name, deadline in self.deadlines.items():
+            if deadline > now + tolerance:
+                continue
+            interval = self.intervals[name]
+            missed = max(0, math.floor((now - deadline) / interval))
+            self.skipped += missed
+            self.deadlines[name] = deadline + (missed + 1) * interval
+            due.append(name)
+        return due
+
+    async def wait(self):
+        """等待到下一个截止时间，返回 (截止时间, 到期的指标列表)"""
+        deadline = self.next_deadline()
+        delay = deadline - self.clock()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        # 事件循环的计时器可能比墙上时钟略早唤醒，至少按截止时间本身判断到期
+        return deadline, self.due(max(self.clock(), deadline))
@@ -0,0 +1,85 @@
+"""带标签的序列键：指标名{标签="值",...}，与 Prometheus 文本格式一致，如 net_rx_bytes{iface="eth0"}。
+
+序列在样本中首次出现时生成键并驻留（sys.intern），之后的样本都引用同一个字符串对象；
+传输时 SampleEncoder 把它映射为数字 id，本地存储的 series 表中也只保存一次，
+每台主机上千条序列时标签字符串不会在每个样本中重复。
+"""
+import sys
+
+# 缓存条目上限，进程号等标签不断变化时清空重建，避免缓存无限增长
+_CACHE_LIMIT = 100000
+
+_keys = {}
+_parsed = {}
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def series_key(name, labels=()):
+    """labels 为 ((标签名, 值), ...)，没有标签时返回 name 本身"""
+    if not labels:
+        return name
+    cache_key = (name, labels)
+    key = _keys.get(cache_key)
+    if key is None:
+        if len(_keys) > _CACHE_LIMIT:
+            _keys.clear()
+        body = ",".join(f'{label}="{_escape(value)}"' for label, value in labels)
+        key = _keys[cache_key] = sys.intern(f"{name}{{{body}}}")
+    return key
+
+def parse_series_key(key):
+    """返回 (指标名, {标签名: 值})"""
+    parsed = _parsed.get(key)
+    if parsed is not None:
+        return parsed
+    name, brace, body = key.partition("{")
+    labels = {}
+    if brace:
+        body = body[:-1]
+        i = 0
+        while i < len(body):
+            eq = body.index('=', i)
+            label = body[i:eq]
+            i = eq + 2
+            chars = []
+            while body[i] != '"':
+                if body[i] == "\\":
+                    i += 1
+                    chars.append("\n" if body[i] == "n" else body[i])
+                else:
+                    chars.append(body[i])
+                i += 1
+            labels[label] = "".join(chars)
+            i += 2
+    if len(_parsed) > _CACHE_LIMIT:
+        _parsed.clear()
+    parsed = _parsed[key] = (name, labels)
+    return parsed
+
+def base_name(key):
+    """序列键中的指标名部分"""
+    return key.partition("{")[0]
+
+def is_labeled(key):
+    return "{" in key
+
+def label_text(key):
+    """标签值的简短显示形式，如 eth0 或 1234/nginx"""
+    return "/".join(parse_series_key(key)[1].values())
+
+def merge_latest(latest, timestamp, values, missing=None):
+    """把一次样本合并到 latest {序列键: (时间戳, 值)}。按各自周期采集时每个样本只包含到期的指标，
+    本次没有采集的指标保留上一次的值；本次采集了的指标中不再出现的带标签序列（如已退出的进程）被删除。
+    missing 为本次采集失败的指标名（如 disk），它们的所有序列被删除，不再把旧值当作最新值"""
+    collected = {base_name(key) for key in values if "{" in key}
+    if collected:
+        for key in [key for key in latest if "{" in key and key not in values and base_name(key) in collected]:
+            del latest[key]
+    if missing:
+        prefixes = tuple(f"{name}_" for name in missing)
+        for key in [key for key in latest if key.startswith(prefixes) and key not in values]:
+            del latest[key]
+    for key, value in values.items():
+        if value == value:
+            latest[key] = (timestamp, value)
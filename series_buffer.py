@@ -0,0 +1,92 @@
+import time
+import numpy as np
+from series import merge_latest
+
+class SeriesRingBuffer:
+    """单个服务器的列式环形缓冲区：一个时间戳列（epoch 秒）和每个指标一个 float64 列。
+
+    每个值同时写入 i 和 i + capacity 两个位置，最近 n 个样本始终是一段连续内存，
+    因此 append 为 O(1)，读取任意窗口都是零拷贝视图。
+    """
+
+    def __init__(self, capacity=3600):
+        self.capacity = capacity
+        self.timestamps = np.full(2 * capacity, np.nan)
+        self.columns = {}
+        self.head = 0
+        self.count = 0
+        self.version = 0
+        self.last_missing = []
+        # 每列最后一个非 NaN 的值: {指标: (时间戳, 值)}
+        self.last = {}
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def append(self, timestamp, values, missing=None):
+        if not values:
+            # 只报告缺失指标的样本不占用缓冲区的一行
+            merge_latest(self.last, timestamp, values, missing)
+            self.version += 1
+            self.last_missing = missing or []
+            return
+        i = self.head
+        j = i + self.capacity
+        self.timestamps[i] = self.timestamps[j] = timestamp
+        for key, column in self.columns.items():
+            column[i] = column[j] = values.get(key, np.nan)
+        for key in values.keys() - self.columns.keys():
+            column = np.full(2 * self.capacity, np.nan)
+            column[i] = column[j] = values[key]
+            self.columns[key] = column
+        self.head = (i + 1) % self.capacity
+        self.count += 1
+        if self.count % self.capacity == 0:
+            self.prune()
+        merge_latest(self.last, timestamp, values, missing)
+        self.version += 1
+        self.last_missing = missing or []
+
+    def prune(self):
+        """删除整个窗口内都没有值的列。带标签的序列（如 Top N 进程）会不断出现和消失，
+        每写满一轮检查一次，均摊到每次 append 为 O(列数)"""
+        full = self._slice()
+        for key in [key for key, column in self.columns.items() if np.isnan(column[full]).all()]:
+            del self.columns[key]
+            self.last.pop(key, None)
+
+    def _slice(self, n=None):
+        n = len(self) if n is None else min(n, len(self))
+        end = self.head + self.capacity
+        return slice(end - n, end)
+
+    def timestamps_view(self, n=None):
+        return self.timestamps[self._slice(n)]
+
+    def view(self, key, n=None):
+        column = self.columns.get(key)
+        if column is None:
+            return None
+        return column[self._slice(n)]
+
+    def window(self, start=None, end=None):
+        """返回 [start, end] 时间范围内的 (时间戳, {指标: 值}) 零拷贝视图"""
+        full = self._slice()
+        timestamps = self.timestamps[full]
+        lo = 0 if start is None else int(np.searchsorted(timestamps, start, side='left'))
+        hi = len(timestamps) if end is None else int(np.searchsorted(timestamps, end, side='right'))
+        window = slice(full.start + lo, full.start + hi)
+        return self.timestamps[window], {key: column[window] for key, column in self.columns.items()}
+
+    def latest(self):
+        """返回 (最近一次样本的时间戳, {指标: 最新值})。按各自周期采集的指标取其最后一次采集到的值，
+        不会因为最近一次样本中没有该指标而缺失"""
+        if not self.count:
+            return None, {}
+        index = self.head + self.capacity - 1
+        return self.timestamps[index], {key: value for key, (_, value) in self.last.items()}
+
+def to_datetimes(timestamps):
+    """把 epoch 秒转换为本地时间的 datetime64，用于绘图"""
+    offset = time.localtime().tm_gmtoff
+    return ((timestamps + offset) * 1000).astype('datetime64[ms]')
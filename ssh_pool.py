@@ -0,0 +1,216 @@
+"""SSH 连接池：配置中指向同一台主机、同一用户和凭据的多个服务器条目共用一个 asyncssh 连接，
+各自的探测命令作为独立通道在该连接上复用"""
+import asyncio
+import logging
+import os
+import time
+import asyncssh
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from instrumentation import RECORDER
+
+# 获取应用logger
+logger = logging.getLogger('server_watcher.ssh_pool')
+
+# 单次连接尝试（含握手）的超时秒数
+CONNECT_TIMEOUT = 10
+
+# OpenSSH 的 MaxSessions 默认为 10，单个连接上同时打开的通道数不超过它
+DEFAULT_MAX_CHANNELS = 10
+
+# 同时进行的握手数，低于 sshd MaxStartups 的默认起始值 10，经跳板机连接时不会被随机拒绝
+DEFAULT_HANDSHAKE_CONCURRENCY = 8
+
+# 每秒最多发起的握手数，大规模启动时把密钥交换的 CPU 开销摊开
+DEFAULT_HANDSHAKE_RATE = 20
+
+# 已解析的私钥: {(路径, 修改时间): SSHKey}，同一个密钥文件只读取和解析一次
+_client_keys = {}
+
+def load_client_key(path):
+    """读取并缓存私钥，文件被替换（修改时间变化）后重新读取"""
+    path = os.path.expanduser(path)
+    cache_key = (path, os.path.getmtime(path))
+    key = _client_keys.get(cache_key)
+    if key is None:
+        key = _client_keys[cache_key] = asyncssh.read_private_key(path)
+    return key
+
+def pool_options(config):
+    """从配置文件中读取连接池参数"""
+    return {
+        "max_channels": config.get('ssh_max_channels', DEFAULT_MAX_CHANNELS),
+        "handshake_concurrency": config.get('ssh_handshake_concurrency', DEFAULT_HANDSHAKE_CONCURRENCY),
+        "handshake_rate": config.get('ssh_handshake_rate', DEFAULT_HANDSHAKE_RATE),
+    }
+
+def connection_key(server_config):
+    """连接池的键：(主机, 端口, 用户名, 密码, 密钥文件)"""
+    return (server_config['hostname'], server_config.get('port', 22), server_config['username'],
+            server_config.get('password'), server_config.get('key_filename'))
+
+def shard_key(server_config):
+    """分片使用的键，不含凭据；共享连接的服务器总是落在同一个分片"""
+    return f"{server_config.get('username', '')}@{server_config['hostname']}:{server_config.get('port', 22)}"
+
+class PooledConnection:
+    """连接池中的一个连接，记录共享它的监控数，并用信号量限制同时打开的通道数。
+    每个连接带有一个熔断器，主机不可达时共享它的所有监控都停止连接尝试，直到退避结束"""
+
+    def __init__(self, key, pool):
+        self.key = key
+        self.pool = pool
+        self.conn = None
+        self.refcount = 0
+        self.channels = asyncio.Semaphore(pool.max_channels)
+        self.lock = asyncio.Lock()
+        self.breaker = CircuitBreaker()
+        self.attempted = False
+
+    @property
+    def label(self):
+        hostname, port, username = self.key[:3]
+        return f"{username}@{hostname}:{port}"
+
+    async def open(self, stale=None):
+        """返回可用的连接。尚未连接或当前连接就是调用方认为已失效的 stale 时重新连接；
+        若其他共享者已经完成重连，则直接复用新连接，避免重复握手。
+        熔断期间不发起连接，直接抛出 CircuitOpenError"""
+        async with self.lock:
+            if self.conn is not None and self.conn is not stale:
+                return self.conn
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+            if not self.breaker.allow():
+                raise CircuitOpenError(self.breaker.retry_in())
+            hostname, port, username, password, key_filename = self.key
+            try:
+                # 握手受连接池的并发数和速率限制，握手耗时不含排队等待
+                async with self.pool.throttle:
+                    with RECORDER.time("connect", self.label):
+                        if key_filename:
+                            self.conn = await asyncssh.connect(host=hostname, port=port, username=username,
+                                                               client_keys=[load_client_key(key_filename)],
+                                                               known_hosts=None, connect_timeout=CONNECT_TIMEOUT)
+                        else:
+                            self.conn = await asyncssh.connect(host=hostname, port=port, username=username,
+                                                               password=password, known_hosts=None,
+                                                               connect_timeout=CONNECT_TIMEOUT)
+            except asyncio.CancelledError:
+                self.breaker.abort()
+                raise
+            except Exception as e:
+                delay = self.breaker.record_failure(e)
+                # 只在第一次失败时记录错误，之后的半开探测失败只记调试日志
+                log = logger.error if self.breaker.failures == 1 else logger.debug
+                log(f"连接 {self.label} 失败: {e}，{delay:.0f} 秒后重试")
+                self._first_attempt(False)
+                raise
+            if self.breaker.record_success():
+                logger.info(f"{self.label} 已恢复连接")
+            self._first_attempt(True)
+            return self.conn
+
+    def _first_attempt(self, success):
+        if not self.attempted:
+            self.attempted = True
+            self.pool.progress.record(success)
+
+    async def close(self):
+        conn, self.conn = self.conn, None
+        if conn:
+            conn.close()
+            await conn.wait_closed()
+
+class HandshakeThrottle:
+    """限制同时进行的握手数，并让相邻两次握手的开始时间至少间隔 1/rate 秒"""
+
+    def __init__(self, concurrency=DEFAULT_HANDSHAKE_CONCURRENCY, rate=DEFAULT_HANDSHAKE_RATE):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.spacing = 1.0 / rate if rate else 0.0
+        self.next_slot = 0.0
+
+    async def __aenter__(self):
+        await self.semaphore.acquire()
+        try:
+            now = asyncio.get_running_loop().time()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.spacing
+            if slot > now:
+                await asyncio.sleep(slot - now)
+        except BaseException:
+            self.semaphore.release()
+            raise
+
+    async def __aexit__(self, *exc):
+        self.semaphore.release()
+
+class WarmupProgress:
+    """统计启动阶段各连接的首次握手结果，按进度输出日志并估算剩余时间"""
+
+    def __init__(self, report_interval=5.0):
+        self.total = 0
+        self.connected = 0
+        self.failed = 0
+        self.started = None
+        self.report_interval = report_interval
+        self.last_report = 0.0
+
+    @property
+    def done(self):
+        return self.connected + self.failed
+
+    def add(self):
+        if self.started is None or self.done >= self.total:
+            # 新一轮预热（首次启动或全部完成后又加入了新主机）
+            self.started = self.last_report = time.monotonic()
+        self.total += 1
+
+    def record(self, success):
+        if success:
+            self.connected += 1
+        else:
+            self.failed += 1
+        now = time.monotonic()
+        if self.done < self.total and now - self.last_report < self.report_interval:
+            return
+        self.last_report = now
+        elapsed = now - self.started
+        if self.done >= self.total:
+            logger.info(f"SSH 连接预热完成: {self.connected} 个成功，{self.failed} 个失败，用时 {elapsed:.1f} 秒")
+        else:
+            remaining = elapsed / self.done * (self.total - self.done)
+            logger.info(f"SSH 连接预热进度: {self.done}/{self.total}，已用 {elapsed:.1f} 秒，预计还需 {remaining:.0f} 秒")
+
+class ConnectionPool:
+    """按连接键引用计数的连接池。只能在同一个事件循环中使用。
+    所有连接的握手经过同一个 HandshakeThrottle，大规模启动时按设定的并发数和速率逐步建立连接"""
+
+    def __init__(self, max_channels=DEFAULT_MAX_CHANNELS, handshake_concurrency=DEFAULT_HANDSHAKE_CONCURRENCY,
+                 handshake_rate=DEFAULT_HANDSHAKE_RATE):
+        self.max_channels = max_channels
+        self.throttle = HandshakeThrottle(handshake_concurrency, handshake_rate)
+        self.progress = WarmupProgress()
+        self.entries = {}
+
+    def acquire(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = self.entries[key] = PooledConnection(key, self)
+            self.progress.add()
+        entry.refcount += 1
+        if entry.refcount > 1:
+            logger.info(f"复用到 {entry.label} 的 SSH 连接，共享数: {entry.refcount}")
+        return entry
+
+    async def release(self, entry):
+        entry.refcount -= 1
+        if entry.refcount > 0:
+            return
+        # 最后一个使用者释放后关闭连接
+        if self.entries.get(entry.key) is entry:
+            del self.entries[entry.key]
+        if not entry.attempted:
+            # 尚未握手就被移除的连接不再计入预热进度
+            self.progress.total -= 1
+        await entry.close()
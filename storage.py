@@ -0,0 +1,238 @@
+import logging
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+import numpy as np
+
+# 获取应用logger
+logger = logging.getLogger('server_watcher.storage')
+
+# 汇总层级: 名称 -> 桶宽（秒）
+ROLLUPS = {"1m": 60, "10m": 600, "1h": 3600}
+
+DEFAULT_RETENTION = {"raw": "2d", "1m": "14d", "10m": "90d", "1h": "365d"}
+
+_DURATION_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+def parse_duration(value):
+    """把 90、'30m'、'12h'、'7d' 之类的配置值转换为秒"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([smhdw]?)\s*", str(value))
+    if not match:
+        raise ValueError(f"无法解析的时长: {value}")
+    return float(match.group(1)) * _DURATION_UNITS[match.group(2) or "s"]
+
+_SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS series (id INTEGER PRIMARY KEY, server_id TEXT NOT NULL, metric TEXT NOT NULL, "
+    "UNIQUE (server_id, metric))",
+    "CREATE TABLE IF NOT EXISTS samples (series_id INTEGER NOT NULL, ts REAL NOT NULL, value REAL, "
+    "PRIMARY KEY (series_id, ts)) WITHOUT ROWID",
+] + [
+    f"CREATE TABLE IF NOT EXISTS rollup_{name} (series_id INTEGER NOT NULL, bucket INTEGER NOT NULL, "
+    f"min REAL, max REAL, sum REAL, count INTEGER, PRIMARY KEY (series_id, bucket)) WITHOUT ROWID"
+    for name in ROLLUPS
+]
+
+class SampleStore:
+    """基于 SQLite (WAL) 的本地样本存储。
+
+    append 只把样本放入内存队列，由后台线程按批写入原始样本，并增量更新
+    1m/10m/1h 三个层级的 min/max/avg 汇总；长时间范围的查询直接读汇总表，
+    不扫描原始样本。各层级的保留时长可在 servers.yaml 的 storage.retention 中配置。
+    """
+
+    def __init__(self, path, retention=None, batch_size=1000, flush_interval=1.0):
+        self.path = path
+        self.retention = {tier: parse_duration(value)
+                          for tier, value in {**DEFAULT_RETENTION, **(retention or {})}.items()}
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue()
+        self.series_ids = {}
+        self.thread = None
+        self.last_retention_run = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            for statement in _SCHEMA:
+                conn.execute(statement)
+
+    @classmethod
+    def from_config(cls, storage_config):
+        if not storage_config:
+            return None
+        return cls(storage_config.get('path', os.path.join('data', 'samples.db')),
+                   storage_config.get('retention'))
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self.thread = threading.Thread(target=self._writer_loop, name="sample-store-writer", daemon=True)
+        self.thread.start()
+
+    def append(self, server_id, timestamp, values):
+        """非阻塞：仅入队，写盘由后台线程完成"""
+        self.queue.put((server_id, timestamp, values))
+
+    def close(self, timeout=5):
+        if self.thread and self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join(timeout=timeout)
+
+    def _writer_loop(self):
+        conn = self._connect()
+        running = True
+        while running:
+            batch = []
+            try:
+                item = self.queue.get(timeout=self.flush_interval)
+                while True:
+                    if item is None:
+                        running = False
+                        break
+                    batch.append(item)
+                    if len(batch) >= self.batch_size:
+                        break
+                    item = self.queue.get_nowait()
+            except queue.Empty:
+                pass
+            try:
+                if batch:
+                    self._write_batch(conn, batch)
+                if time.time() - self.last_retention_run > 600:
+                    self._apply_retention(conn)
+            except Exception as e:
+                logger.error(f"写入样本存储失败: {e}")
+        conn.close()
+
+    def _series_id(self, conn, server_id, metric):
+        key = (server_id, metric)
+        series_id = self.series_ids.get(key)
+        if series_id is None:
+            conn.execute("INSERT OR IGNORE INTO series (server_id, metric) VALUES (?, ?)", key)
+            series_id = conn.execute("SELECT id FROM series WHERE server_id = ? AND metric = ?", key).fetchone()[0]
+            self.series_ids[key] = series_id
+        return series_id
+
+    def _write_batch(self, conn, batch):
+        rows = []
+        rollups = {name: {} for name in ROLLUPS}
+        with conn:
+            for server_id, timestamp, values in batch:
+                for metric, value in values.items():
+                    if value is None or value != value:
+                        continue
+                    series_id = self._series_id(conn, server_id, metric)
+                    rows.append((series_id, timestamp, value))
+                    # 先在内存中按桶预聚合，每个桶每批只更新一次
+                    for name, width in ROLLUPS.items():
+                        key = (series_id, int(timestamp // width) * width)
+                        agg = rollups[name].get(key)
+                        if agg is None:
+                            rollups[name][key] = [value, value, value, 1]
+                        else:
+                            agg[0] = min(agg[0], value)
+                            agg[1] = max(agg[1], value)
+                            agg[2] += value
+                            agg[3] += 1
+            conn.executemany("INSERT OR REPLACE INTO samples (series_id, ts, value) VALUES (?, ?, ?)", rows)
+            for name, buckets in rollups.items():
+                conn.executemany(
+                    f"INSERT INTO rollup_{name} (series_id, bucket, min, max, sum, count) VALUES (?, ?, ?, ?, ?, ?) "
+                    f"ON CONFLICT (series_id, bucket) DO UPDATE SET min = min(min, excluded.min), "
+                    f"max = max(max, excluded.max), sum = sum + excluded.sum, count = count + excluded.count",
+                    [(series_id, bucket, *agg) for (series_id, bucket), agg in buckets.items()]
+                )
+
+    def _apply_retention(self, conn):
+        now = time.time()
+        with conn:
+            conn.execute("DELETE FROM samples WHERE ts < ?", (now - self.retention["raw"],))
+            for name in ROLLUPS:
+                conn.execute(f"DELETE FROM rollup_{name} WHERE bucket < ?", (now - self.retention[name],))
+            # 所有层级都已没有数据的序列（如早已退出的进程）从 series 表中删除
+            unused = " AND ".join(f"NOT EXISTS (SELECT 1 FROM {table} WHERE series_id = series.id)"
+                                  for table in ["samples"] + [f"rollup_{name}" for name in ROLLUPS])
+            if conn.execute(f"DELETE FROM series WHERE {unused}").rowcount:
+                self.series_ids.clear()
+        self.last_retention_run = now
+
+    def choose_resolution(self, start, end, max_points=2000):
+        """选择满足点数预算且仍在保留期内的最细层级，None 表示原始样本"""
+        span = max(end - start, 1)
+        oldest = time.time() - start
+        if span <= max_points and oldest <= self.retention["raw"]:
+            return None
+        for name, width in ROLLUPS.items():
+            if span / width <= max_points and oldest <= self.retention[name]:
+                return name
+        return list(ROLLUPS)[-1]
+
+    def query(self, metric, start, end, server_ids=None, resolution="auto", max_points=2000):
+        """查询时间范围内的数据，返回 {server_id: {"timestamp", "avg", "min", "max"}}，值为 numpy 数组。
+        原始样本的 min/max 与 avg 相同"""
+        if resolution == "auto":
+            resolution = self.choose_resolution(start, end, max_points)
+        if resolution is None:
+            sql = ("SELECT s.server_id, p.ts, p.value, p.value, p.value FROM samples p "
+                   "JOIN series s ON s.id = p.series_id WHERE s.metric = ? AND p.ts BETWEEN ? AND ?")
+        else:
+            sql = (f"SELECT s.server_id, r.bucket, r.sum / r.count, r.min, r.max FROM rollup_{resolution} r "
+                   f"JOIN series s ON s.id = r.series_id WHERE s.metric = ? AND r.bucket BETWEEN ? AND ?")
+        if resolution is not None:
+            width = ROLLUPS[resolution]
+            start = start // width * width
+        params = [metric, start, end]
+        if server_ids:
+            sql += f" AND s.server_id IN ({', '.join('?' * len(server_ids))})"
+            params.extend(server_ids)
+        sql += " ORDER BY 1, 2"
+        conn = self._connect()
+        try:
+            rows = conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+        result = {}
+        grouped = {}
+        for row in rows:
+            grouped.setdefault(row[0], []).append(row[1:])
+        for server_id, points in grouped.items():
+            array = np.array(points, dtype=float)
+            result[server_id] = {"timestamp": array[:, 0], "avg": array[:, 1], "min": array[:, 2], "max": array[:, 3]}
+        return result
+
+    def metrics(self):
+        """存储中出现过的全部序列键"""
+        conn = self._connect()
+        try:
+            return [row[0] for row in conn.execute("SELECT DISTINCT metric FROM series ORDER BY metric")]
+        finally:
+            conn.close()
+
+    def recent(self, server_id, since):
+        """读取某个服务器 since 之后的原始样本，返回按时间排序的 [(timestamp, {metric: value})]"""
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT p.ts, s.metric, p.value FROM samples p JOIN series s ON s.id = p.series_id "
+                "WHERE s.server_id = ? AND p.ts >= ? ORDER BY p.ts", (server_id, since)
+            ).fetchall()
+        finally:
+            conn.close()
+        samples = []
+        for ts, metric, value in rows:
+            if not samples or samples[-1][0] != ts:
+                samples.append((ts, {}))
+            samples[-1][1][metric] = value
+        return samples
@@ -0,0 +1,27 @@
+import agent
+from metrics.disk_metric import DiskMetric
+
+
+def test_statvfs_reports_host_root_as_slash(tmp_path):
+    output = agent.read_source("statvfs", "", root=str(tmp_path))
+    assert output.split()[0] == "/"
+
+
+def test_disk_usage_under_mounted_root_is_unlabeled(tmp_path):
+    metric = DiskMetric()
+    sections = {name: agent.read_source(name, command, root=str(tmp_path)) for name, command in metric.sources.items()}
+    assert "usage" in metric.parse(None, sections)
+
+
+def test_hung_source_does_not_delay_frame():
+    import time
+
+    sources = {"slow": "sleep 1; echo slow", "fast": "echo fast"}
+    started = time.monotonic()
+    frame = agent.render_frame(sources, timeout=5, deadline=0.2)
+    assert time.monotonic() - started < 0.8
+    assert f"{agent.SECTION_MARKER}fast\nfast\n" in frame
+    assert f"{agent.SECTION_MARKER}slow\n\n" in frame
+    # 慢数据源读取完成后在之后的帧中输出，期间不会重复启动
+    time.sleep(1.2)
+    assert f"{agent.SECTION_MARKER}slow\nslow\n" in agent.render_frame(sources, timeout=5, deadline=0.2)
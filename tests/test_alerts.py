@@ -0,0 +1,69 @@
+import pytest
+
+from alerts import FIRING, RESOLVED, AlertEngine, AlertRule, RollingWindow
+
+
+def test_rolling_window_aggregates():
+    window = RollingWindow(60)
+    for t, value in enumerate([3.0, 1.0, 2.0]):
+        window.add(1000.0 + t, value)
+    assert window.aggregate("avg") == pytest.approx(2.0)
+    assert window.aggregate("min") == 1.0
+    assert window.aggregate("max") == 3.0
+    assert window.aggregate("last") == 2.0
+
+
+def test_rolling_window_evicts_old_panes_and_recomputes_extremes():
+    window = RollingWindow(60, panes=6)
+    window.add(1000.0, 100.0)
+    window.add(1030.0, 5.0)
+    window.add(1065.0, 7.0)
+    assert window.n == 2
+    assert window.aggregate("max") == 7.0
+    assert window.aggregate("avg") == pytest.approx(6.0)
+    window.add(1200.0, 1.0)
+    assert window.n == 1
+    assert (window.aggregate("min"), window.aggregate("max")) == (1.0, 1.0)
+
+
+def test_seconds_until_follows_trend_direction():
+    rising = RollingWindow(3600)
+    falling = RollingWindow(3600)
+    for t in range(10):
+        rising.add(1000.0 + t * 10, 50.0 + t)
+        falling.add(1000.0 + t * 10, 50.0 - t)
+    assert rising.seconds_until(100.0) == pytest.approx(410.0)
+    assert rising.seconds_until(10.0, rising=False) is None
+    assert falling.seconds_until(10.0, rising=False) == pytest.approx(310.0)
+    assert falling.seconds_until(100.0) is None
+    assert falling.seconds_until(45.0, rising=False) == 0.0
+
+
+def test_threshold_rule_fires_after_hold_and_resolves():
+    engine = AlertEngine([AlertRule("hot", "cpu_usage", threshold=90, hold=10)])
+    engine.observe("a", 0.0, {"cpu_usage": 95.0})
+    assert engine.events == []
+    engine.observe("a", 10.0, {"cpu_usage": 95.0})
+    engine.observe("a", 20.0, {"cpu_usage": 50.0})
+    assert [event["status"] for event in engine.flush()] == [FIRING, RESOLVED]
+
+
+def test_downward_predict_rule_fires():
+    rule = AlertRule("low-memory", "memory_available", threshold=100, op="<", predict="1h", window="1h")
+    engine = AlertEngine([rule])
+    for t in range(10):
+        engine.observe("a", 1000.0 + t * 60, {"memory_available": 1000.0 - t * 60})
+    assert engine.active
+    assert "降至" in engine.flush()[0]["message"]
+
+
+def test_labeled_series_state_expires_and_resolves():
+    import alerts
+
+    engine = AlertEngine([AlertRule("proc", "proc_cpu", threshold=1)])
+    engine.observe("a", 0.0, {'proc_cpu{pid="1"}': 5.0})
+    assert engine.active
+    for t in range(10, alerts.SERIES_EXPIRE * 2, 10):
+        engine.observe("a", float(t), {'proc_cpu{pid="2"}': 0.0})
+    assert not engine.active
+    assert list(engine.states) == [("proc", "a", 'proc_cpu{pid="2"}')]
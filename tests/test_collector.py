@@ -0,0 +1,40 @@
+import asyncio
+import time
+
+import collector
+from collector import CollectorEngine
+
+
+async def fake_monitor(server_config, interval, data_queue, pool=None, phase=None, updates=None):
+    if server_config.get("broken"):
+        raise RuntimeError("broken config")
+    data_queue.put({"server_id": server_config["id"], "status": "connected"})
+    await asyncio.Event().wait()
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_update_restarts_dead_task_and_remove_cleans_up(monkeypatch):
+    monkeypatch.setattr(collector, "async_monitor_server", fake_monitor)
+    engine = CollectorEngine(interval=1)
+    try:
+        engine.add_server({"id": "a", "hostname": "a", "broken": True})
+        wait_for(lambda: "a" in engine.phases and not engine.is_running("a") and engine.updates.get("a") is not None)
+        engine.update_server({"id": "a", "hostname": "a"})
+        wait_for(lambda: engine.is_running("a"))
+
+        engine.add_server({"id": "b", "hostname": "b"}, start=False)
+        engine.update_server({"id": "b", "hostname": "b", "interval": 2})
+        time.sleep(0.1)
+        assert not engine.is_running("b")
+
+        engine.remove_server("a")
+        wait_for(lambda: not engine.is_running("a"))
+        assert "a" not in engine.phases and "a" not in engine.updates
+    finally:
+        engine.shutdown()
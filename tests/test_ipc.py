@@ -0,0 +1,61 @@
+import socket
+import threading
+import time
+
+from ipc import SamplePublisher, SampleSubscriber
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_subscriber_reconnects_after_corrupt_frame(tmp_path):
+    path = str(tmp_path / "collector.sock")
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen()
+
+    def serve():
+        conn, _ = server.accept()
+        conn.sendall(b"X garbage")
+        conn.close()
+        server.close()
+        publisher = SamplePublisher(path)
+        publisher.start()
+        wait_for(lambda: publisher.subscribers)
+        publisher.publish({"server_id": "a", "status": "data", "timestamp": 1.0, "cpu_usage": 5.0})
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    subscriber = SampleSubscriber(path, retry_interval=0.05)
+    subscriber.start()
+    try:
+        samples = []
+        wait_for(lambda: samples.extend(subscriber.drain()) or samples)
+        assert samples[0]["cpu_usage"] == 5.0
+        assert subscriber.thread.is_alive()
+    finally:
+        subscriber.close()
+
+
+def test_publisher_socket_is_private_and_not_stolen(tmp_path):
+    import os
+    import stat
+
+    import pytest
+
+    path = str(tmp_path / "run" / "collector.sock")
+    publisher = SamplePublisher(path)
+    publisher.start()
+    try:
+        assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+        assert stat.S_IMODE(os.stat(os.path.dirname(path)).st_mode) == 0o700
+        with pytest.raises(RuntimeError):
+            SamplePublisher(path).start()
+        assert SampleSubscriber.available(path)
+    finally:
+        publisher.close()
+    assert not os.path.exists(path)
@@ -0,0 +1,111 @@
+import asyncio
+import socket
+
+import pytest
+
+from monitor import async_monitor_server
+from ssh_pool import ConnectionPool
+
+
+class ListQueue:
+    """代替样本通道，记录任务放入的样本"""
+
+    def __init__(self):
+        self.samples = []
+
+    def put(self, sample):
+        self.samples.append(sample)
+
+    def statuses(self):
+        return [sample["status"] for sample in self.samples]
+
+
+def closed_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def run_until(coro, queue, status, timeout=10):
+    task = asyncio.create_task(coro)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while status not in queue.statuses():
+        assert not task.done(), task.exception()
+        assert loop.time() < deadline, queue.samples
+        await asyncio.sleep(0.01)
+    return task
+
+
+def test_cancel_while_host_unreachable_releases_connection():
+    async def scenario():
+        pool = ConnectionPool()
+        queue = ListQueue()
+        config = {"id": "down", "hostname": "127.0.0.1", "port": closed_port(), "username": "nobody",
+                  "password": "x", "transport": "ssh", "metrics": [{"type": "CpuMetric"}]}
+        task = await run_until(async_monitor_server(config, 1, queue, pool), queue, "down")
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert pool.entries == {}
+
+    asyncio.run(scenario())
+
+
+def test_cancel_local_monitor_after_first_sample():
+    async def scenario():
+        queue = ListQueue()
+        config = {"id": "local", "hostname": "localhost", "interval": 0.2, "metrics": [{"type": "MemoryMetric"}]}
+        task = await run_until(async_monitor_server(config, 0.2, queue), queue, "data")
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert "error" not in queue.statuses()
+
+    asyncio.run(scenario())
+
+
+def test_server_without_metrics_reports_error():
+    async def scenario():
+        queue = ListQueue()
+        config = {"id": "empty", "hostname": "localhost", "interval": 0.1, "metrics": [{"type": "NoSuchMetric"}]}
+        task = await run_until(async_monitor_server(config, 0.1, queue), queue, "error")
+        assert not task.done()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(scenario())
+
+
+class StagedMonitor:
+    """按给定阶段依次返回 (数据, 缺失, 完成的指标) 的假 monitor"""
+
+    server_id = "staged"
+
+    def __init__(self, stages):
+        self.stages = stages
+
+    async def collect_stages(self, metrics, budget):
+        for stage in self.stages:
+            yield stage
+
+
+def test_failed_slow_metric_is_reported_after_fast_sample():
+    from monitor import _SampleClock, _collect_tick
+
+    queue = ListQueue()
+    monitor = StagedMonitor([({"cpu_usage": 1.0}, [], ["cpu"]), ({}, ["disk"], ["disk"])])
+    asyncio.run(_collect_tick(monitor, 1000.0, ["cpu", "disk"], 1, queue, {"cpu", "disk"}, _SampleClock()))
+    assert [sample.get("missing") for sample in queue.samples] == [None, ["disk"]]
+    assert queue.statuses() == ["data", "data"]
+
+
+def test_missing_metric_drops_its_last_value():
+    from series_buffer import SeriesRingBuffer
+
+    buffer = SeriesRingBuffer(10)
+    buffer.append(1.0, {"cpu_usage": 1.0, "disk_usage": 50.0, 'disk_usage{mount="/data"}': 10.0})
+    buffer.append(2.0, {}, ["disk"])
+    assert buffer.latest()[1] == {"cpu_usage": 1.0}
+    assert len(buffer) == 1
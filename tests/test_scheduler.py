@@ -0,0 +1,66 @@
+import asyncio
+
+from scheduler import MetricSchedule, golden_phase
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_deadlines_align_to_phase_offset():
+    clock = FakeClock(1001.7)
+    schedule = MetricSchedule({"cpu": 1, "disk": 4}, phase=0.5, clock=clock)
+    assert schedule.base == 1
+    assert schedule.deadlines["cpu"] == 1002.5
+    assert schedule.deadlines["disk"] == 1004.5
+
+
+def test_due_advances_and_shares_deadlines():
+    clock = FakeClock(1000.0)
+    schedule = MetricSchedule({"cpu": 1, "disk": 2}, clock=clock)
+    assert sorted(schedule.due()) == ["cpu", "disk"]
+    assert schedule.due(1000.5) == []
+    assert schedule.due(1001.0) == ["cpu"]
+    assert sorted(schedule.due(1002.0)) == ["cpu", "disk"]
+    assert schedule.skipped == 0
+
+
+def test_missed_deadlines_are_skipped_not_replayed():
+    clock = FakeClock(1000.0)
+    schedule = MetricSchedule({"cpu": 1}, clock=clock)
+    schedule.due()
+    assert schedule.due(1004.5) == ["cpu"]
+    assert schedule.skipped == 3
+    assert schedule.deadlines["cpu"] == 1005.0
+
+
+def test_tolerance_allows_early_due():
+    schedule = MetricSchedule({"cpu": 2}, clock=FakeClock(1000.0))
+    schedule.due()
+    assert schedule.due(1001.5) == []
+    assert schedule.due(1001.5, tolerance=0.5) == ["cpu"]
+
+
+def test_empty_schedule_idles_at_default_interval():
+    clock = FakeClock(1000.2)
+    schedule = MetricSchedule({}, clock=clock, default=5)
+    assert schedule.base == 5
+    assert schedule.next_deadline() == 1005.0
+    assert schedule.due() == []
+
+
+def test_wait_returns_due_metrics():
+    schedule = MetricSchedule({"cpu": 0.05}, default=1)
+    deadline, due = asyncio.run(schedule.wait())
+    assert due == ["cpu"]
+    assert deadline <= schedule.deadlines["cpu"]
+
+
+def test_golden_phases_are_spread():
+    phases = sorted(golden_phase(index) for index in range(10))
+    assert all(0 <= phase < 1 for phase in phases)
+    assert min(b - a for a, b in zip(phases, phases[1:])) > 0.05
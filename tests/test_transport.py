@@ -0,0 +1,56 @@
+import pytest
+
+import transport
+from transport import SampleDecoder, SampleEncoder
+
+
+def sample(timestamp, **values):
+    return {"server_id": "a", "status": "data", "timestamp": timestamp, **values}
+
+
+def test_round_trip_values_missing_and_status():
+    encoder, decoder = SampleEncoder(), SampleDecoder()
+    data = decoder.feed(encoder.encode({**sample(1000.0, cpu_usage=12.5), "missing": ["disk"]}))
+    status = decoder.feed(encoder.encode({"server_id": "a", "status": "down", "timestamp": 1001.0,
+                                          "message": "主机不可达"}))
+    assert data[0]["cpu_usage"] == 12.5
+    assert data[0]["missing"] == ["disk"]
+    assert data[0]["timestamp"].timestamp() == 1000.0
+    assert (status[0]["status"], status[0]["message"]) == ("down", "主机不可达")
+
+
+def test_partial_frames_and_batched_numpy_decode():
+    encoder, decoder = SampleEncoder(), SampleDecoder()
+    frame = encoder.encode(sample(1000.0, **{f"m{i}": float(i) for i in range(100)}))
+    assert decoder.feed(frame[:7]) == []
+    decoded = decoder.feed(frame[7:])
+    assert decoded[0]["m99"] == 99.0
+
+
+def test_new_subscriber_decodes_with_catalog():
+    encoder = SampleEncoder()
+    encoder.encode(sample(1000.0, cpu_usage=1.0))
+    frame = encoder.encode(sample(1001.0, cpu_usage=2.0))
+    decoder = SampleDecoder()
+    assert decoder.feed(encoder.catalog() + frame)[0]["cpu_usage"] == 2.0
+
+
+def test_non_numeric_values_are_coerced_or_dropped():
+    encoder, decoder = SampleEncoder(), SampleDecoder()
+    decoded = decoder.feed(encoder.encode(sample(1000.0, good="1.5", bad="n/a", none=None)))[0]
+    assert decoded["good"] == 1.5
+    assert "bad" not in decoded and "none" not in decoded
+
+
+def test_name_table_is_rebuilt_past_limit(monkeypatch):
+    monkeypatch.setattr(transport, "NAME_LIMIT", 5)
+    encoder, decoder = SampleEncoder(), SampleDecoder()
+    for i in range(20):
+        decoded = decoder.feed(encoder.encode(sample(1000.0 + i, **{f"k{i}": 1.0, "cpu": 2.0})))
+    assert decoded[0]["k19"] == 1.0 and decoded[0]["cpu"] == 2.0
+    assert len(encoder.ids) <= 6
+
+
+def test_unknown_frame_type_raises():
+    with pytest.raises(ValueError):
+        SampleDecoder().feed(b"Z")
@@ -0,0 +1,46 @@
+import textwrap
+
+import pytest
+
+import watcher_register
+from watcher_register import WatcherModuleType, WatcherRegister
+
+
+@pytest.fixture(autouse=True)
+def clear_missing():
+    WatcherRegister.clear_missing()
+    yield
+    WatcherRegister.clear_missing()
+
+
+def test_builtin_metric_is_loaded_on_demand():
+    metric = WatcherRegister.get_registered(WatcherModuleType.METRIC, "CpuMetric")
+    assert metric.__name__ == "CpuMetric"
+
+
+def test_missing_plugin_is_cached_until_cleared(tmp_path, monkeypatch):
+    assert WatcherRegister.get_registered(WatcherModuleType.METRIC, "LaterMetric", "later_plugin:LaterMetric") is None
+
+    # 修正配置（模块现在可以导入）后重新加载配置即可找到插件
+    (tmp_path / "later_plugin.py").write_text(textwrap.dedent("""
+        class LaterMetric:
+            pass
+    """))
+    monkeypatch.syspath_prepend(str(tmp_path))
+    assert WatcherRegister.get_registered(WatcherModuleType.METRIC, "LaterMetric", "later_plugin:LaterMetric") is None
+    WatcherRegister.clear_missing()
+    assert WatcherRegister.get_registered(WatcherModuleType.METRIC, "LaterMetric",
+                                          "later_plugin:LaterMetric").__name__ == "LaterMetric"
+
+
+def test_missing_plugin_is_retried_after_interval(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(watcher_register.time, "monotonic", lambda: now[0])
+    loads = []
+    monkeypatch.setattr(WatcherRegister, "_load", classmethod(lambda cls, *args: loads.append(args)))
+    WatcherRegister.get_registered(WatcherModuleType.METRIC, "Unknown")
+    WatcherRegister.get_registered(WatcherModuleType.METRIC, "Unknown")
+    assert len(loads) == 1
+    now[0] += watcher_register.MISSING_RETRY
+    WatcherRegister.get_registered(WatcherModuleType.METRIC, "Unknown")
+    assert len(loads) == 2
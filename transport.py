@@ -0,0 +1,271 @@
+"""定长二进制样本传输格式，替代经 multiprocessing.Queue 传递的 pickle 字典。
+
+字节流由三种帧组成：
+- 名称帧 b"N" + <id:u32><len:u16> + utf-8 字符串，首次用到某个服务器/指标/状态名称时发送一次；
+- 记录帧 b"R" + <count:u32> + count 条定长记录，记录见 RECORD_DTYPE，字符串都以数字 id 表示；
+- 自监控帧 b"S" + <len:u32> + JSON，采集端定期上报的耗时直方图增量（见 instrumentation.py）。
+
+消费端用 numpy.frombuffer 一次解码整帧记录，不需要逐条反序列化。numpy 在首次解码批量帧时才导入，
+只负责编码的采集分片进程不会加载 numpy。
+"""
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import struct
+import threading
+import time
+from datetime import datetime
+
+# 获取应用logger
+logger = logging.getLogger('server_watcher.transport')
+
+KIND_VALUE = 0    # 指标值: name=指标, value=值
+KIND_MISSING = 1  # 本次采样缺失的指标: name=指标名
+KIND_STATUS = 2   # 状态事件: name=状态, value=消息字符串的 id
+
+_RECORD = struct.Struct("<BIIdd")
+_NAME_HEADER = struct.Struct("<IH")
+_COUNT = struct.Struct("<I")
+
+# 名称表条目上限。带标签的序列（如 Top N 进程）不断产生新名称，超过上限时清空重建：
+# 之后用到的名称重新分配 id 并重新发送名称帧，解码端按 id 覆盖，新订阅者收到的名称表也只包含仍在使用的名称
+NAME_LIMIT = 100000
+
+# 与 _RECORD 布局相同的 numpy 结构化类型，由 _require_numpy 创建
+np = RECORD_DTYPE = None
+
+def _require_numpy():
+    global np, RECORD_DTYPE
+    if np is not None:
+        return
+    import numpy
+    np = numpy
+    RECORD_DTYPE = np.dtype([('kind', '<u1'), ('server', '<u4'), ('name', '<u4'), ('ts', '<f8'), ('value', '<f8')])
+
+class SampleEncoder:
+    def __init__(self):
+        self.ids = {}
+        self.name_frames = []
+        # 已告警过的非数值指标，每个指标只记录一次
+        self.invalid = set()
+
+    def _id(self, name, frames):
+        name_id = self.ids.get(name)
+        if name_id is None:
+            name_id = len(self.ids)
+            self.ids[name] = name_id
+            raw = name.encode('utf-8')
+            frame = b"N" + _NAME_HEADER.pack(name_id, len(raw)) + raw
+            self.name_frames.append(frame)
+            frames.append(frame)
+        return name_id
+
+    def _coerce(self, server, key, ts, value, frames):
+        # 插件返回了非数值（如字符串、None），能转换成 float 时转换，否则丢弃该指标
+        try:
+            return _RECORD.pack(KIND_VALUE, server, self._id(key, frames), ts, float(value))
+        except (TypeError, ValueError):
+            if key not in self.invalid:
+                self.invalid.add(key)
+                logger.warning(f"丢弃非数值指标 {key}: {value!r}")
+            return None
+
+    def catalog(self):
+        """已定义的全部名称帧，新订阅者先接收它再接收后续记录"""
+        return b"".join(self.name_frames)
+
+    def encode(self, sample):
+        if len(self.ids) > NAME_LIMIT:
+            self.ids.clear()
+            self.name_frames.clear()
+            self.invalid.clear()
+        if sample.get("status") == "stats":
+            raw = json.dumps(sample["stats"]).encode('utf-8')
+            return b"S" + _COUNT.pack(len(raw)) + raw
+        frames = []
+        records = []
+        server = self._id(str(sample["server_id"]), frames)
+        timestamp = sample.get("timestamp")
+        ts = timestamp.timestamp() if isinstance(timestamp, datetime) else (timestamp or time.time())
+        status = sample.get("status")
+        if status == "data":
+            for key, value in sample.items():
+                if key in ("server_id", "status", "timestamp", "missing"):
+                    continue
+                try:
+                    record = _RECORD.pack(KIND_VALUE, server, self._id(key, frames), ts, value)
+                except struct.error:
+                    record = self._coerce(server, key, ts, value, frames)
+                    if record is None:
+                        continue
+                records.append(record)
+            for name in sample.get("missing") or []:
+                records.append(_RECORD.pack(KIND_MISSING, server, self._id(name, frames), ts, 0.0))
+        else:
+            message = self._id(str(sample.get("message", "")), frames)
+            records.append(_RECORD.pack(KIND_STATUS, server, self._id(status, frames), ts, message))
+        frames.append(b"R" + _COUNT.pack(len(records)) + b"".join(records))
+        return b"".join(frames)
+
+class SampleDecoder:
+    def __init__(self):
+        self.names = {}
+        self.buffer = b""
+
+    def feed(self, data):
+        """追加收到的字节并解码所有完整的帧，返回样本字典列表（与原先放入队列的格式相同）"""
+        self.buffer = self.buffer + data if self.buffer else data
+        samples = []
+        offset = 0
+        size = len(self.buffer)
+        while offset < size:
+            frame_type = self.buffer[offset:offset + 1]
+            if frame_type == b"N":
+                if size - offset < 1 + _NAME_HEADER.size:
+                    break
+                name_id, length = _NAME_HEADER.unpack_from(self.buffer, offset + 1)
+                end = offset + 1 + _NAME_HEADER.size + length
+                if end > size:
+                    break
+                self.names[name_id] = self.buffer[offset + 1 + _NAME_HEADER.size:end].decode('utf-8')
+                offset = end
+            elif frame_type == b"R":
+                if size - offset < 1 + _COUNT.size:
+                    break
+                count, = _COUNT.unpack_from(self.buffer, offset + 1)
+                start = offset + 1 + _COUNT.size
+                end = start + count * _RECORD.size
+                if end > size:
+                    break
+                # 小帧用 struct.iter_unpack，批量帧用 numpy 一次解码
+                if count > 64:
+                    _require_numpy()
+                    records = np.frombuffer(self.buffer, dtype=RECORD_DTYPE, count=count, offset=start).tolist()
+                else:
+                    records = _RECORD.iter_unpack(memoryview(self.buffer)[start:end])
+                self._decode_records(records, samples)
+                offset = end
+            elif frame_type == b"S":
+                if size - offset < 1 + _COUNT.size:
+                    break
+                length, = _COUNT.unpack_from(self.buffer, offset + 1)
+                start = offset + 1 + _COUNT.size
+                end = start + length
+                if end > size:
+                    break
+                samples.append({"server_id": "", "status": "stats",
+                                "stats": json.loads(self.buffer[start:end].decode('utf-8'))})
+                offset = end
+            else:
+                raise ValueError(f"无法识别的帧类型: {frame_type!r}")
+        self.buffer = self.buffer[offset:]
+        return samples
+
+    def _decode_records(self, records, samples):
+        names = self.names
+        current = None
+        current_key = None
+        for kind, server, name, ts, value in records:
+            if kind == KIND_STATUS:
+                samples.append({"server_id": names[server], "status": names[name],
+                                "timestamp": datetime.fromtimestamp(ts), "message": names[int(value)]})
+                current = None
+                continue
+            if (server, ts) != current_key or current is None:
+                current_key = (server, ts)
+                current = {"server_id": names[server], "status": "data", "timestamp": datetime.fromtimestamp(ts)}
+                samples.append(current)
+            if kind == KIND_VALUE:
+                current[names[name]] = value
+            else:
+                current.setdefault("missing", []).append(names[name])
+
+class SampleChannel:
+    """单生产者、单消费者的二进制样本通道。
+
+    生产端 put() 与原先的 data_queue.put() 接口相同，写入非阻塞管道，管道满时暂存在内存中；
+    消费端 drain() 一次读出管道中全部数据并批量解码，没有逐条等待的超时。
+    通道对象可以传给 multiprocessing.Process，在子进程中作为生产端使用。
+    """
+
+    def __init__(self, max_pending=64 * 1024 * 1024):
+        self.reader, self.writer = multiprocessing.Pipe(duplex=False)
+        self.max_pending = max_pending
+        self._init_state()
+
+    def _init_state(self):
+        self.encoder = SampleEncoder()
+        self.decoder = SampleDecoder()
+        self.pending = bytearray()
+        self.lock = threading.Lock()
+        self.dropped = 0
+        # 管道满时在其上等待可写的事件循环
+        self.watching = None
+
+    def __getstate__(self):
+        return {"reader": self.reader, "writer": self.writer, "max_pending": self.max_pending}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._init_state()
+
+    def put(self, sample):
+        with self.lock:
+            if len(self.pending) > self.max_pending:
+                # 消费端长时间未读取时丢弃新样本，避免内存无限增长
+                self.dropped += 1
+                if self.dropped % 1000 == 1:
+                    logger.warning(f"样本通道积压过多，已丢弃 {self.dropped} 个样本")
+                return
+            self.pending += self.encoder.encode(sample)
+            self._flush()
+
+    def _flush(self):
+        fd = self.writer.fileno()
+        os.set_blocking(fd, False)
+        while self.pending:
+            try:
+                written = os.write(fd, self.pending)
+            except BlockingIOError:
+                self._watch(fd)
+                return
+            del self.pending[:written]
+
+    def _watch(self, fd):
+        # 在事件循环线程中 put 时，由事件循环在管道可写时写出暂存的数据，不必等下一次 put
+        if self.watching is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self.watching = loop
+        loop.add_writer(fd, self._on_writable)
+
+    def _on_writable(self):
+        with self.lock:
+            self._flush()
+            if not self.pending and self.watching is not None:
+                self.watching.remove_writer(self.writer.fileno())
+                self.watching = None
+
+    def fileno(self):
+        return self.reader.fileno()
+
+    def drain(self):
+        fd = self.reader.fileno()
+        os.set_blocking(fd, False)
+        chunks = []
+        while True:
+            try:
+                chunk = os.read(fd, 1024 * 1024)
+            except BlockingIOError:
+                break
+            if not chunk:
+                break
+            chunks.append(chunk)
+        if not chunks:
+            return []
+        return self.decoder.feed(b"".join(chunks))
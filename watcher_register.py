@@ -1,12 +1,47 @@
+import logging
+import time
 from enum import Enum
+from importlib import import_module, metadata
+
+# 获取应用logger
+logger = logging.getLogger('server_watcher.register')
 
 class WatcherModuleType(Enum):
     METRIC = "metric"
+    ALERT_SINK = "alert_sink"
+
+# 内置插件所在的模块，按名称首次查找时才导入
+BUILTIN_MODULES = {
+    WatcherModuleType.METRIC: {
+        "CpuMetric": "metrics.cpu_metric",
+        "MemoryMetric": "metrics.memory_metric",
+        "DiskMetric": "metrics.disk_metric",
+        "DiskIOMetric": "metrics.diskio_metric",
+        "NetworkMetric": "metrics.network_metric",
+        "TopProcessesMetric": "metrics.process_metric",
+    },
+    WatcherModuleType.ALERT_SINK: {
+        "LogSink": "alerts",
+        "WebhookSink": "alerts",
+    },
+}
+
+# 第三方包通过这些 entry point 组声明插件，名称为配置中的 type，值为 "模块:类名"
+ENTRY_POINT_GROUPS = {
+    WatcherModuleType.METRIC: "server_watcher.metrics",
+    WatcherModuleType.ALERT_SINK: "server_watcher.alert_sinks",
+}
+
+# 查找失败的插件在该时长（秒）后重新尝试导入，安装缺失的包后无需重启
+MISSING_RETRY = 60
 
 class WatcherRegister:
     _registry = {
-        WatcherModuleType.METRIC: {}
+        WatcherModuleType.METRIC: {},
+        WatcherModuleType.ALERT_SINK: {}
     }
+    # 查找失败的 {(类型, 名称, module): 时间}，重试间隔内不再重复导入和扫描 entry point
+    _missing = {}
 
     @classmethod
     def register(cls, module_type):
@@ -18,9 +53,61 @@ class WatcherRegister:
         return decorator
 
     @classmethod
-    def get_registered(cls, module_type, name):
-        return cls._registry.get(module_type, {}).get(name)
+    def get_registered(cls, module_type, name, module=None):
+        """按名称查找插件，尚未注册时依次从 module（配置中声明的 "包.模块" 或 "包.模块:类名"）、
+        内置模块和 entry point 中导入，只有被使用的插件才会被导入"""
+        registered = cls._registry.get(module_type, {}).get(name)
+        key = (module_type, name, module)
+        if registered is None and name and time.monotonic() - cls._missing.get(key, -MISSING_RETRY) >= MISSING_RETRY:
+            try:
+                cls._load(module_type, name, module)
+            except Exception as e:
+                logger.warning(f"加载插件 {name} 失败: {e}")
+            registered = cls._registry.get(module_type, {}).get(name)
+            if registered is None:
+                cls._missing[key] = time.monotonic()
+        return registered
+
+    @classmethod
+    def clear_missing(cls):
+        """配置重新加载时清除查找失败的记录，修正 module 路径或安装插件包后立即重新导入"""
+        cls._missing.clear()
 
     @classmethod
     def get_all_registered(cls, module_type):
-        return cls._registry.get(module_type, {}).values()
\ No newline at end of file
+        """导入全部内置插件和 entry point 声明的插件后返回所有已注册的类"""
+        for name in list(BUILTIN_MODULES.get(module_type, {})) + [entry.name for entry in cls._entry_points(module_type)]:
+            cls.get_registered(module_type, name)
+        return cls._registry.get(module_type, {}).values()
+
+    @classmethod
+    def _load(cls, module_type, name, module=None):
+        if module:
+            module_name, _, attribute = module.partition(":")
+            loaded = import_module(module_name)
+            if attribute:
+                cls._add(module_type, name, getattr(loaded, attribute))
+            return
+        if name in BUILTIN_MODULES.get(module_type, {}):
+            import_module(BUILTIN_MODULES[module_type][name])
+            return
+        for entry in cls._entry_points(module_type):
+            if entry.name == name:
+                cls._add(module_type, name, entry.load())
+                return
+
+    @classmethod
+    def _add(cls, module_type, name, watcher_class):
+        # 未使用 register 装饰器的插件类按配置中的名称注册
+        cls._registry.setdefault(module_type, {}).setdefault(name, watcher_class)
+
+    @staticmethod
+    def _entry_points(module_type):
+        group = ENTRY_POINT_GROUPS.get(module_type)
+        if group is None:
+            return []
+        entry_points = metadata.entry_points()
+        # Python 3.10 之前 entry_points() 返回 {组名: [EntryPoint]}
+        if hasattr(entry_points, "select"):
+            return list(entry_points.select(group=group))
+        return list(entry_points.get(group, []))